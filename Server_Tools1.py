@@ -1,11 +1,32 @@
 import os
-import pyodbc
-import psycopg2
-from typing import Any
+import re
+import json
+import time
+
+_IMPORT_STARTED = time.perf_counter()
+
+import random
+import logging
+import base64
+import bisect
+import asyncio
+import functools
+import itertools
+import contextlib
+import threading
+import sqlite3
+import contextvars
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable
+from datetime import date, datetime
+from decimal import Decimal
 
 # MCP server
 from fastmcp import FastMCP
-import mysql.connector
+from starlette.requests import Request
+from starlette.responses import PlainTextResponse
 from dotenv import load_dotenv
 
 load_dotenv()
@@ -16,233 +37,992 @@ def must_get(key: str) -> str:
         raise RuntimeError(f"Missing required env var {key}")
     return val
 
+
+# Database drivers and settings are loaded on first use of a backend, so a
+# replica that only serves some tools needs neither the other drivers nor
+# their env vars, and importing this module opens no connections.
+# STARTUP_REPORT records how long each step took (see stats://startup).
+STARTUP_REPORT = {"import_ms": None, "startup_ms": None, "drivers": {}, "config": {}}
+
+
+@contextlib.contextmanager
+def _startup_timer(group: str, name: str):
+    started = time.perf_counter()
+    yield
+    STARTUP_REPORT[group][name] = round((time.perf_counter() - started) * 1000, 3)
+
+
+@functools.cache
+def mysql_driver():
+    """mysql.connector, imported on first use of the MySQL backend"""
+    with _startup_timer("drivers", "mysql.connector"):
+        import mysql.connector
+        import mysql.connector.errorcode
+    return mysql.connector
+
+
+@functools.cache
+def pg_driver():
+    """psycopg2 (with extras/extensions), imported on first use of a PostgreSQL backend"""
+    with _startup_timer("drivers", "psycopg2"):
+        import psycopg2
+        import psycopg2.extras
+        import psycopg2.extensions
+    return psycopg2
+
+
+def execute_values(*args, **kwargs):
+    return pg_driver().extras.execute_values(*args, **kwargs)
+
 # ————————————————
 # 1. MySQL Configuration
 # ————————————————
-MYSQL_HOST = must_get("MYSQL_HOST")
-MYSQL_PORT = int(must_get("MYSQL_PORT"))
-MYSQL_USER = must_get("MYSQL_USER")
-MYSQL_PASSWORD = must_get("MYSQL_PASSWORD")
-MYSQL_DB = must_get("MYSQL_DB")
-
-
-def get_mysql_conn(db: str | None = MYSQL_DB):
-    """If db is None we connect to the server only (needed to CREATE DATABASE)."""
-    return mysql.connector.connect(
-        host=MYSQL_HOST,
-        port=MYSQL_PORT,
-        user=MYSQL_USER,
-        password=MYSQL_PASSWORD,
-        database=db,
+@functools.cache
+def mysql_settings() -> dict:
+    """MYSQL_* settings, validated on first use"""
+    with _startup_timer("config", "mysql"):
+        return {
+            "host": must_get("MYSQL_HOST"),
+            "port": int(must_get("MYSQL_PORT")),
+            "user": must_get("MYSQL_USER"),
+            "password": must_get("MYSQL_PASSWORD"),
+            "database": must_get("MYSQL_DB"),
+        }
+
+
+def _connect_mysql(server_only: bool = False):
+    """Open a brand-new MySQL connection (bypasses the pool)"""
+    settings = dict(mysql_settings())
+    if server_only:
+        settings["database"] = None
+    return mysql_driver().connect(
+        **settings,
         ssl_disabled=False,  # Aiven requires TLS; keep this False
         autocommit=True,
     )
 
 
+def get_mysql_conn(server_only: bool = False):
+    """With server_only we connect to the server only (needed to CREATE DATABASE).
+
+    Connections to the configured database are checked out of MYSQL_POOL;
+    calling close() on them returns them to the pool.
+    """
+    if server_only:
+        return _connect_mysql(server_only=True)
+    return MYSQL_POOL.acquire()
+
+
 # ————————————————
 # 2. PostgreSQL Configuration (Products)
 # ————————————————
-PG_HOST = must_get("PG_HOST")
-PG_PORT = int(must_get("PG_PORT"))
-PG_DB = os.getenv("PG_DB", "postgres")  # db name can default
-PG_USER = must_get("PG_USER")
-PG_PASS = must_get("PG_PASSWORD")
+@functools.cache
+def pg_settings() -> dict:
+    """PG_* settings, validated on first use"""
+    with _startup_timer("config", "pg_products"):
+        return {
+            "host": must_get("PG_HOST"),
+            "port": int(must_get("PG_PORT")),
+            "dbname": os.getenv("PG_DB", "postgres"),  # db name can default
+            "user": must_get("PG_USER"),
+            "password": must_get("PG_PASSWORD"),
+        }
 
 
-def get_pg_conn():
-    return psycopg2.connect(
-        host=PG_HOST,
-        port=PG_PORT,
-        dbname=PG_DB,
-        user=PG_USER,
-        password=PG_PASS,
+def _connect_pg():
+    return pg_driver().connect(
+        **pg_settings(),
         sslmode="require",  # Supabase enforces TLS
     )
 
 
+def get_pg_conn():
+    return PG_POOL.acquire()
+
+
 # ————————————————
 # 3. PostgreSQL Configuration (Sales)
 # ————————————————
-PG_SALES_HOST = must_get("PG_SALES_HOST")
-PG_SALES_PORT = int(must_get("PG_SALES_PORT"))
-PG_SALES_DB = os.getenv("PG_SALES_DB", "sales_db")
-PG_SALES_USER = must_get("PG_SALES_USER")
-PG_SALES_PASS = must_get("PG_SALES_PASSWORD")
+@functools.cache
+def pg_sales_settings() -> dict:
+    """PG_SALES_* settings, validated on first use"""
+    with _startup_timer("config", "pg_sales"):
+        return {
+            "host": must_get("PG_SALES_HOST"),
+            "port": int(must_get("PG_SALES_PORT")),
+            "dbname": os.getenv("PG_SALES_DB", "sales_db"),
+            "user": must_get("PG_SALES_USER"),
+            "password": must_get("PG_SALES_PASSWORD"),
+        }
 
 
-def get_pg_sales_conn():
-    return psycopg2.connect(
-        host=PG_SALES_HOST,
-        port=PG_SALES_PORT,
-        dbname=PG_SALES_DB,
-        user=PG_SALES_USER,
-        password=PG_SALES_PASS,
+def _connect_pg_sales():
+    return pg_driver().connect(
+        **pg_sales_settings(),
         sslmode="require",
     )
 
 
+def get_pg_sales_conn():
+    return PG_SALES_POOL.acquire()
+
+
 # ————————————————
-# 4. Instantiate your MCP server
+# 4. Logging, Tracing & Tool Metrics
 # ————————————————
-mcp = FastMCP("CRUDServer")
+# Levelled logs replace the old DEBUG prints (LOG_LEVEL=DEBUG to see them;
+# arguments are only formatted when the level is enabled).
+#
+# Every CRUD tool call runs inside a Trace: spans for connection acquire,
+# SQL build, execute, fetch, row processing and serialization, plus rows
+# returned and response bytes. Traces are written as one JSON object per
+# line on the "crud_server.trace" logger (stderr, or TRACE_LOG_FILE) for a
+# TRACE_SAMPLE_RATE fraction of calls, and always for calls slower than
+# TRACE_SLOW_MS or ending in an error. With both set to 0 no trace is
+# created and the span hooks are a single context-variable lookup.
+LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO").upper()
+logging.basicConfig(level=LOG_LEVEL, format="%(asctime)s %(levelname)s %(name)s: %(message)s")
+logger = logging.getLogger("crud_server")
+
+TRACE_SAMPLE_RATE = float(os.getenv("TRACE_SAMPLE_RATE", "0.01"))
+TRACE_SLOW_MS = float(os.getenv("TRACE_SLOW_MS", "1000"))
+TRACE_LOG_FILE = os.getenv("TRACE_LOG_FILE")
+
+trace_logger = logging.getLogger("crud_server.trace")
+trace_logger.propagate = False
+trace_logger.setLevel(logging.INFO)
+_trace_handler = logging.FileHandler(TRACE_LOG_FILE) if TRACE_LOG_FILE else logging.StreamHandler()
+_trace_handler.setFormatter(logging.Formatter("%(message)s"))
+trace_logger.addHandler(_trace_handler)
+
+_current_trace = contextvars.ContextVar("current_trace", default=None)
+
+
+class Trace:
+    """Spans and attributes collected for one tool call"""
+
+    def __init__(self, tool: str, operation: str | None, sampled: bool):
+        self.trace_id = os.urandom(8).hex()
+        self.tool = tool
+        self.operation = operation
+        self.sampled = sampled
+        self.started = time.perf_counter()
+        self.spans = []
+        self.attrs = {}
+
+    def add_span(self, name: str, duration: float, attrs: dict):
+        end = time.perf_counter() - self.started
+        span = {"name": name, "start_ms": round((end - duration) * 1000, 3), "duration_ms": round(duration * 1000, 3)}
+        span.update(attrs)
+        self.spans.append(span)
+
+
+def add_span(name: str, duration: float, **attrs):
+    """Record an already-measured span (seconds) on the current trace, if any"""
+    trace = _current_trace.get()
+    if trace is not None:
+        trace.add_span(name, duration, attrs)
+
+
+@contextlib.contextmanager
+def trace_span(name: str, **attrs):
+    """Time the enclosed block as a span of the current trace, if any"""
+    trace = _current_trace.get()
+    if trace is None:
+        yield
+        return
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        trace.add_span(name, time.perf_counter() - start, attrs)
+
+
+def trace_set(**attrs):
+    """Attach attributes (e.g. source="rollup") to the current trace, if any"""
+    trace = _current_trace.get()
+    if trace is not None:
+        trace.attrs.update(attrs)
+
+
+def _result_rows(response) -> int | None:
+    result = response.get("result") if isinstance(response, dict) else None
+    if isinstance(result, list):
+        return len(result)
+    if isinstance(result, dict) and "data" in result:
+        return len(result["data"][0]) if result["data"] else 0
+    return None
+
+
+# Per-tool call metrics, always on (a lock and a few additions per call);
+# exported in Prometheus format on /metrics. Unknown operation names are
+# folded into "other" to keep label cardinality bounded.
+TOOL_LATENCY_BUCKETS = tuple(sorted(
+    float(b) for b in os.getenv("TOOL_LATENCY_BUCKETS", "0.005,0.01,0.025,0.05,0.1,0.25,0.5,1,2.5,5,10").split(",")
+))
+TOOL_OPERATIONS = {
+    "create", "read", "update", "delete", "describe", "aggregate", "bulk_create", "bulk_update", "bulk_delete",
+}
+
+
+class ToolMetrics:
+    """Calls, errors, rows and a latency histogram per (tool, operation), plus in-flight calls per tool"""
+
+    def __init__(self, buckets: tuple):
+        self.buckets = buckets
+        self._lock = threading.Lock()
+        self._series = {}
+        self._in_flight = {}
+
+    def begin(self, tool: str):
+        with self._lock:
+            self._in_flight[tool] = self._in_flight.get(tool, 0) + 1
+
+    def end(self, tool: str, operation: str | None, seconds: float, rows: int | None, failed: bool):
+        operation = operation if operation in TOOL_OPERATIONS else "other"
+        with self._lock:
+            self._in_flight[tool] -= 1
+            series = self._series.get((tool, operation))
+            if series is None:
+                series = self._series[(tool, operation)] = {
+                    "calls": 0, "errors": 0, "rows": 0, "seconds": 0.0, "buckets": [0] * len(self.buckets),
+                }
+            series["calls"] += 1
+            series["errors"] += failed
+            series["rows"] += rows or 0
+            series["seconds"] += seconds
+            i = bisect.bisect_left(self.buckets, seconds)
+            if i < len(self.buckets):
+                series["buckets"][i] += 1  # per-bucket counts; cumulated when exported
+
+    def snapshot(self) -> tuple:
+        """({(tool, operation): series}, {tool: in_flight})"""
+        with self._lock:
+            series = {key: {**s, "buckets": list(s["buckets"])} for key, s in self._series.items()}
+            return series, dict(self._in_flight)
+
+
+TOOL_METRICS = ToolMetrics(TOOL_LATENCY_BUCKETS)
+
+
+def _is_error_response(response) -> bool:
+    result = response.get("result") if isinstance(response, dict) else None
+    return isinstance(result, str) and result.startswith("❌")
+
+
+def _finish_trace(trace: Trace, response, error: Exception | None):
+    duration_ms = (time.perf_counter() - trace.started) * 1000
+    failed = error is not None or _is_error_response(response)
+    if not (trace.sampled or failed or (TRACE_SLOW_MS > 0 and duration_ms >= TRACE_SLOW_MS)):
+        return
+    # The response is serialized here (and only for logged traces) to measure its size
+    with trace_span("serialize"):
+        payload = json.dumps(response, default=str) if error is None else ""
+    record = {
+        "trace_id": trace.trace_id,
+        "tool": trace.tool,
+        "operation": trace.operation,
+        "status": "exception" if error is not None else ("error" if failed else "ok"),
+        "duration_ms": round(duration_ms, 3),
+        "rows": _result_rows(response),
+        "bytes": len(payload.encode("utf-8")),
+        "spans": trace.spans,
+    }
+    record.update(trace.attrs)
+    if error is not None:
+        record["error"] = repr(error)
+    trace_logger.info(json.dumps(record, default=str))
+
+
+def traced_tool(fn):
+    """Count an async MCP tool in TOOL_METRICS and run it inside a Trace (see TRACE_SAMPLE_RATE / TRACE_SLOW_MS)"""
+    tool = fn.__name__
+
+    @functools.wraps(fn)
+    async def wrapper(*args, **kwargs):
+        operation = kwargs.get("operation", args[0] if args else None)
+        sampled = TRACE_SAMPLE_RATE > 0 and random.random() < TRACE_SAMPLE_RATE
+        trace = Trace(tool, operation, sampled) if sampled or TRACE_SLOW_MS > 0 else None
+        token = _current_trace.set(trace) if trace is not None else None
+        TOOL_METRICS.begin(tool)
+        started = time.perf_counter()
+        response, error = None, None
+        try:
+            response = await fn(*args, **kwargs)
+            return response
+        except Exception as e:
+            error = e
+            raise
+        finally:
+            TOOL_METRICS.end(tool, operation, time.perf_counter() - started, _result_rows(response),
+                             error is not None or _is_error_response(response))
+            if trace is not None:
+                _finish_trace(trace, response, error)
+                _current_trace.reset(token)
+
+    return wrapper
 
 
 # ————————————————
-# 5. Synchronous Setup: Create & seed tables
+# 5. Connection Pooling
 # ————————————————
-def seed_databases():
-    # ---------- MySQL (Customers) ----------
-    root_cnx = get_mysql_conn(db=None)
-    root_cur = root_cnx.cursor()
-    root_cur.execute(f"CREATE DATABASE IF NOT EXISTS `{MYSQL_DB}`;")
-    root_cur.close()
-    root_cnx.close()
-
-    sql_cnx = get_mysql_conn()
-    sql_cur = sql_cnx.cursor()
-
-    # Disable foreign key checks temporarily
-    sql_cur.execute("SET FOREIGN_KEY_CHECKS = 0;")
-
-    # Drop tables in reverse dependency order (Sales first, then referenced tables)
-    sql_cur.execute("DROP TABLE IF EXISTS Sales;")
-    sql_cur.execute("DROP TABLE IF EXISTS ProductsCache;")
-    sql_cur.execute("DROP TABLE IF EXISTS Customers;")
-
-    # Re-enable foreign key checks
-    sql_cur.execute("SET FOREIGN_KEY_CHECKS = 1;")
-
-    # Create Customers table with FirstName and LastName
-    sql_cur.execute("""
-                    CREATE TABLE Customers
-                    (
-                        Id        INT AUTO_INCREMENT PRIMARY KEY,
-                        FirstName VARCHAR(50) NOT NULL,
-                        LastName  VARCHAR(50) NOT NULL,
-                        Name      VARCHAR(100) NOT NULL,
-                        Email     VARCHAR(100),
-                        CreatedAt TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-                    );
-                    """)
-
-    # Insert sample customers with FirstName and LastName
-    sql_cur.executemany(
-        "INSERT INTO Customers (FirstName, LastName, Name, Email) VALUES (%s, %s, %s, %s)",
-        [("Alice", "Johnson", "Alice Johnson", "alice@example.com"),
-         ("Bob", "Smith", "Bob Smith", "bob@example.com"),
-         ("Charlie", "Brown", "Charlie Brown", None)]  # Charlie has no email for null handling demo
-    )
+# Every tool call used to open (and TLS-handshake) a fresh connection. The
+# pools below keep warm connections per backend. Sizes and timeouts can be
+# set globally (DB_POOL_*) or per backend (MYSQL_POOL_*, PG_POOL_*,
+# PG_SALES_POOL_*), e.g. MYSQL_POOL_MAX_SIZE=20.
+class PoolTimeoutError(RuntimeError):
+    pass
 
-    # Create ProductsCache table (copy of PostgreSQL products for easier joins)
-    sql_cur.execute("""
-                    CREATE TABLE ProductsCache
-                    (
-                        id          INT PRIMARY KEY,
-                        name        VARCHAR(100) NOT NULL,
-                        price       DECIMAL(10, 4) NOT NULL,
-                        description TEXT
-                    );
-                    """)
-
-    # Insert sample products cache
-    sql_cur.executemany(
-        "INSERT INTO ProductsCache (id, name, price, description) VALUES (%s, %s, %s, %s)",
-        [(1, "Widget", 9.99, "A standard widget."),
-         (2, "Gadget", 14.99, "A useful gadget."),
-         (3, "Tool", 24.99, None)]  # Tool has no description for null handling demo
-    )
 
-    # Create Sales table in MySQL with foreign key constraints
-    sql_cur.execute("""
-                    CREATE TABLE Sales
-                    (
-                        Id           INT AUTO_INCREMENT PRIMARY KEY,
-                        customer_id  INT            NOT NULL,
-                        product_id   INT            NOT NULL,
-                        quantity     INT            NOT NULL DEFAULT 1,
-                        unit_price   DECIMAL(10, 4) NOT NULL,
-                        total_price  DECIMAL(10, 4) NOT NULL,
-                        sale_date    TIMESTAMP      DEFAULT CURRENT_TIMESTAMP,
-                        FOREIGN KEY (customer_id) REFERENCES Customers(Id) ON DELETE CASCADE,
-                        FOREIGN KEY (product_id) REFERENCES ProductsCache(id) ON DELETE CASCADE
-                    );
-                    """)
-
-    # Insert sample sales data
-    sql_cur.executemany(
-        "INSERT INTO Sales (customer_id, product_id, quantity, unit_price, total_price) VALUES (%s, %s, %s, %s, %s)",
-        [(1, 1, 2, 9.99, 19.98),  # Alice bought 2 Widgets
-         (2, 2, 1, 14.99, 14.99),  # Bob bought 1 Gadget
-         (3, 3, 3, 24.99, 74.97)]  # Charlie bought 3 Tools
-    )
+def _pool_setting(prefix: str, key: str, default: float) -> float:
+    return float(os.getenv(f"{prefix}_POOL_{key}", os.getenv(f"DB_POOL_{key}", default)))
 
-    sql_cnx.close()
 
-    # ---------- PostgreSQL (Products) ----------
-    pg_cnxn = get_pg_conn()
-    pg_cnxn.autocommit = True
-    pg_cur = pg_cnxn.cursor()
-
-    pg_cur.execute("DROP TABLE IF EXISTS products CASCADE;")
-    pg_cur.execute("""
-                   CREATE TABLE products
-                   (
-                       id          SERIAL PRIMARY KEY,
-                       name        TEXT           NOT NULL,
-                       price       NUMERIC(10, 4) NOT NULL,
-                       description TEXT
-                   );
-                   """)
-
-    pg_cur.executemany(
-        "INSERT INTO products (name, price, description) VALUES (%s, %s, %s)",
-        [("Widget", 9.99, "A standard widget."),
-         ("Gadget", 14.99, "A useful gadget."),
-         ("Tool", 24.99, "A handy tool.")]
-    )
-    pg_cnxn.close()
+class _PoolEntry:
+    """A raw connection plus the bookkeeping the pool needs"""
 
-    # ---------- PostgreSQL Sales Database ----------
-    sales_cnxn = get_pg_sales_conn()
-    sales_cnxn.autocommit = True
-    sales_cur = sales_cnxn.cursor()
+    def __init__(self, conn):
+        self.conn = conn
+        self.created_at = time.monotonic()
+        self.last_used = self.created_at
+        self.statements = OrderedDict()  # SQL text -> prepared handle, see StatementCache
 
-    sales_cur.execute("DROP TABLE IF EXISTS sales;")
-    sales_cur.execute("""
-                      CREATE TABLE sales
-                      (
-                          id           SERIAL PRIMARY KEY,
-                          customer_id  INT            NOT NULL,
-                          product_id   INT            NOT NULL,
-                          quantity     INT            NOT NULL DEFAULT 1,
-                          unit_price   NUMERIC(10, 4) NOT NULL,
-                          total_amount NUMERIC(10, 4) NOT NULL,
-                          sale_date    TIMESTAMP               DEFAULT CURRENT_TIMESTAMP
-                      );
-                      """)
-
-    # Sample sales data
-    sales_cur.executemany(
-        "INSERT INTO sales (customer_id, product_id, quantity, unit_price, total_amount) VALUES (%s, %s, %s, %s, %s)",
-        [(1, 1, 2, 9.99, 19.98),  # Alice bought 2 Widgets
-         (2, 2, 1, 14.99, 14.99),  # Bob bought 1 Gadget
-         (3, 3, 3, 24.99, 74.97)]  # Charlie bought 3 Tools
+
+class PooledConnection:
+    """Proxy handed out by ConnectionPool.acquire().
+
+    Behaves like the underlying DB-API connection, except that close()
+    (or leaving a `with` block) hands the connection back to the pool
+    instead of tearing down the TLS session.
+    """
+
+    def __init__(self, pool: "ConnectionPool", entry: _PoolEntry):
+        object.__setattr__(self, "_pool", pool)
+        object.__setattr__(self, "_entry", entry)
+
+    def __getattr__(self, item):
+        entry = self.__dict__.get("_entry")
+        if entry is None:
+            raise RuntimeError("Connection already returned to the pool")
+        return getattr(entry.conn, item)
+
+    def __setattr__(self, key, value):
+        if self._entry is None:
+            raise RuntimeError("Connection already returned to the pool")
+        setattr(self._entry.conn, key, value)
+
+    def close(self, discard: bool = False):
+        entry = self._entry
+        if entry is not None:
+            object.__setattr__(self, "_entry", None)
+            self._pool.release(entry, discard=discard)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        # An exception mid-query leaves the connection state unknown: throw it away
+        self.close(discard=exc_type is not None)
+        return False
+
+    def __del__(self):
+        # Safety net only: code paths release explicitly (`with` / try-finally).
+        # A proxy that is dropped without close() is discarded, not reused.
+        entry = self.__dict__.get("_entry")
+        if entry is not None:
+            object.__setattr__(self, "_entry", None)
+            self._pool.release(entry, discard=True)
+
+
+class ConnectionPool:
+    """Thread-safe pool of DB-API connections.
+
+    - keeps at least `min_size` and at most `max_size` connections
+    - health-checks a connection on checkout if it sat idle longer than
+      `healthcheck_after` seconds
+    - evicts connections idle longer than `idle_timeout` (down to min_size)
+    - counts checkouts, waits, timeouts, creations and evictions
+    """
+
+    def __init__(
+            self,
+            name: str,
+            connect: Callable[[], Any],
+            ping: Callable[[Any], None],
+            reset: Callable[[Any], None],
+            min_size: int = 1,
+            max_size: int = 10,
+            idle_timeout: float = 300.0,
+            healthcheck_after: float = 30.0,
+            checkout_timeout: float = 30.0,
+    ):
+        self.name = name
+        self.min_size = max(0, int(min_size))
+        self.max_size = max(1, int(max_size), self.min_size)
+        self.idle_timeout = idle_timeout
+        self.healthcheck_after = healthcheck_after
+        self.checkout_timeout = checkout_timeout
+        self._connect = connect
+        self._ping = ping
+        self._reset = reset
+        self._cond = threading.Condition()
+        self._idle: list[_PoolEntry] = []  # LIFO: hottest connection on top
+        self._size = 0
+        self._in_use = 0
+        self._reaper: threading.Thread | None = None
+        self._counters = {
+            "checkouts": 0,
+            "created": 0,
+            "closed": 0,
+            "evicted_idle": 0,
+            "health_check_failures": 0,
+            "waits": 0,
+            "timeouts": 0,
+        }
+        self._wait_time_total = 0.0
+
+    def acquire(self) -> PooledConnection:
+        start = time.monotonic()
+        deadline = start + self.checkout_timeout
+        self._ensure_reaper()
+        while True:
+            entry = None
+            with self._cond:
+                if self._idle:
+                    entry = self._idle.pop()
+                    self._in_use += 1
+                elif self._size < self.max_size:
+                    self._size += 1
+                    self._in_use += 1
+                else:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        self._counters["timeouts"] += 1
+                        raise PoolTimeoutError(
+                            f"Timed out after {self.checkout_timeout:.0f}s waiting for a '{self.name}' connection"
+                        )
+                    self._counters["waits"] += 1
+                    self._cond.wait(remaining)
+                    continue
+
+            if entry is None:
+                try:
+                    entry = _PoolEntry(self._connect())
+                except Exception:
+                    with self._cond:
+                        self._size -= 1
+                        self._in_use -= 1
+                        self._cond.notify()
+                    raise
+                with self._cond:
+                    self._counters["created"] += 1
+            elif time.monotonic() - entry.last_used > self.healthcheck_after:
+                try:
+                    self._ping(entry.conn)
+                except Exception:
+                    with self._cond:
+                        self._counters["health_check_failures"] += 1
+                    self._drop(entry)
+                    continue
+
+            waited = time.monotonic() - start
+            with self._cond:
+                self._counters["checkouts"] += 1
+                self._wait_time_total += waited
+            add_span("acquire", waited, pool=self.name)
+            return PooledConnection(self, entry)
+
+    def release(self, entry: _PoolEntry, discard: bool = False):
+        if not discard:
+            try:
+                self._reset(entry.conn)
+            except Exception:
+                discard = True
+        if discard:
+            self._drop(entry)
+            return
+        entry.last_used = time.monotonic()
+        with self._cond:
+            self._in_use -= 1
+            self._idle.append(entry)
+            self._cond.notify()
+
+    def _drop(self, entry: _PoolEntry):
+        """Close a checked-out connection and free its slot"""
+        try:
+            entry.conn.close()
+        except Exception:
+            pass
+        with self._cond:
+            self._size -= 1
+            self._in_use -= 1
+            self._counters["closed"] += 1
+            self._cond.notify()
+
+    def evict_idle(self) -> int:
+        now = time.monotonic()
+        victims = []
+        with self._cond:
+            # self._idle[0] is the least recently used connection
+            while self._idle and self._size > self.min_size and now - self._idle[0].last_used > self.idle_timeout:
+                victims.append(self._idle.pop(0))
+                self._size -= 1
+            self._counters["evicted_idle"] += len(victims)
+            self._counters["closed"] += len(victims)
+        for entry in victims:
+            try:
+                entry.conn.close()
+            except Exception:
+                pass
+        return len(victims)
+
+    def warm(self):
+        """Open connections until the pool holds min_size of them"""
+        conns = []
+        try:
+            while True:
+                with self._cond:
+                    if self._size >= self.min_size:
+                        break
+                conns.append(self.acquire())
+        finally:
+            for conn in conns:
+                conn.close()
+
+    def close_all(self):
+        with self._cond:
+            victims, self._idle = self._idle, []
+            self._size -= len(victims)
+            self._counters["closed"] += len(victims)
+        for entry in victims:
+            try:
+                entry.conn.close()
+            except Exception:
+                pass
+
+    def _ensure_reaper(self):
+        if self._reaper is not None or self.idle_timeout <= 0:
+            return
+        with self._cond:
+            if self._reaper is not None:
+                return
+            self._reaper = threading.Thread(target=self._reap_forever, name=f"pool-reaper-{self.name}", daemon=True)
+            self._reaper.start()
+
+    def _reap_forever(self):
+        while True:
+            time.sleep(max(1.0, self.idle_timeout / 2))
+            self.evict_idle()
+
+    def stats(self) -> dict:
+        with self._cond:
+            checkouts = self._counters["checkouts"]
+            return {
+                "name": self.name,
+                "size": self._size,
+                "idle": len(self._idle),
+                "in_use": self._in_use,
+                "min_size": self.min_size,
+                "max_size": self.max_size,
+                **self._counters,
+                "avg_checkout_wait_ms": round(self._wait_time_total / checkouts * 1000, 3) if checkouts else 0.0,
+            }
+
+
+def _ping_mysql(conn):
+    conn.ping(reconnect=False, attempts=1, delay=0)
+
+
+def _reset_mysql(conn):
+    if conn.unread_result:
+        conn.consume_results()
+    if conn.in_transaction:
+        conn.rollback()
+
+
+def _ping_pg(conn):
+    if conn.closed:
+        raise pg_driver().InterfaceError("connection already closed")
+    cur = conn.cursor()
+    cur.execute("SELECT 1")
+    cur.close()
+    conn.rollback()
+
+
+def _reset_pg(conn):
+    if conn.closed:
+        raise pg_driver().InterfaceError("connection already closed")
+    if conn.get_transaction_status() != pg_driver().extensions.TRANSACTION_STATUS_IDLE:
+        conn.rollback()
+    if conn.autocommit:
+        conn.autocommit = False
+
+
+def _make_pool(prefix: str, name: str, connect, ping, reset) -> ConnectionPool:
+    return ConnectionPool(
+        name,
+        connect,
+        ping,
+        reset,
+        min_size=int(_pool_setting(prefix, "MIN_SIZE", 1)),
+        max_size=int(_pool_setting(prefix, "MAX_SIZE", 10)),
+        idle_timeout=_pool_setting(prefix, "IDLE_TIMEOUT", 300),
+        healthcheck_after=_pool_setting(prefix, "HEALTHCHECK_AFTER", 30),
+        checkout_timeout=_pool_setting(prefix, "CHECKOUT_TIMEOUT", 30),
     )
-    sales_cnxn.close()
+
+
+MYSQL_POOL = _make_pool("MYSQL", "mysql", _connect_mysql, _ping_mysql, _reset_mysql)
+PG_POOL = _make_pool("PG", "pg_products", _connect_pg, _ping_pg, _reset_pg)
+PG_SALES_POOL = _make_pool("PG_SALES", "pg_sales", _connect_pg_sales, _ping_pg, _reset_pg)
+DB_POOLS = (MYSQL_POOL, PG_POOL, PG_SALES_POOL)
+
+
+def get_pool_metrics() -> dict:
+    """Snapshot of every connection pool's counters"""
+    return {pool.name: pool.stats() for pool in DB_POOLS}
 
 
 # ————————————————
-# 6. Helper Functions for Cross-Database Queries and Name Resolution
+# 6. Prepared Statement Cache
 # ————————————————
+# Hot statements run as server-side prepared statements that live on the
+# pooled connection: MySQL through prepared cursors, PostgreSQL through
+# PREPARE/EXECUTE. Each connection keeps up to STATEMENT_CACHE_SIZE of them
+# (LRU), so a repeated query skips the server's parse/plan step.
+# STATEMENT_CACHE_ENABLED=false falls back to plain cursors.
+STATEMENT_CACHE_ENABLED = os.getenv("STATEMENT_CACHE_ENABLED", "true").lower() in ("1", "true", "yes")
+STATEMENT_CACHE_SIZE = int(os.getenv("STATEMENT_CACHE_SIZE", "64"))
+
+_PG_PLACEHOLDER_RE = re.compile(r"%%|%s")
+_statement_ids = itertools.count(1)
+
+
+class StatementCache:
+    """Per-connection prepared statements for one pool, with shared hit/miss counters"""
+
+    def __init__(self, dialect: str, max_per_connection: int = STATEMENT_CACHE_SIZE):
+        self.dialect = dialect
+        self.max_per_connection = max(1, max_per_connection)
+        self._lock = threading.Lock()
+        self._counters = {"hits": 0, "misses": 0, "evictions": 0, "errors": 0}
+
+    def _count(self, key: str):
+        with self._lock:
+            self._counters[key] += 1
+
+    def execute(self, entry: _PoolEntry, sql: str, params=()):
+        # A checked-out entry belongs to one thread, so entry.statements needs no lock
+        statements = entry.statements
+        handle = statements.get(sql)
+        if handle is None:
+            self._count("misses")
+            handle = self._prepare(entry.conn, sql)
+            statements[sql] = handle
+            while len(statements) > self.max_per_connection:
+                _, old = statements.popitem(last=False)
+                self._count("evictions")
+                self._deallocate(entry.conn, old)
+        else:
+            self._count("hits")
+            statements.move_to_end(sql)
+        try:
+            return self._execute(entry.conn, handle, sql, params)
+        except Exception:
+            # The statement may be gone server-side; prepare it afresh next time
+            if statements.pop(sql, None) is not None:
+                self._deallocate(entry.conn, handle)
+            self._count("errors")
+            raise
+
+    def _prepare(self, conn, sql: str):
+        if self.dialect == "mysql":
+            # The cursor prepares on first execute and reuses the statement while the SQL is unchanged
+            return conn.cursor(prepared=True)
+        name = f"stmt_{next(_statement_ids)}"
+        count = 0
+
+        def placeholder(m):
+            nonlocal count
+            if m.group() == "%%":
+                return "%"
+            count += 1
+            return f"${count}"
+
+        cur = conn.cursor()
+        cur.execute(f"PREPARE {name} AS {_PG_PLACEHOLDER_RE.sub(placeholder, sql)}")
+        cur.close()
+        return name, count
+
+    def _execute(self, conn, handle, sql: str, params):
+        if self.dialect == "mysql":
+            handle.execute(sql, tuple(params))
+            return handle
+        name, count = handle
+        cur = conn.cursor()
+        if count:
+            cur.execute(f"EXECUTE {name} ({', '.join(['%s'] * count)})", tuple(params))
+        else:
+            cur.execute(f"EXECUTE {name}")
+        return cur
+
+    def _deallocate(self, conn, handle):
+        try:
+            if self.dialect == "mysql":
+                handle.close()
+            else:
+                if conn.get_transaction_status() == pg_driver().extensions.TRANSACTION_STATUS_INERROR:
+                    # DEALLOCATE cannot run inside the aborted transaction, and
+                    # nothing in it can be committed any more
+                    conn.rollback()
+                cur = conn.cursor()
+                cur.execute(f"DEALLOCATE {handle[0]}")
+                cur.close()
+        except Exception:
+            pass
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self._counters["hits"] + self._counters["misses"]
+            return {
+                **self._counters,
+                "hit_rate": round(self._counters["hits"] / lookups, 4) if lookups else 0.0,
+                "max_per_connection": self.max_per_connection,
+            }
+
+
+STATEMENT_CACHES = {
+    MYSQL_POOL.name: StatementCache("mysql"),
+    PG_POOL.name: StatementCache("postgresql"),
+    PG_SALES_POOL.name: StatementCache("postgresql"),
+}
+
+
+def execute_prepared(cnxn, sql: str, params=()):
+    """Execute sql as a cached prepared statement and return the cursor holding its result.
+
+    The cursor belongs to the connection's statement cache: fetch from it,
+    but do not close it. Unpooled connections get a plain cursor.
+    """
+    pool = getattr(cnxn, "__dict__", {}).get("_pool")
+    cache = STATEMENT_CACHES.get(pool.name) if STATEMENT_CACHE_ENABLED and pool is not None else None
+    with trace_span("execute", prepared=cache is not None):
+        if cache is None:
+            cur = cnxn.cursor()
+            cur.execute(sql, params)
+            return cur
+        return cache.execute(cnxn._entry, sql, params)
+
+
+def get_statement_metrics() -> dict:
+    """Prepared-statement cache counters per pool"""
+    return {name: cache.stats() for name, cache in STATEMENT_CACHES.items()}
+
+
+# ————————————————
+# 7. Running Blocking DB Work Off the Event Loop
+# ————————————————
+# mysql.connector and psycopg2 are blocking drivers. With
+# DB_EXECUTION_MODE=executor (the default) every tool body runs on a
+# per-backend thread pool so a slow query no longer stalls the FastMCP
+# event loop for other clients. The pool width is the backend's concurrency
+# limit (MYSQL_MAX_CONCURRENCY, PG_MAX_CONCURRENCY, PG_SALES_MAX_CONCURRENCY)
+# and defaults to the matching connection pool's max size. The embedded
+# SQLite backend gets its own pool (SQLITE_MAX_CONCURRENCY).
+# DB_EXECUTION_MODE=inline restores the old run-on-the-loop behaviour.
+DB_EXECUTION_MODE = os.getenv("DB_EXECUTION_MODE", "executor").lower()
+
+BACKEND_CONCURRENCY = {
+    MYSQL_POOL.name: int(os.getenv("MYSQL_MAX_CONCURRENCY", MYSQL_POOL.max_size)),
+    PG_POOL.name: int(os.getenv("PG_MAX_CONCURRENCY", PG_POOL.max_size)),
+    PG_SALES_POOL.name: int(os.getenv("PG_SALES_MAX_CONCURRENCY", PG_SALES_POOL.max_size)),
+    "sqlite": int(os.getenv("SQLITE_MAX_CONCURRENCY", "8")),
+}
+
+_DB_EXECUTORS = {
+    backend: ThreadPoolExecutor(max_workers=max(1, limit), thread_name_prefix=f"db-{backend}")
+    for backend, limit in BACKEND_CONCURRENCY.items()
+}
+
+
+async def run_db(backend: str, fn: Callable[..., Any], /, *args, **kwargs) -> Any:
+    """Run blocking DB code for `backend` without blocking the event loop"""
+    if DB_EXECUTION_MODE == "inline":
+        return fn(*args, **kwargs)
+    loop = asyncio.get_running_loop()
+    # copy_context() keeps contextvars (e.g. request-scoped state) visible in the worker thread
+    call = functools.partial(contextvars.copy_context().run, fn, *args, **kwargs)
+    return await loop.run_in_executor(_DB_EXECUTORS[backend], call)
+
+
+# ————————————————
+# 8. Instantiate your MCP server
+# ————————————————
+mcp = FastMCP("CRUDServer")
+
+
+@mcp.resource("stats://pools")
+def pool_metrics() -> dict:
+    """Connection pool sizes, checkout counts, waits and evictions per backend"""
+    return get_pool_metrics()
+
+
+@mcp.resource("stats://caches")
+def cache_metrics() -> dict:
+    """Hit/miss counters of the customer-name and product-details lookup caches"""
+    return get_cache_metrics()
+
+
+@mcp.resource("stats://startup")
+def startup_report() -> dict:
+    """Import/startup time and the drivers and settings loaded so far (with load times)"""
+    return STARTUP_REPORT
+
+
+# ————————————————
+# 9. Helper Functions for Cross-Database Queries and Name Resolution
+# ————————————————
+class TTLCache:
+    """Thread-safe LRU cache whose entries also expire after `ttl` seconds"""
+
+    _MISSING = object()
+
+    def __init__(self, name: str, maxsize: int, ttl: float):
+        self.name = name
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data = OrderedDict()  # key -> (expires_at, value), oldest first
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        self.invalidations = 0
+
+    def get(self, key, default=None):
+        with self._lock:
+            item = self._data.get(key, self._MISSING)
+            if item is self._MISSING:
+                self.misses += 1
+                return default
+            expires_at, value = item
+            if expires_at <= time.monotonic():
+                del self._data[key]
+                self.expirations += 1
+                self.misses += 1
+                return default
+            self._data.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def set(self, key, value):
+        if self.maxsize <= 0:
+            return
+        with self._lock:
+            self._data[key] = (time.monotonic() + self.ttl, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+                self.evictions += 1
+
+    def invalidate(self, *keys):
+        with self._lock:
+            for key in keys:
+                if self._data.pop(key, None) is not None:
+                    self.invalidations += 1
+
+    def clear(self):
+        with self._lock:
+            self.invalidations += len(self._data)
+            self._data.clear()
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "size": len(self._data),
+                "maxsize": self.maxsize,
+                "ttl_seconds": self.ttl,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+                "evictions": self.evictions,
+                "expirations": self.expirations,
+                "invalidations": self.invalidations,
+            }
+
+
+# Sales create/read resolve the same handful of customer and product ids over
+# and over; cache them in-process instead of hitting MySQL/PostgreSQL every
+# time. Only rows that exist are cached (no "Unknown ..." entries), and the
+# CRUD tools invalidate ids they update or delete. LOOKUP_CACHE_TTL_SECONDS
+# bounds staleness for changes made outside this server.
+LOOKUP_CACHE_MAX_ENTRIES = int(os.getenv("LOOKUP_CACHE_MAX_ENTRIES", "10000"))
+LOOKUP_CACHE_TTL_SECONDS = float(os.getenv("LOOKUP_CACHE_TTL_SECONDS", "300"))
+
+CUSTOMER_NAME_CACHE = TTLCache("customer_names", LOOKUP_CACHE_MAX_ENTRIES, LOOKUP_CACHE_TTL_SECONDS)
+PRODUCT_DETAILS_CACHE = TTLCache("product_details", LOOKUP_CACHE_MAX_ENTRIES, LOOKUP_CACHE_TTL_SECONDS)
+LOOKUP_CACHES = (CUSTOMER_NAME_CACHE, PRODUCT_DETAILS_CACHE)
+
+
+def _lru_stats(fn) -> dict:
+    """TTLCache.stats()-shaped counters for a functools.lru_cache-wrapped function"""
+    info = fn.cache_info()
+    lookups = info.hits + info.misses
+    return {
+        "size": info.currsize,
+        "maxsize": info.maxsize,
+        "hits": info.hits,
+        "misses": info.misses,
+        "hit_rate": round(info.hits / lookups, 4) if lookups else 0.0,
+    }
+
+
+def get_cache_metrics() -> dict:
+    """Hit/miss/eviction counters of the in-process lookup and compilation caches"""
+    metrics = {cache.name: cache.stats() for cache in LOOKUP_CACHES}
+    metrics["where_clause_plans"] = _lru_stats(_compile_where_template)
+    metrics["sales_read_columns"] = _lru_stats(_resolve_sales_columns)
+    metrics["sales_read_sql"] = _lru_stats(_sales_read_sql)
+    metrics["sales_aggregate_sql"] = _lru_stats(_sales_aggregate_sql)
+    metrics["rollup_aggregate_sql"] = _lru_stats(_rollup_aggregate_sql)
+    metrics["prepared_statements"] = get_statement_metrics()
+    return metrics
+
+
+def _lookup_customer_name(customer_id: int) -> str | None:
+    """Customer name from cache or MySQL; None when the customer does not exist"""
+    name = CUSTOMER_NAME_CACHE.get(customer_id)
+    if name is not None:
+        return name
+    with get_mysql_conn() as mysql_cnxn:
+        result = execute_prepared(mysql_cnxn, "SELECT Name FROM Customers WHERE Id = %s", (customer_id,)).fetchall()
+    result = result[0] if result else None
+    if not result:
+        return None
+    CUSTOMER_NAME_CACHE.set(customer_id, result[0])
+    return result[0]
+
+
+def _lookup_product_details(product_id: int) -> dict | None:
+    """Product name/price from cache or PostgreSQL; None when the product does not exist"""
+    details = PRODUCT_DETAILS_CACHE.get(product_id)
+    if details is not None:
+        return dict(details)
+    with get_pg_conn() as pg_cnxn:
+        result = execute_prepared(pg_cnxn, "SELECT name, price FROM products WHERE id = %s", (product_id,)).fetchone()
+    if not result:
+        return None
+    details = {"name": result[0], "price": float(result[1])}
+    PRODUCT_DETAILS_CACHE.set(product_id, details)
+    return dict(details)
+
+
 def get_customer_name(customer_id: int) -> str:
     """Fetch customer name from MySQL database"""
     try:
-        mysql_cnxn = get_mysql_conn()
-        mysql_cur = mysql_cnxn.cursor()
-        mysql_cur.execute("SELECT Name FROM Customers WHERE Id = %s", (customer_id,))
-        result = mysql_cur.fetchone()
-        mysql_cnxn.close()
-        return result[0] if result else f"Unknown Customer ({customer_id})"
+        name = _lookup_customer_name(customer_id)
+        return name if name is not None else f"Unknown Customer ({customer_id})"
     except Exception:
         return f"Unknown Customer ({customer_id})"
 
@@ -250,13 +1030,9 @@ def get_customer_name(customer_id: int) -> str:
 def get_product_details(product_id: int) -> dict:
     """Fetch product name and price from PostgreSQL products database"""
     try:
-        pg_cnxn = get_pg_conn()
-        pg_cur = pg_cnxn.cursor()
-        pg_cur.execute("SELECT name, price FROM products WHERE id = %s", (product_id,))
-        result = pg_cur.fetchone()
-        pg_cnxn.close()
-        if result:
-            return {"name": result[0], "price": float(result[1])}
+        details = _lookup_product_details(product_id)
+        if details:
+            return details
         else:
             return {"name": f"Unknown Product ({product_id})", "price": 0.0}
     except Exception:
@@ -266,12 +1042,7 @@ def get_product_details(product_id: int) -> dict:
 def validate_customer_exists(customer_id: int) -> bool:
     """Check if customer exists in MySQL database"""
     try:
-        mysql_cnxn = get_mysql_conn()
-        mysql_cur = mysql_cnxn.cursor()
-        mysql_cur.execute("SELECT COUNT(*) FROM Customers WHERE Id = %s", (customer_id,))
-        result = mysql_cur.fetchone()
-        mysql_cnxn.close()
-        return result[0] > 0 if result else False
+        return _lookup_customer_name(customer_id) is not None
     except Exception:
         return False
 
@@ -279,188 +1050,1126 @@ def validate_customer_exists(customer_id: int) -> bool:
 def validate_product_exists(product_id: int) -> bool:
     """Check if product exists in PostgreSQL products database"""
     try:
-        pg_cnxn = get_pg_conn()
-        pg_cur = pg_cnxn.cursor()
-        pg_cur.execute("SELECT COUNT(*) FROM products WHERE id = %s", (product_id,))
-        result = pg_cur.fetchone()
-        pg_cnxn.close()
-        return result[0] > 0 if result else False
+        return _lookup_product_details(product_id) is not None
     except Exception:
         return False
 
 
-def find_customer_by_name_enhanced(name: str) -> dict:
-    """Enhanced customer search that handles multiple matches intelligently"""
+# Bulk operations validate and write in chunks of this many rows per statement
+BULK_CHUNK_SIZE = int(os.getenv("BULK_CHUNK_SIZE", "1000"))
+
+
+def _chunks(items: list, size: int = BULK_CHUNK_SIZE):
+    for start in range(0, len(items), size):
+        yield items[start:start + size]
+
+
+def _as_int(value) -> int | None:
     try:
-        mysql_cnxn = get_mysql_conn()
+        return int(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def existing_customer_ids(customer_ids) -> set:
+    """Return the subset of customer_ids present in MySQL (one IN query per chunk)"""
+    ids = sorted(set(customer_ids))
+    found = set()
+    if not ids:
+        return found
+    with get_mysql_conn() as mysql_cnxn:
         mysql_cur = mysql_cnxn.cursor()
-        
-        # Search strategy with priorities:
-        # 1. Exact full name match (case insensitive)
-        # 2. Exact first name or last name match  
-        # 3. Partial name matches
-        
-        all_matches = []
-        
-        # 1. Try exact full name match (case insensitive)
-        mysql_cur.execute("SELECT Id, Name, Email FROM Customers WHERE LOWER(Name) = LOWER(%s)", (name,))
-        exact_matches = mysql_cur.fetchall()
-        
-        if exact_matches:
-            # If only one exact match, return it immediately
-            if len(exact_matches) == 1:
-                mysql_cnxn.close()
-                return {
-                    "found": True,
-                    "multiple_matches": False,
-                    "customer_id": exact_matches[0][0],
-                    "customer_name": exact_matches[0][1],
-                    "customer_email": exact_matches[0][2]
-                }
-            else:
-                # Multiple exact matches (rare but possible)
-                for match in exact_matches:
-                    all_matches.append({
-                        "id": match[0],
-                        "name": match[1], 
-                        "email": match[2],
-                        "match_type": "exact_full_name"
-                    })
-        
-        # 2. Try exact first name or last name match if no exact full name match
-        if not exact_matches:
-            mysql_cur.execute("""
-                SELECT Id, Name, Email FROM Customers 
-                WHERE LOWER(FirstName) = LOWER(%s) 
-                   OR LOWER(LastName) = LOWER(%s)
-            """, (name, name))
-            name_matches = mysql_cur.fetchall()
-            
-            for match in name_matches:
-                all_matches.append({
-                    "id": match[0],
-                    "name": match[1],
-                    "email": match[2], 
-                    "match_type": "exact_name_part"
-                })
-        
-        # 3. Try partial matches only if no exact matches found
-        if not all_matches:
-            mysql_cur.execute("""
-                SELECT Id, Name, Email FROM Customers 
-                WHERE LOWER(Name) LIKE LOWER(%s)
-                   OR LOWER(FirstName) LIKE LOWER(%s)
-                   OR LOWER(LastName) LIKE LOWER(%s)
-            """, (f"%{name}%", f"%{name}%", f"%{name}%"))
-            partial_matches = mysql_cur.fetchall()
-            
-            for match in partial_matches:
-                all_matches.append({
-                    "id": match[0],
-                    "name": match[1],
-                    "email": match[2],
-                    "match_type": "partial"
-                })
-        
-        mysql_cnxn.close()
-        
-        # Handle results
-        if not all_matches:
-            return {"found": False, "error": f"Customer '{name}' not found"}
-        
-        if len(all_matches) == 1:
-            match = all_matches[0]
-            return {
-                "found": True,
-                "multiple_matches": False,
-                "customer_id": match["id"],
-                "customer_name": match["name"],
-                "customer_email": match["email"]
-            }
-        
-        # Multiple matches found
-        return {
-            "found": True,
-            "multiple_matches": True,
-            "matches": all_matches,
-            "error": f"Multiple customers found matching '{name}'"
-        }
-        
-    except Exception as e:
-        return {"found": False, "error": f"Database error: {str(e)}"}
+        for chunk in _chunks(ids):
+            placeholders = ", ".join(["%s"] * len(chunk))
+            mysql_cur.execute(f"SELECT Id FROM Customers WHERE Id IN ({placeholders})", chunk)
+            found.update(r[0] for r in mysql_cur.fetchall())
+    return found
 
-def find_product_by_name(name: str) -> dict:
-    """Find product by name (supports partial matching)"""
-    try:
-        pg_cnxn = get_pg_conn()
+
+def get_product_prices(product_ids) -> dict:
+    """Map product id -> price for the ids present in PostgreSQL (single ANY() query)"""
+    ids = sorted(set(product_ids))
+    if not ids:
+        return {}
+    with get_pg_conn() as pg_cnxn:
         pg_cur = pg_cnxn.cursor()
-        
-        # Try exact match first
-        pg_cur.execute("SELECT id, name FROM products WHERE name = %s", (name,))
-        result = pg_cur.fetchone()
-        
-        if result:
-            pg_cnxn.close()
-            return {"id": result[0], "name": result[1], "found": True}
-        
-        # Try case-insensitive exact match
-        pg_cur.execute("SELECT id, name FROM products WHERE LOWER(name) = LOWER(%s)", (name,))
-        result = pg_cur.fetchone()
-        
-        if result:
-            pg_cnxn.close()
-            return {"id": result[0], "name": result[1], "found": True}
-        
-        # Try partial match
-        pg_cur.execute("SELECT id, name FROM products WHERE LOWER(name) LIKE LOWER(%s)", (f"%{name}%",))
-        result = pg_cur.fetchone()
-        
-        if result:
-            pg_cnxn.close()
-            return {"id": result[0], "name": result[1], "found": True}
-        
-        pg_cnxn.close()
-        return {"found": False, "error": f"Product '{name}' not found"}
-        
-    except Exception as e:
-        return {"found": False, "error": f"Database error: {str(e)}"}
+        pg_cur.execute("SELECT id, price FROM products WHERE id = ANY(%s)", (ids,))
+        return {r[0]: float(r[1]) for r in pg_cur.fetchall()}
 
 
-# ————————————————
-# 7. Enhanced MySQL CRUD Tool (Customers) with Smart Name Resolution
-# ————————————————
-# Fixed sqlserver_crud function with proper variable initialization
-@mcp.tool()
-async def sqlserver_crud(
-        operation: str,
-        name: str = None,
-        email: str = None,
-        limit: int = 10,
-        customer_id: int = None,
+def _row_error(index: int, message: str) -> dict:
+    return {"index": index, "status": "error", "error": message}
+
+
+def _bulk_response(sql_query: str | None, statuses: list, verb: str, noun: str) -> dict:
+    """Per-row statuses plus a one-line summary, in the usual {sql, result} shape"""
+    ok = sum(1 for s in statuses if s["status"] != "error")
+    icon = "✅" if ok == len(statuses) else ("⚠️" if ok else "❌")
+    return {
+        "sql": sql_query,
+        "result": statuses,
+        "summary": f"{icon} {ok} of {len(statuses)} {noun} {verb}.",
+    }
+
+
+# Read results come as one dict per row ("rows", the default) or, with
+# result_format="columnar", as {"columns", "types", "data"}: one array per
+# column, so names are sent once and each column is converted with a single
+# function chosen from its type instead of per-value checks.
+RESULT_FORMATS = ("rows", "columnar")
+
+_COLUMNAR_CONVERTERS = {"float": float, "datetime": datetime.isoformat, "date": date.isoformat}
+
+
+def _check_result_format(result_format: str | None) -> str | None:
+    """Error message for an unsupported result_format, else None"""
+    if result_format is None or result_format in RESULT_FORMATS:
+        return None
+    return f"❌ Unknown result_format '{result_format}'. Use one of: {', '.join(RESULT_FORMATS)}."
+
+
+def _columnar_type(values: list) -> str:
+    for v in values:
+        if v is None:
+            continue
+        if isinstance(v, bool):
+            return "bool"
+        if isinstance(v, int):
+            return "int"
+        if isinstance(v, (float, Decimal)):
+            return "float"
+        if isinstance(v, datetime):
+            return "datetime"
+        if isinstance(v, date):
+            return "date"
+        return "str"
+    return "str"
+
+
+def to_columnar(names: list, rows: list) -> dict:
+    """Encode row tuples as {"columns", "types", "data"}; values beyond len(names) are ignored"""
+    data = [list(col) for col in zip(*rows)][:len(names)] if rows else [[] for _ in names]
+    types = []
+    for i, values in enumerate(data):
+        kind = _columnar_type(values)
+        convert = _COLUMNAR_CONVERTERS.get(kind)
+        if convert:
+            data[i] = [None if v is None else convert(v) for v in values]
+        types.append(kind)
+    return {"columns": list(names), "types": types, "data": data}
+
+
+def records_to_columnar(records: list) -> dict:
+    """to_columnar for a list of row dicts (keys in first-seen order)"""
+    names = list(dict.fromkeys(k for r in records for k in r))
+    return to_columnar(names, [tuple(r.get(n) for n in names) for r in records])
+
+
+# Customer name search ranks matches into tiers and only the best tier is
+# returned: 1 = full name, 2 = first or last name, 3 = partial (n-gram
+# full-text or name prefix). Every branch of the UNION can use an index, so
+# the whole lookup is a single round-trip regardless of table size.
+CUSTOMER_MATCH_TYPES = {1: "exact_full_name", 2: "exact_name_part", 3: "partial"}
+CUSTOMER_SEARCH_LIMIT = int(os.getenv("CUSTOMER_SEARCH_LIMIT", "50"))
+
+CUSTOMER_SEARCH_EXACT_SQL = """
+    SELECT Id, Name, Email, 1 AS tier FROM Customers WHERE Name = %s
+    UNION ALL
+    SELECT Id, Name, Email, 2 AS tier FROM Customers WHERE FirstName = %s
+    UNION ALL
+    SELECT Id, Name, Email, 2 AS tier FROM Customers WHERE LastName = %s
+"""
+
+CUSTOMER_SEARCH_PARTIAL_SQL = """
+    UNION ALL
+    SELECT Id, Name, Email, 3 AS tier FROM Customers
+    WHERE MATCH (Name, FirstName, LastName) AGAINST (%s IN BOOLEAN MODE)
+    UNION ALL
+    SELECT Id, Name, Email, 3 AS tier FROM Customers WHERE Name LIKE %s
+"""
+
+
+def _like_escape(term: str) -> str:
+    """Escape LIKE wildcards (backslash is the default escape in MySQL and PostgreSQL)"""
+    return term.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+
+
+def _like_prefix(term: str) -> str:
+    return _like_escape(term) + "%"
+
+
+def search_customers(name: str, partial: bool = True, limit: int = CUSTOMER_SEARCH_LIMIT, cnxn=None) -> list:
+    """Best-tier customer matches for name as [{id, name, email, match_type}]"""
+    term = (name or "").strip()
+    if not term:
+        return []
+    sql = CUSTOMER_SEARCH_EXACT_SQL
+    params = [term, term, term]
+    if partial:
+        sql += CUSTOMER_SEARCH_PARTIAL_SQL
+        # Quoted boolean-mode phrase: with the ngram parser this is a substring match
+        params += ['"' + term.replace('"', " ") + '"', _like_prefix(term)]
+    sql = f"""
+        SELECT Id, Name, Email, MIN(tier) AS tier
+        FROM ({sql}) AS matches
+        GROUP BY Id, Name, Email
+        ORDER BY tier, Name, Id
+        LIMIT %s
+    """
+    params.append(limit)
+
+    if cnxn is None:
+        with get_mysql_conn() as mysql_cnxn:
+            rows = execute_prepared(mysql_cnxn, sql, params).fetchall()
+    else:
+        rows = execute_prepared(cnxn, sql, params).fetchall()
+
+    if not rows:
+        return []
+    best = rows[0][3]
+    return [
+        {"id": r[0], "name": r[1], "email": r[2], "match_type": CUSTOMER_MATCH_TYPES[r[3]]}
+        for r in rows if r[3] == best
+    ]
+
+
+def find_customer_by_name_enhanced(name: str, partial: bool = True, cnxn=None) -> dict:
+    """Enhanced customer search that handles multiple matches intelligently.
+
+    Pass the caller's connection as cnxn when it already holds one: a second
+    checkout from the same pool can deadlock once the pool is exhausted.
+    """
+    try:
+        all_matches = search_customers(name, partial=partial, cnxn=cnxn)
+    except Exception as e:
+        return {"found": False, "error": f"Database error: {str(e)}"}
+
+    # Handle results
+    if not all_matches:
+        return {"found": False, "error": f"Customer '{name}' not found"}
+
+    if len(all_matches) == 1:
+        match = all_matches[0]
+        CUSTOMER_NAME_CACHE.set(match["id"], match["name"])
+        return {
+            "found": True,
+            "multiple_matches": False,
+            "customer_id": match["id"],
+            "customer_name": match["name"],
+            "customer_email": match["email"]
+        }
+
+    # Multiple matches found
+    return {
+        "found": True,
+        "multiple_matches": True,
+        "matches": all_matches,
+        "error": f"Multiple customers found matching '{name}'"
+    }
+
+
+def _describe_customer_matches(matches: list) -> str:
+    return "\n".join(
+        f"- {m['name']} " + (f"(has email: {m['email']})" if m["email"] else "(no email)")
+        for m in matches
+    )
+
+# Product search is one ranked query over the pg_trgm GIN index: candidates
+# are substring (ILIKE) or trigram-similar (%) matches, ordered exact match
+# first, then case-insensitive exact, then by similarity.
+PRODUCT_SEARCH_SQL = """
+    SELECT id, name, similarity(name, %s) AS score
+    FROM products
+    WHERE name ILIKE %s OR name %% %s
+    ORDER BY name = %s DESC, lower(name) = lower(%s) DESC, score DESC, id
+    LIMIT %s
+"""
+
+
+def search_products(name: str, limit: int = 1, cnxn=None) -> list:
+    """Best product matches for name as [(id, name, similarity)]"""
+    term = (name or "").strip()
+    if not term:
+        return []
+    params = (term, f"%{_like_escape(term)}%", term, term, term, limit)
+    if cnxn is None:
+        with get_pg_conn() as pg_cnxn:
+            return execute_prepared(pg_cnxn, PRODUCT_SEARCH_SQL, params).fetchall()
+    return execute_prepared(cnxn, PRODUCT_SEARCH_SQL, params).fetchall()
+
+
+def find_product_by_name(name: str, cnxn=None) -> dict:
+    """Find product by name (supports partial and fuzzy matching); cnxn: the caller's held connection"""
+    try:
+        matches = search_products(name, cnxn=cnxn)
+    except Exception as e:
+        return {"found": False, "error": f"Database error: {str(e)}"}
+    if matches:
+        return {"id": matches[0][0], "name": matches[0][1], "found": True}
+    return {"found": False, "error": f"Product '{name}' not found"}
+
+
+# ————————————————
+# 10. Sync Pipeline: PostgreSQL (products, sales) → MySQL read model (ProductsCache, Sales)
+# ————————————————
+# sales_crud writes to PostgreSQL but reads the MySQL Sales/ProductsCache
+# join. Row-level triggers append every insert/update/delete on the
+# PostgreSQL tables to a change_log table; the sync worker drains that log
+# in batches, coalesces it per row, upserts/deletes the MySQL mirror and
+# records a watermark (last applied change id/time) per source. Applied log
+# rows are deleted afterwards, so a crash in between only re-applies
+# idempotent upserts and late-committing transactions are never skipped.
+SYNC_ENABLED = os.getenv("SYNC_ENABLED", "true").lower() in ("1", "true", "yes")
+SYNC_INTERVAL_SECONDS = float(os.getenv("SYNC_INTERVAL_SECONDS", "5"))
+SYNC_BATCH_SIZE = int(os.getenv("SYNC_BATCH_SIZE", "5000"))
+
+SYNC_WATERMARKS_DDL = """
+                      CREATE TABLE IF NOT EXISTS SyncWatermarks
+                      (
+                          source          VARCHAR(64) PRIMARY KEY,
+                          last_change_id  BIGINT      NOT NULL DEFAULT 0,
+                          last_change_at  TIMESTAMP   NULL,
+                          last_run_at     TIMESTAMP   NULL,
+                          rows_applied    BIGINT      NOT NULL DEFAULT 0
+                      );
+                      """
+
+
+def change_log_ddl(table: str) -> list[str]:
+    """DDL for the change_log table and the row trigger that feeds it for `table`"""
+    return [
+        """
+        CREATE TABLE IF NOT EXISTS change_log
+        (
+            id         BIGSERIAL PRIMARY KEY,
+            table_name TEXT        NOT NULL,
+            row_id     INT         NOT NULL,
+            op         CHAR(1)     NOT NULL,
+            changed_at TIMESTAMPTZ NOT NULL DEFAULT now()
+        );
+        """,
+        "CREATE INDEX IF NOT EXISTS change_log_table_id_idx ON change_log (table_name, id);",
+        """
+        CREATE OR REPLACE FUNCTION log_row_change() RETURNS trigger AS $$
+        BEGIN
+            IF TG_OP = 'DELETE' THEN
+                INSERT INTO change_log (table_name, row_id, op) VALUES (TG_TABLE_NAME, OLD.id, 'D');
+                RETURN OLD;
+            END IF;
+            INSERT INTO change_log (table_name, row_id, op) VALUES (TG_TABLE_NAME, NEW.id, LEFT(TG_OP, 1));
+            RETURN NEW;
+        END;
+        $$ LANGUAGE plpgsql;
+        """,
+        f"DROP TRIGGER IF EXISTS {table}_change_log ON {table};",
+        f"""
+        CREATE TRIGGER {table}_change_log
+            AFTER INSERT OR UPDATE OR DELETE ON {table}
+            FOR EACH ROW EXECUTE FUNCTION log_row_change();
+        """,
+    ]
+
+
+class SyncSource:
+    """A PostgreSQL table mirrored into a MySQL table by the sync pipeline"""
+
+    def __init__(self, name: str, connect: Callable[[], Any], select_sql: str, upsert_sql: str, delete_sql: str,
+                 on_batch: Callable[[Any, list, list], Callable[[], None]] | None = None):
+        self.name = name
+        self.connect = connect
+        self.select_sql = select_sql  # current rows for the changed ids (ANY(%s))
+        self.upsert_sql = upsert_sql  # MySQL INSERT ... ON DUPLICATE KEY UPDATE
+        self.delete_sql = delete_sql  # MySQL DELETE ... IN ({placeholders})
+        # (mysql_cur, upsert_ids, delete_ids) -> callback run after the batch is applied,
+        # inside the same MySQL transaction (keeps derived tables in step)
+        self.on_batch = on_batch
+        self.stats = {
+            "runs": 0,
+            "rows_upserted": 0,
+            "rows_deleted": 0,
+            "rows_failed": 0,
+            "errors": 0,
+            "last_error": None,
+            "last_run_duration_ms": 0.0,
+        }
+
+
+# Daily rollups of the MySQL Sales table (day × product, day × customer).
+# They are maintained inside the same MySQL transaction that changes Sales:
+# the sync worker and customer deletes (which cascade to Sales) snapshot the
+# affected groups before and after the write and add the difference, so a
+# re-applied batch is a no-op. rebuild_sales_rollups() recomputes them.
+SALES_ROLLUP_TABLES = (("SalesDailyProduct", "product_id"), ("SalesDailyCustomer", "customer_id"))
+
+SALES_ROLLUPS_DDL = [
+    f"""
+    CREATE TABLE IF NOT EXISTS {table}
+    (
+        sale_day       DATE           NOT NULL,
+        {key}          INT            NOT NULL,
+        sale_count     BIGINT         NOT NULL DEFAULT 0,
+        total_quantity BIGINT         NOT NULL DEFAULT 0,
+        total_revenue  DECIMAL(18, 4) NOT NULL DEFAULT 0,
+        PRIMARY KEY (sale_day, {key}),
+        INDEX idx_{table.lower()}_{key} ({key}, sale_day)
+    );
+    """
+    for table, key in SALES_ROLLUP_TABLES
+]
+
+
+def _sales_group_totals(mysql_cur, column: str, ids: list) -> dict:
+    """{(day, product_id, customer_id): [count, quantity, revenue]} of the Sales rows where column IN ids"""
+    totals = {}
+    for chunk in _chunks(sorted(set(ids))):
+        placeholders = ", ".join(["%s"] * len(chunk))
+        mysql_cur.execute(
+            f"""
+            SELECT DATE(sale_date), product_id, customer_id, COUNT(*), SUM(quantity), SUM(total_price)
+            FROM Sales WHERE {column} IN ({placeholders})
+            GROUP BY 1, 2, 3
+            """,
+            chunk,
+        )
+        for day, product_id, customer_id, count, quantity, revenue in mysql_cur.fetchall():
+            totals[(day, product_id, customer_id)] = [count, quantity, revenue]
+    return totals
+
+
+def _apply_rollup_deltas(mysql_cur, before: dict, after: dict):
+    deltas = {table: {} for table, _ in SALES_ROLLUP_TABLES}
+    for group in before.keys() | after.keys():
+        old = before.get(group, (0, 0, 0))
+        new = after.get(group, (0, 0, 0))
+        change = [n - o for n, o in zip(new, old)]
+        if not any(change):
+            continue
+        day, product_id, customer_id = group
+        for (table, _), key_value in zip(SALES_ROLLUP_TABLES, (product_id, customer_id)):
+            acc = deltas[table].setdefault((day, key_value), [0, 0, 0])
+            for i, v in enumerate(change):
+                acc[i] += v
+
+    for table, key in SALES_ROLLUP_TABLES:
+        if not deltas[table]:
+            continue
+        mysql_cur.executemany(
+            f"""
+            INSERT INTO {table} (sale_day, {key}, sale_count, total_quantity, total_revenue)
+            VALUES (%s, %s, %s, %s, %s)
+            ON DUPLICATE KEY UPDATE sale_count     = sale_count + VALUES(sale_count),
+                                    total_quantity = total_quantity + VALUES(total_quantity),
+                                    total_revenue  = total_revenue + VALUES(total_revenue)
+            """,
+            [(day, key_value, *change) for (day, key_value), change in deltas[table].items()],
+        )
+        emptied = [(day, key_value) for (day, key_value), change in deltas[table].items() if change[0] < 0]
+        if emptied:
+            mysql_cur.executemany(
+                f"DELETE FROM {table} WHERE sale_day = %s AND {key} = %s AND sale_count <= 0", emptied
+            )
+
+
+def track_sales_rollups(mysql_cur, column: str, ids: list) -> Callable[[], None]:
+    """Snapshot the rollup groups of Sales rows matching column IN ids; call the result after the write"""
+    if not ids:
+        return lambda: None
+    before = _sales_group_totals(mysql_cur, column, ids)
+
+    def finish():
+        _apply_rollup_deltas(mysql_cur, before, _sales_group_totals(mysql_cur, column, ids))
+
+    return finish
+
+
+def _rebuild_rollups(mysql_cur) -> dict:
+    counts = {}
+    for table, key in SALES_ROLLUP_TABLES:
+        mysql_cur.execute(f"DELETE FROM {table}")
+        mysql_cur.execute(
+            f"""
+            INSERT INTO {table} (sale_day, {key}, sale_count, total_quantity, total_revenue)
+            SELECT DATE(sale_date), {key}, COUNT(*), SUM(quantity), SUM(total_price)
+            FROM Sales GROUP BY 1, 2
+            """
+        )
+        counts[table] = mysql_cur.rowcount
+    return counts
+
+
+# Products first: Sales rows reference ProductsCache through a foreign key
+SYNC_SOURCES = (
+    SyncSource(
+        "products",
+        lambda: get_pg_conn(),
+        "SELECT id, name, price, description FROM products WHERE id = ANY(%s)",
+        """
+        INSERT INTO ProductsCache (id, name, price, description)
+        VALUES (%s, %s, %s, %s)
+        ON DUPLICATE KEY UPDATE name = VALUES(name), price = VALUES(price), description = VALUES(description)
+        """,
+        "DELETE FROM ProductsCache WHERE id IN ({placeholders})",
+        # Deleting a cached product cascades to its Sales rows
+        on_batch=lambda cur, upsert_ids, delete_ids: track_sales_rollups(cur, "product_id", delete_ids),
+    ),
+    SyncSource(
+        "sales",
+        lambda: get_pg_sales_conn(),
+        """
+        SELECT id, customer_id, product_id, quantity, unit_price, total_amount, sale_date
+        FROM sales WHERE id = ANY(%s)
+        """,
+        """
+        INSERT INTO Sales (Id, customer_id, product_id, quantity, unit_price, total_price, sale_date)
+        VALUES (%s, %s, %s, %s, %s, %s, %s)
+        ON DUPLICATE KEY UPDATE customer_id = VALUES(customer_id), product_id = VALUES(product_id),
+                                quantity = VALUES(quantity), unit_price = VALUES(unit_price),
+                                total_price = VALUES(total_price), sale_date = VALUES(sale_date)
+        """,
+        "DELETE FROM Sales WHERE Id IN ({placeholders})",
+        on_batch=lambda cur, upsert_ids, delete_ids: track_sales_rollups(cur, "Id", upsert_ids + delete_ids),
+    ),
+)
+
+_sync_lock = threading.Lock()
+_sync_wakeup = threading.Event()
+
+
+def _apply_upserts(mysql_cur, source: SyncSource, rows: list) -> int:
+    """Batched upsert; on a constraint failure retry row by row and skip the bad rows"""
+    integrity_error = mysql_driver().IntegrityError
+    try:
+        mysql_cur.executemany(source.upsert_sql, rows)
+        return 0
+    except integrity_error:
+        failed = 0
+        for row in rows:
+            try:
+                mysql_cur.execute(source.upsert_sql, row)
+            except integrity_error as e:
+                failed += 1
+                logger.warning("sync %s row %s skipped: %s", source.name, row[0], e)
+        return failed
+
+
+def sync_source_once(source: SyncSource) -> int:
+    """Drain the change log of one source into MySQL; returns the number of changes applied"""
+    applied = 0
+    with source.connect() as pg_cnxn, get_mysql_conn() as mysql_cnxn:
+        pg_cur = pg_cnxn.cursor()
+        mysql_cur = mysql_cnxn.cursor()
+        while True:
+            pg_cur.execute(
+                "SELECT id, row_id, op, changed_at FROM change_log WHERE table_name = %s ORDER BY id LIMIT %s",
+                (source.name, SYNC_BATCH_SIZE),
+            )
+            changes = pg_cur.fetchall()
+            if not changes:
+                break
+
+            # Coalesce: only the latest operation per row matters
+            latest = {}
+            for _, row_id, op, _ in changes:
+                latest[row_id] = op
+            upsert_ids = [row_id for row_id, op in latest.items() if op != "D"]
+            rows = []
+            if upsert_ids:
+                pg_cur.execute(source.select_sql, (upsert_ids,))
+                rows = pg_cur.fetchall()
+            # Rows deleted after their change was logged count as deletes
+            present = {r[0] for r in rows}
+            delete_ids = [row_id for row_id in latest if row_id not in present]
+            pg_cnxn.rollback()  # end the read transaction before the MySQL write
+
+            last_id, last_at = changes[-1][0], changes[-1][3]
+            mysql_cnxn.start_transaction()
+            after_batch = source.on_batch(mysql_cur, [r[0] for r in rows], delete_ids) if source.on_batch else None
+            failed = _apply_upserts(mysql_cur, source, rows) if rows else 0
+            for chunk in _chunks(delete_ids):
+                mysql_cur.execute(source.delete_sql.format(placeholders=", ".join(["%s"] * len(chunk))), chunk)
+            if after_batch:
+                after_batch()
+            mysql_cur.execute(
+                """
+                INSERT INTO SyncWatermarks (source, last_change_id, last_change_at, last_run_at, rows_applied)
+                VALUES (%s, %s, %s, NOW(), %s)
+                ON DUPLICATE KEY UPDATE last_change_id = VALUES(last_change_id),
+                                        last_change_at = VALUES(last_change_at),
+                                        last_run_at    = VALUES(last_run_at),
+                                        rows_applied   = rows_applied + VALUES(rows_applied)
+                """,
+                (source.name, last_id, last_at, len(rows) + len(delete_ids) - failed),
+            )
+            mysql_cnxn.commit()
+
+            # Only now is it safe to forget the applied changes. Delete exactly the
+            # ids read: ids are taken at insert, not at commit, so a transaction
+            # with a lower id may commit after this batch and must stay queued.
+            pg_cur.execute("DELETE FROM change_log WHERE id = ANY(%s)", ([c[0] for c in changes],))
+            pg_cnxn.commit()
+
+            source.stats["rows_upserted"] += len(rows) - failed
+            source.stats["rows_deleted"] += len(delete_ids)
+            source.stats["rows_failed"] += failed
+            applied += len(changes)
+            if len(changes) < SYNC_BATCH_SIZE:
+                break
+    return applied
+
+
+def run_sync_once() -> dict:
+    """One pass over every source; returns {source: changes applied}"""
+    applied = {}
+    with _sync_lock:
+        for source in SYNC_SOURCES:
+            start = time.monotonic()
+            source.stats["runs"] += 1
+            try:
+                applied[source.name] = sync_source_once(source)
+            except Exception as e:
+                source.stats["errors"] += 1
+                source.stats["last_error"] = str(e)
+                applied[source.name] = 0
+                logger.warning("sync %s failed: %s", source.name, e)
+            source.stats["last_run_duration_ms"] = round((time.monotonic() - start) * 1000, 3)
+    return applied
+
+
+def rebuild_sales_rollups() -> dict:
+    """Recompute the daily rollups from Sales (backfill or repair); returns rows written per table"""
+    with _sync_lock, get_mysql_conn() as mysql_cnxn:
+        mysql_cur = mysql_cnxn.cursor()
+        mysql_cnxn.start_transaction()
+        counts = _rebuild_rollups(mysql_cur)
+        mysql_cnxn.commit()
+    return counts
+
+
+def request_sync():
+    """Ask the sync worker to run now instead of waiting for the next interval"""
+    _sync_wakeup.set()
+
+
+def _sync_forever():
+    while True:
+        _sync_wakeup.wait(SYNC_INTERVAL_SECONDS)
+        _sync_wakeup.clear()
+        run_sync_once()
+
+
+def start_sync_worker() -> threading.Thread:
+    worker = threading.Thread(target=_sync_forever, name="pg-mysql-sync", daemon=True)
+    worker.start()
+    return worker
+
+
+def get_sync_metrics() -> dict:
+    """Per-source watermark, backlog and lag of the PostgreSQL → MySQL sync"""
+    metrics = {}
+    watermarks = {}
+    try:
+        with get_mysql_conn() as mysql_cnxn:
+            mysql_cur = mysql_cnxn.cursor()
+            mysql_cur.execute("SELECT source, last_change_id, last_change_at, last_run_at, rows_applied FROM SyncWatermarks")
+            watermarks = {r[0]: r[1:] for r in mysql_cur.fetchall()}
+    except Exception as e:
+        metrics["error"] = str(e)
+
+    for source in SYNC_SOURCES:
+        entry = dict(source.stats)
+        last_change_id, last_change_at, last_run_at, rows_applied = watermarks.get(source.name, (0, None, None, 0))
+        entry.update({
+            "last_change_id": last_change_id,
+            "last_change_at": last_change_at.isoformat() if last_change_at else None,
+            "last_run_at": last_run_at.isoformat() if last_run_at else None,
+            "rows_applied_total": rows_applied,
+        })
+        try:
+            with source.connect() as pg_cnxn:
+                pg_cur = pg_cnxn.cursor()
+                pg_cur.execute(
+                    """
+                    SELECT COUNT(*), COALESCE(EXTRACT(EPOCH FROM now() - MIN(changed_at)), 0)
+                    FROM change_log WHERE table_name = %s
+                    """,
+                    (source.name,),
+                )
+                pending, lag_seconds = pg_cur.fetchone()
+            entry["pending_changes"] = pending
+            entry["lag_seconds"] = round(float(lag_seconds), 3)
+        except Exception as e:
+            entry["pending_changes"] = None
+            entry["lag_seconds"] = None
+            entry["last_error"] = str(e)
+        metrics[source.name] = entry
+    return metrics
+
+
+@mcp.resource("stats://sync")
+def sync_metrics() -> dict:
+    """Watermarks, pending change counts and replication lag of the sales/products sync"""
+    return get_sync_metrics()
+
+
+# ————————————————
+# 11. Schema Migrations & Seeding
+# ————————————————
+# Every database records the migrations it has applied in a schema_version
+# table. Startup applies only the pending ones, on the three remote
+# databases in parallel, so a warm restart is one version check per
+# database. Migrations never drop anything. Version 1 is the original
+# schema written with IF NOT EXISTS, so it also adopts databases created
+# by the old drop-and-recreate setup. Sample rows are written only by the
+# explicit `seed` command, and only into empty tables.
+#
+# To change a schema, append a Migration to its list. Never edit one that has shipped.
+SCHEMA_VERSION_DDL = """
+    CREATE TABLE IF NOT EXISTS schema_version
+    (
+        version     INT          PRIMARY KEY,
+        description VARCHAR(200) NOT NULL,
+        applied_at  TIMESTAMP    DEFAULT CURRENT_TIMESTAMP
+    )
+    """
+
+
+class Migration:
+    """One schema version: SQL statements and/or callables taking a cursor"""
+
+    def __init__(self, version: int, description: str, steps: list):
+        self.version = version
+        self.description = description
+        self.steps = steps
+
+
+class MigrationTarget:
+    """A database plus its ordered migrations"""
+
+    def __init__(self, name: str, connect: Callable[[], Any], migrations: list[Migration],
+                 lock_sql: str | None = None, unlock_sql: str | None = None, param: str = "%s"):
+        self.name = name
+        self.connect = connect
+        self.migrations = migrations
+        # Serializes replicas that start at the same time (session-level lock)
+        self.lock_sql = lock_sql
+        self.unlock_sql = unlock_sql
+        self.param = param  # placeholder style of the driver
+
+    @property
+    def latest(self) -> int:
+        return max((m.version for m in self.migrations), default=0)
+
+
+# Secondary indexes declared inline in MySQL version 1. On a database adopted
+# from the old drop-and-recreate setup the tables already existed, so
+# CREATE TABLE IF NOT EXISTS skipped them; version 4 adds whichever are missing.
+MYSQL_INDEXES = [
+    ("Customers", "idx_customers_name", "INDEX idx_customers_name (Name)"),
+    ("Customers", "idx_customers_first_name", "INDEX idx_customers_first_name (FirstName)"),
+    ("Customers", "idx_customers_last_name", "INDEX idx_customers_last_name (LastName)"),
+    ("Customers", "ft_customers_names",
+     "FULLTEXT INDEX ft_customers_names (Name, FirstName, LastName) WITH PARSER ngram"),
+    ("ProductsCache", "idx_products_cache_name", "INDEX idx_products_cache_name (name)"),
+    ("Sales", "idx_sales_date_id", "INDEX idx_sales_date_id (sale_date, Id)"),
+    ("Sales", "idx_sales_total_price", "INDEX idx_sales_total_price (total_price)"),
+]
+
+
+def _add_missing_indexes(mysql_cur) -> list:
+    """ALTER TABLE ... ADD each MYSQL_INDEXES entry the database does not have yet"""
+    added = []
+    for table, index, definition in MYSQL_INDEXES:
+        mysql_cur.execute(
+            """
+            SELECT COUNT(*) FROM information_schema.statistics
+            WHERE table_schema = DATABASE() AND table_name = %s AND index_name = %s
+            """,
+            (table, index),
+        )
+        if mysql_cur.fetchone()[0]:
+            continue
+        logger.info("Adding index %s on %s", index, table)
+        mysql_cur.execute(f"ALTER TABLE {table} ADD {definition}")
+        added.append(index)
+    return added
+
+
+MYSQL_MIGRATIONS = [
+    Migration(1, "Customers, ProductsCache and Sales", [
+        """
+        CREATE TABLE IF NOT EXISTS Customers
+        (
+            Id        INT AUTO_INCREMENT PRIMARY KEY,
+            FirstName VARCHAR(50) NOT NULL,
+            LastName  VARCHAR(50) NOT NULL,
+            Name      VARCHAR(100) NOT NULL,
+            Email     VARCHAR(100),
+            CreatedAt TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            -- Name lookups compare with =/prefix LIKE under a case-insensitive
+            -- collation, so these B-tree indexes are usable (no LOWER()).
+            INDEX idx_customers_name (Name),
+            INDEX idx_customers_first_name (FirstName),
+            INDEX idx_customers_last_name (LastName),
+            -- n-gram full-text index serves the "partial name" tier
+            FULLTEXT INDEX ft_customers_names (Name, FirstName, LastName) WITH PARSER ngram
+        ) DEFAULT CHARSET = utf8mb4 COLLATE = utf8mb4_unicode_ci;
+        """,
+        # Copy of PostgreSQL products for easier joins (kept current by the sync pipeline)
+        """
+        CREATE TABLE IF NOT EXISTS ProductsCache
+        (
+            id          INT PRIMARY KEY,
+            name        VARCHAR(100) NOT NULL,
+            price       DECIMAL(10, 4) NOT NULL,
+            description TEXT,
+            INDEX idx_products_cache_name (name)
+        );
+        """,
+        """
+        CREATE TABLE IF NOT EXISTS Sales
+        (
+            Id           INT AUTO_INCREMENT PRIMARY KEY,
+            customer_id  INT            NOT NULL,
+            product_id   INT            NOT NULL,
+            quantity     INT            NOT NULL DEFAULT 1,
+            unit_price   DECIMAL(10, 4) NOT NULL,
+            total_price  DECIMAL(10, 4) NOT NULL,
+            sale_date    TIMESTAMP      DEFAULT CURRENT_TIMESTAMP,
+            -- Date-range filters and the (sale_date, Id) keyset order
+            INDEX idx_sales_date_id (sale_date, Id),
+            INDEX idx_sales_total_price (total_price),
+            FOREIGN KEY (customer_id) REFERENCES Customers(Id) ON DELETE CASCADE,
+            FOREIGN KEY (product_id) REFERENCES ProductsCache(id) ON DELETE CASCADE
+        );
+        """,
+    ]),
+    Migration(2, "sync watermarks", [SYNC_WATERMARKS_DDL]),
+    # Backfilled from whatever Sales already holds
+    Migration(3, "daily sales rollups", SALES_ROLLUPS_DDL + [_rebuild_rollups]),
+    Migration(4, "name, full-text and sales indexes on adopted tables", [_add_missing_indexes]),
+]
+
+PG_PRODUCTS_MIGRATIONS = [
+    Migration(1, "products with trigram name index", [
+        "CREATE EXTENSION IF NOT EXISTS pg_trgm;",
+        """
+        CREATE TABLE IF NOT EXISTS products
+        (
+            id          SERIAL PRIMARY KEY,
+            name        TEXT           NOT NULL,
+            price       NUMERIC(10, 4) NOT NULL,
+            description TEXT
+        );
+        """,
+        # Trigram index: serves name ILIKE '%x%' and the similarity operator (%)
+        "CREATE INDEX IF NOT EXISTS products_name_trgm_idx ON products USING gin (name gin_trgm_ops);",
+    ]),
+    Migration(2, "products change_log trigger", change_log_ddl("products")),
+]
+
+PG_SALES_MIGRATIONS = [
+    Migration(1, "sales", [
+        """
+        CREATE TABLE IF NOT EXISTS sales
+        (
+            id           SERIAL PRIMARY KEY,
+            customer_id  INT            NOT NULL,
+            product_id   INT            NOT NULL,
+            quantity     INT            NOT NULL DEFAULT 1,
+            unit_price   NUMERIC(10, 4) NOT NULL,
+            total_amount NUMERIC(10, 4) NOT NULL,
+            sale_date    TIMESTAMP               DEFAULT CURRENT_TIMESTAMP
+        );
+        """,
+    ]),
+    Migration(2, "sales change_log trigger", change_log_ddl("sales")),
+]
+
+
+def _mysql_migration_conn():
+    """Pooled MySQL connection, creating the database on first deploy"""
+    try:
+        return get_mysql_conn()
+    except mysql_driver().Error as e:
+        if e.errno != mysql_driver().errorcode.ER_BAD_DB_ERROR:
+            raise
+    with get_mysql_conn(server_only=True) as root_cnx:
+        root_cnx.cursor().execute(f"CREATE DATABASE IF NOT EXISTS `{mysql_settings()['database']}`;")
+    return get_mysql_conn()
+
+
+_PG_MIGRATION_LOCK = 7250021  # pg_advisory_lock key shared by every replica
+
+MIGRATION_TARGETS = (
+    MigrationTarget(MYSQL_POOL.name, _mysql_migration_conn, MYSQL_MIGRATIONS,
+                    "SELECT GET_LOCK('schema_migrations', 300)", "SELECT RELEASE_LOCK('schema_migrations')"),
+    MigrationTarget(PG_POOL.name, get_pg_conn, PG_PRODUCTS_MIGRATIONS,
+                    f"SELECT pg_advisory_lock({_PG_MIGRATION_LOCK})", f"SELECT pg_advisory_unlock({_PG_MIGRATION_LOCK})"),
+    MigrationTarget(PG_SALES_POOL.name, get_pg_sales_conn, PG_SALES_MIGRATIONS,
+                    f"SELECT pg_advisory_lock({_PG_MIGRATION_LOCK})", f"SELECT pg_advisory_unlock({_PG_MIGRATION_LOCK})"),
+)
+
+
+def migrate_database(target: MigrationTarget) -> dict:
+    """Apply target's pending migrations in order; each one is recorded (and committed) on its own"""
+    started = time.perf_counter()
+    cnxn = target.connect()
+    try:
+        cur = cnxn.cursor()
+        if target.lock_sql:
+            cur.execute(target.lock_sql)
+            cur.fetchall()
+        try:
+            cur.execute(SCHEMA_VERSION_DDL)
+            cur.execute("SELECT COALESCE(MAX(version), 0) FROM schema_version")
+            current = cur.fetchone()[0]
+            cnxn.commit()
+            applied = []
+            for migration in target.migrations:
+                if migration.version <= current:
+                    continue
+                logger.info("Migrating %s to version %d: %s", target.name, migration.version, migration.description)
+                for step in migration.steps:
+                    if callable(step):
+                        step(cur)
+                    else:
+                        cur.execute(step)
+                cur.execute(
+                    f"INSERT INTO schema_version (version, description) VALUES ({target.param}, {target.param})",
+                    (migration.version, migration.description),
+                )
+                cnxn.commit()
+                applied.append(migration.version)
+        except Exception:
+            cnxn.rollback()
+            raise
+        finally:
+            if target.unlock_sql:
+                cur.execute(target.unlock_sql)
+                cur.fetchall()
+    finally:
+        cnxn.close()
+    return {
+        "from_version": current,
+        "version": applied[-1] if applied else current,
+        "latest": target.latest,
+        "applied": applied,
+        "duration_ms": round((time.perf_counter() - started) * 1000, 1),
+    }
+
+
+def run_migrations(targets=MIGRATION_TARGETS) -> dict:
+    """Bring every database to its latest schema version, all databases in parallel"""
+    with ThreadPoolExecutor(max_workers=max(1, len(targets)), thread_name_prefix="migrate") as executor:
+        futures = {target.name: executor.submit(migrate_database, target) for target in targets}
+    report = {name: future.result() for name, future in futures.items()}
+    for name, status in report.items():
+        logger.info("Schema %s at version %d (%d applied, %.1f ms)", name, status["version"], len(status["applied"]),
+                    status["duration_ms"])
+    return report
+
+
+def seed_table(cur, table: str, insert_sql: str, rows: list) -> int:
+    """Insert sample rows when the table is empty; returns the number of rows written"""
+    cur.execute(f"SELECT 1 FROM {table} LIMIT 1")
+    if cur.fetchall():
+        return 0
+    cur.executemany(insert_sql, rows)
+    return len(rows)
+
+
+def seed_databases() -> dict:
+    """Sample rows for the demo (the `seed` command). Only empty tables are filled; nothing is dropped."""
+    seeded = {}
+
+    # ---------- MySQL (Customers, read model) ----------
+    with get_mysql_conn() as sql_cnx:
+        sql_cur = sql_cnx.cursor()
+        sql_cnx.start_transaction()
+        seeded["Customers"] = seed_table(
+            sql_cur, "Customers",
+            "INSERT INTO Customers (FirstName, LastName, Name, Email) VALUES (%s, %s, %s, %s)",
+            [("Alice", "Johnson", "Alice Johnson", "alice@example.com"),
+             ("Bob", "Smith", "Bob Smith", "bob@example.com"),
+             ("Charlie", "Brown", "Charlie Brown", None)]  # Charlie has no email for null handling demo
+        )
+        seeded["ProductsCache"] = seed_table(
+            sql_cur, "ProductsCache",
+            "INSERT INTO ProductsCache (id, name, price, description) VALUES (%s, %s, %s, %s)",
+            [(1, "Widget", 9.99, "A standard widget."),
+             (2, "Gadget", 14.99, "A useful gadget."),
+             (3, "Tool", 24.99, None)]  # Tool has no description for null handling demo
+        )
+        seeded["Sales"] = seed_table(
+            sql_cur, "Sales",
+            "INSERT INTO Sales (customer_id, product_id, quantity, unit_price, total_price) VALUES (%s, %s, %s, %s, %s)",
+            [(1, 1, 2, 9.99, 19.98),  # Alice bought 2 Widgets
+             (2, 2, 1, 14.99, 14.99),  # Bob bought 1 Gadget
+             (3, 3, 3, 24.99, 74.97)]  # Charlie bought 3 Tools
+        )
+        if seeded["Sales"]:
+            _rebuild_rollups(sql_cur)
+        sql_cnx.commit()
+
+    # ---------- PostgreSQL (Products) ----------
+    with get_pg_conn() as pg_cnxn:
+        seeded["products"] = seed_table(
+            pg_cnxn.cursor(), "products",
+            "INSERT INTO products (name, price, description) VALUES (%s, %s, %s)",
+            [("Widget", 9.99, "A standard widget."),
+             ("Gadget", 14.99, "A useful gadget."),
+             ("Tool", 24.99, "A handy tool.")]
+        )
+        pg_cnxn.commit()
+
+    # ---------- PostgreSQL Sales Database ----------
+    with get_pg_sales_conn() as sales_cnxn:
+        seeded["sales"] = seed_table(
+            sales_cnxn.cursor(), "sales",
+            "INSERT INTO sales (customer_id, product_id, quantity, unit_price, total_amount) VALUES (%s, %s, %s, %s, %s)",
+            [(1, 1, 2, 9.99, 19.98),  # Alice bought 2 Widgets
+             (2, 2, 1, 14.99, 14.99),  # Bob bought 1 Gadget
+             (3, 3, 3, 24.99, 74.97)]  # Charlie bought 3 Tools
+        )
+        sales_cnxn.commit()
+    return seeded
+
+
+# ————————————————
+# 12. Enhanced MySQL CRUD Tool (Customers) with Smart Name Resolution
+# ————————————————
+def _customers_bulk(operation: str, records: list) -> dict:
+    """Bulk create/update/delete for MySQL Customers with per-row status"""
+    if not records or not isinstance(records, list):
+        return {"sql": None, "result": f"❌ 'records' (a list of objects) required for {operation}."}
+    statuses: list = [None] * len(records)
+
+    if operation == "bulk_create":
+        rows, row_index = [], []
+        for i, rec in enumerate(records):
+            rec = rec if isinstance(rec, dict) else {}
+            name, email = (rec.get("name") or "").strip(), rec.get("email")
+            if not name or not email:
+                statuses[i] = _row_error(i, "'name' and 'email' required for create.")
+                continue
+            name_parts = name.split(' ', 1)
+            rows.append((name_parts[0], name_parts[1] if len(name_parts) > 1 else "", name, email))
+            row_index.append(i)
+
+        sql_query = "INSERT INTO Customers (FirstName, LastName, Name, Email) VALUES (%s, %s, %s, %s)"
+        if rows:
+            with get_mysql_conn() as cnxn:
+                cur = cnxn.cursor()
+                # mysql.connector rewrites an INSERT executemany into one multi-row VALUES statement
+                for chunk in _chunks(rows):
+                    cur.executemany(sql_query, chunk)
+                cnxn.commit()
+        for i, row in zip(row_index, rows):
+            statuses[i] = {"index": i, "status": "created", "name": row[2]}
+        return _bulk_response(sql_query, statuses, "created", "customers")
+
+    if operation == "bulk_update":
+        updates = {}
+        for i, rec in enumerate(records):
+            rec = rec if isinstance(rec, dict) else {}
+            customer_id = _as_int(rec.get("customer_id"))
+            if not customer_id or not rec.get("new_email"):
+                statuses[i] = _row_error(i, "'customer_id' and 'new_email' required for update.")
+                continue
+            updates.setdefault(customer_id, []).append(i)
+
+        known = existing_customer_ids(updates)
+        sql_query = "UPDATE Customers SET Email = CASE Id WHEN %s THEN %s ... END WHERE Id IN (...)"
+        with get_mysql_conn() as cnxn:
+            cur = cnxn.cursor()
+            for chunk in _chunks(sorted(known)):
+                # Last record wins when the same customer appears twice
+                emails = [records[updates[cid][-1]]["new_email"] for cid in chunk]
+                case_sql = " ".join(["WHEN %s THEN %s"] * len(chunk))
+                placeholders = ", ".join(["%s"] * len(chunk))
+                params = [v for pair in zip(chunk, emails) for v in pair] + list(chunk)
+                cur.execute(f"UPDATE Customers SET Email = CASE Id {case_sql} END WHERE Id IN ({placeholders})", params)
+            cnxn.commit()
+        CUSTOMER_NAME_CACHE.invalidate(*known)
+        for customer_id, indexes in updates.items():
+            for i in indexes:
+                if customer_id in known:
+                    statuses[i] = {"index": i, "status": "updated", "customer_id": customer_id}
+                else:
+                    statuses[i] = _row_error(i, f"Customer with ID {customer_id} not found.")
+        return _bulk_response(sql_query, statuses, "updated", "customers")
+
+    # bulk_delete: records are customer ids or {"customer_id": ...}
+    targets = {}
+    for i, rec in enumerate(records):
+        customer_id = _as_int(rec.get("customer_id") if isinstance(rec, dict) else rec)
+        if not customer_id:
+            statuses[i] = _row_error(i, "'customer_id' required for delete.")
+            continue
+        targets.setdefault(customer_id, []).append(i)
+
+    known = existing_customer_ids(targets)
+    sql_query = "DELETE FROM Customers WHERE Id IN (...)"
+    with get_mysql_conn() as cnxn:
+        cur = cnxn.cursor()
+        # The deletes cascade to Sales; keep the rollups in step
+        cnxn.start_transaction()
+        update_rollups = track_sales_rollups(cur, "customer_id", list(known))
+        for chunk in _chunks(sorted(known)):
+            placeholders = ", ".join(["%s"] * len(chunk))
+            cur.execute(f"DELETE FROM Customers WHERE Id IN ({placeholders})", chunk)
+        update_rollups()
+        cnxn.commit()
+    CUSTOMER_NAME_CACHE.invalidate(*known)
+    for customer_id, indexes in targets.items():
+        for i in indexes:
+            if customer_id in known:
+                statuses[i] = {"index": i, "status": "deleted", "customer_id": customer_id}
+            else:
+                statuses[i] = _row_error(i, f"Customer with ID {customer_id} not found.")
+    return _bulk_response(sql_query, statuses, "deleted", "customers")
+
+
+# Fixed sqlserver_crud function with proper variable initialization
+def _sqlserver_crud(
+        operation: str,
+        name: str = None,
+        email: str = None,
+        limit: int = 10,
+        customer_id: int = None,
         new_email: str = None,
         table_name: str = None,
+        records: list[dict] = None,  # Rows for bulk_create / bulk_update / bulk_delete
+        result_format: str = None,  # read: "rows" (default) or "columnar"
 ) -> Any:
-    cnxn = get_mysql_conn()
+    if operation in ("bulk_create", "bulk_update", "bulk_delete"):
+        return _customers_bulk(operation, records)
+    format_error = _check_result_format(result_format)
+    if format_error:
+        return {"sql": None, "result": format_error}
+
+    with get_mysql_conn() as cnxn:
+        return _customers_operation(cnxn, operation, name, email, limit, customer_id, new_email, table_name,
+                                    result_format)
+
+
+def _customers_operation(cnxn, operation, name, email, limit, customer_id, new_email, table_name,
+                         result_format) -> Any:
+    """One sqlserver_crud operation on a checked-out connection (released by the caller)"""
     cur = cnxn.cursor()
 
     if operation == "create":
         if not name or not email:
-            cnxn.close()
             return {"sql": None, "result": "❌ 'name' and 'email' required for create."}
 
         # NEW LOGIC: Check if customer with this name already exists
         # Search for existing customers with the same first name or full name
         search_name = name.strip()
         
-        # Check for exact name matches or first name matches
-        cur.execute("""
-            SELECT Id, Name, Email FROM Customers 
-            WHERE LOWER(Name) = LOWER(%s) 
-               OR LOWER(FirstName) = LOWER(%s)
-               OR LOWER(Name) LIKE LOWER(%s)
-        """, (search_name, search_name, f"%{search_name}%"))
-        
-        existing_customers = cur.fetchall()
+        # Best-ranked matches (full name, then first/last name, then partial)
+        existing_customers = [
+            (m["id"], m["name"], m["email"]) for m in search_customers(search_name, cnxn=cnxn)
+        ]
         
         if existing_customers:
             # Filter out customers who already have emails
@@ -471,14 +2180,13 @@ async def sqlserver_crud(
                 # Only one customer found
                 existing_customer = existing_customers[0]
                 if existing_customer[2]:  # Already has email
-                    cnxn.close()
                     return {"sql": None, "result": f"ℹ️ Customer '{existing_customer[1]}' already has email '{existing_customer[2]}'. If you want to update it, please specify the full name."}
                 else:
                     # Customer exists but no email, update with the email
                     sql_query = "UPDATE Customers SET Email = %s WHERE Id = %s"
-                    cur.execute(sql_query, (email, existing_customer[0]))
+                    execute_prepared(cnxn, sql_query, (email, existing_customer[0]))
                     cnxn.commit()
-                    cnxn.close()
+                    CUSTOMER_NAME_CACHE.invalidate(existing_customer[0])
                     return {"sql": sql_query, "result": f"✅ Email '{email}' added to existing customer '{existing_customer[1]}'."}
             
             elif len(existing_customers) > 1:
@@ -489,7 +2197,6 @@ async def sqlserver_crud(
                     customer_list.append(f"- {c[1]} {email_status}")
                 
                 customer_details = "\n".join(customer_list)
-                cnxn.close()
                 return {"sql": None, "result": f"❓ Multiple customers found with name '{search_name}':\n{customer_details}\n\nPlease specify the full name (first and last name) to identify which customer you want to add the email to, or use a different name if you want to create a new customer."}
 
         # No existing customer found, create new customer
@@ -501,7 +2208,6 @@ async def sqlserver_crud(
         sql_query = "INSERT INTO Customers (FirstName, LastName, Name, Email) VALUES (%s, %s, %s, %s)"
         cur.execute(sql_query, (first_name, last_name, name, email))
         cnxn.commit()
-        cnxn.close()
         return {"sql": sql_query, "result": f"✅ New customer '{name}' created with email '{email}'."}
     elif operation == "read":
         # Handle filtering by name if provided
@@ -515,7 +2221,7 @@ async def sqlserver_crud(
                         ORDER BY Id ASC
                         LIMIT %s
                         """
-            cur.execute(sql_query, (f"%{name}%", f"%{name}%", f"%{name}%", limit))
+            params = (f"%{name}%", f"%{name}%", f"%{name}%", limit)
         else:
             sql_query = """
                         SELECT Id, FirstName, LastName, Name, Email, CreatedAt
@@ -523,21 +2229,27 @@ async def sqlserver_crud(
                         ORDER BY Id ASC
                         LIMIT %s
                         """
-            cur.execute(sql_query, (limit,))
-        
-        rows = cur.fetchall()
-        result = [
-            {
-                "Id": r[0],
-                "FirstName": r[1],
-                "LastName": r[2],
-                "Name": r[3],
-                "Email": r[4],
-                "CreatedAt": r[5].isoformat()
-            }
-            for r in rows
-        ]
-        cnxn.close()
+            params = (limit,)
+        with trace_span("execute"):
+            cur.execute(sql_query, params)
+        with trace_span("fetch"):
+            rows = cur.fetchall()
+
+        with trace_span("process"):
+            if result_format == "columnar":
+                result = to_columnar(["Id", "FirstName", "LastName", "Name", "Email", "CreatedAt"], rows)
+            else:
+                result = [
+                    {
+                        "Id": r[0],
+                        "FirstName": r[1],
+                        "LastName": r[2],
+                        "Name": r[3],
+                        "Email": r[4],
+                        "CreatedAt": r[5].isoformat()
+                    }
+                    for r in rows
+                ]
         return {"sql": sql_query, "result": result}
 
     elif operation == "update":
@@ -546,34 +2258,16 @@ async def sqlserver_crud(
         
         # Enhanced update: resolve customer_id from name if not provided
         if not customer_id and name:
-            # Use the original find_customer_by_name function if enhanced version not available
-            try:
-                customer_info = find_customer_by_name(name)
-                if not customer_info["found"]:
-                    cnxn.close()
-                    return {"sql": None, "result": f"❌ {customer_info['error']}"}
-                customer_id = customer_info["id"]
-                customer_name = customer_info["name"]
-            except Exception as search_error:
-                # Fallback to direct database search
-                cur.execute("""
-                    SELECT Id, Name FROM Customers 
-                    WHERE LOWER(Name) = LOWER(%s) 
-                       OR LOWER(FirstName) = LOWER(%s)
-                       OR LOWER(LastName) = LOWER(%s)
-                    LIMIT 1
-                """, (name, name, name))
-                result = cur.fetchone()
-                
-                if result:
-                    customer_id = result[0]
-                    customer_name = result[1]
-                else:
-                    cnxn.close()
-                    return {"sql": None, "result": f"❌ Customer '{name}' not found"}
+            # Exact full/first/last name only: never update or delete on a partial match
+            customer_info = find_customer_by_name_enhanced(name, partial=False, cnxn=cnxn)
+            if not customer_info["found"]:
+                return {"sql": None, "result": f"❌ {customer_info['error']}"}
+            if customer_info["multiple_matches"]:
+                return {"sql": None, "result": f"❓ {customer_info['error']}:\n{_describe_customer_matches(customer_info['matches'])}\n\nPlease specify the full name or the customer ID."}
+            customer_id = customer_info["customer_id"]
+            customer_name = customer_info["customer_name"]
         
         if not customer_id or not new_email:
-            cnxn.close()
             return {"sql": None, "result": "❌ 'customer_id' (or 'name') and 'new_email' required for update."}
 
         # Check if customer already has this email
@@ -581,7 +2275,6 @@ async def sqlserver_crud(
         existing_customer = cur.fetchone()
         
         if not existing_customer:
-            cnxn.close()
             return {"sql": None, "result": f"❌ Customer with ID {customer_id} not found."}
         
         # Set customer_name if not already set
@@ -589,13 +2282,12 @@ async def sqlserver_crud(
             customer_name = existing_customer[0]
         
         if existing_customer[1] == new_email:
-            cnxn.close()
             return {"sql": None, "result": f"ℹ️ Customer '{customer_name}' already has email '{new_email}'."}
 
         sql_query = "UPDATE Customers SET Email = %s WHERE Id = %s"
-        cur.execute(sql_query, (new_email, customer_id))
+        execute_prepared(cnxn, sql_query, (new_email, customer_id))
         cnxn.commit()
-        cnxn.close()
+        CUSTOMER_NAME_CACHE.invalidate(customer_id)
         
         return {"sql": sql_query, "result": f"✅ Customer '{customer_name}' email updated to '{new_email}'."}
 
@@ -605,43 +2297,30 @@ async def sqlserver_crud(
         
         # Enhanced delete: resolve customer_id from name if not provided
         if not customer_id and name:
-            try:
-                customer_info = find_customer_by_name(name)
-                if not customer_info["found"]:
-                    cnxn.close()
-                    return {"sql": None, "result": f"❌ {customer_info['error']}"}
-                customer_id = customer_info["id"]
-                customer_name = customer_info["name"]
-            except Exception as search_error:
-                # Fallback to direct database search
-                cur.execute("""
-                    SELECT Id, Name FROM Customers 
-                    WHERE LOWER(Name) = LOWER(%s) 
-                       OR LOWER(FirstName) = LOWER(%s)
-                       OR LOWER(LastName) = LOWER(%s)
-                    LIMIT 1
-                """, (name, name, name))
-                result = cur.fetchone()
-                
-                if result:
-                    customer_id = result[0]
-                    customer_name = result[1]
-                else:
-                    cnxn.close()
-                    return {"sql": None, "result": f"❌ Customer '{name}' not found"}
+            # Exact full/first/last name only: never update or delete on a partial match
+            customer_info = find_customer_by_name_enhanced(name, partial=False, cnxn=cnxn)
+            if not customer_info["found"]:
+                return {"sql": None, "result": f"❌ {customer_info['error']}"}
+            if customer_info["multiple_matches"]:
+                return {"sql": None, "result": f"❓ {customer_info['error']}:\n{_describe_customer_matches(customer_info['matches'])}\n\nPlease specify the full name or the customer ID."}
+            customer_id = customer_info["customer_id"]
+            customer_name = customer_info["customer_name"]
         elif customer_id:
             # Get customer name for response
             cur.execute("SELECT Name FROM Customers WHERE Id = %s", (customer_id,))
             result = cur.fetchone()
             customer_name = result[0] if result else f"Customer {customer_id}"
         else:
-            cnxn.close()
             return {"sql": None, "result": "❌ 'customer_id' or 'name' required for delete."}
 
         sql_query = "DELETE FROM Customers WHERE Id = %s"
-        cur.execute(sql_query, (customer_id,))
+        # The delete cascades to the customer's Sales rows; keep the rollups in step
+        cnxn.start_transaction()
+        update_rollups = track_sales_rollups(cur, "customer_id", [customer_id])
+        execute_prepared(cnxn, sql_query, (customer_id,))
+        update_rollups()
         cnxn.commit()
-        cnxn.close()
+        CUSTOMER_NAME_CACHE.invalidate(customer_id)
         return {"sql": sql_query, "result": f"✅ Customer '{customer_name}' deleted."}
 
     elif operation == "describe":
@@ -660,19 +2339,130 @@ async def sqlserver_crud(
             }
             for r in rows
         ]
-        cnxn.close()
         return {"sql": sql_query, "result": result}
 
     else:
-        cnxn.close()
         return {"sql": None, "result": f"❌ Unknown operation '{operation}'."}
 
 
+@mcp.tool()
+@traced_tool
+async def sqlserver_crud(
+        operation: str,
+        name: str = None,
+        email: str = None,
+        limit: int = 10,
+        customer_id: int = None,
+        new_email: str = None,
+        table_name: str = None,
+        records: list[dict] = None,  # Rows for bulk_create / bulk_update / bulk_delete
+        result_format: str = None,  # read: "rows" (default) or "columnar"
+) -> Any:
+    return await run_storage("customers", **locals())
+
+
 # ————————————————
-# 8. Enhanced PostgreSQL CRUD Tool (Products) with Smart Name Resolution
+# 13. Enhanced PostgreSQL CRUD Tool (Products) with Smart Name Resolution
 # ————————————————
-@mcp.tool()
-async def postgresql_crud(
+def _products_bulk(operation: str, records: list) -> dict:
+    """Bulk create/update/delete for PostgreSQL products with per-row status"""
+    if not records or not isinstance(records, list):
+        return {"sql": None, "result": f"❌ 'records' (a list of objects) required for {operation}."}
+    statuses: list = [None] * len(records)
+
+    if operation == "bulk_create":
+        rows, row_index = [], []
+        for i, rec in enumerate(records):
+            rec = rec if isinstance(rec, dict) else {}
+            try:
+                price = float(rec["price"])
+            except (KeyError, TypeError, ValueError):
+                price = None
+            if not rec.get("name") or price is None:
+                statuses[i] = _row_error(i, "'name' and 'price' required for create.")
+                continue
+            rows.append((rec["name"], price, rec.get("description")))
+            row_index.append(i)
+
+        sql_query = "INSERT INTO products (name, price, description) VALUES %s RETURNING id"
+        if rows:
+            with get_pg_conn() as cnxn:
+                cur = cnxn.cursor()
+                new_ids = execute_values(cur, sql_query, rows, page_size=BULK_CHUNK_SIZE, fetch=True)
+                cnxn.commit()
+            for i, (new_id,) in zip(row_index, new_ids):
+                statuses[i] = {"index": i, "status": "created", "product_id": new_id}
+        return _bulk_response(sql_query, statuses, "created", "products")
+
+    if operation == "bulk_update":
+        updates = {}
+        for i, rec in enumerate(records):
+            rec = rec if isinstance(rec, dict) else {}
+            product_id = _as_int(rec.get("product_id"))
+            try:
+                new_price = float(rec["new_price"])
+            except (KeyError, TypeError, ValueError):
+                new_price = None
+            if not product_id or new_price is None:
+                statuses[i] = _row_error(i, "'product_id' and 'new_price' required for update.")
+                continue
+            updates.setdefault(product_id, []).append((i, new_price))
+
+        sql_query = """
+                    UPDATE products AS p
+                    SET    price = v.price
+                    FROM   (VALUES %s) AS v(id, price)
+                    WHERE  p.id = v.id
+                    RETURNING p.id
+                    """
+        updated = set()
+        if updates:
+            # Last record wins when the same product appears twice
+            rows = [(product_id, entries[-1][1]) for product_id, entries in updates.items()]
+            with get_pg_conn() as cnxn:
+                cur = cnxn.cursor()
+                returned = execute_values(cur, sql_query, rows, template="(%s::int, %s::numeric)",
+                                          page_size=BULK_CHUNK_SIZE, fetch=True)
+                cnxn.commit()
+            updated = {r[0] for r in returned}
+            PRODUCT_DETAILS_CACHE.invalidate(*updated)
+        for product_id, entries in updates.items():
+            for i, _ in entries:
+                if product_id in updated:
+                    statuses[i] = {"index": i, "status": "updated", "product_id": product_id}
+                else:
+                    statuses[i] = _row_error(i, f"Product with ID {product_id} not found.")
+        return _bulk_response(sql_query, statuses, "updated", "products")
+
+    # bulk_delete: records are product ids or {"product_id": ...}
+    targets = {}
+    for i, rec in enumerate(records):
+        product_id = _as_int(rec.get("product_id") if isinstance(rec, dict) else rec)
+        if not product_id:
+            statuses[i] = _row_error(i, "'product_id' required for delete.")
+            continue
+        targets.setdefault(product_id, []).append(i)
+
+    sql_query = "DELETE FROM products WHERE id = ANY(%s) RETURNING id"
+    deleted = set()
+    if targets:
+        with get_pg_conn() as cnxn:
+            cur = cnxn.cursor()
+            for chunk in _chunks(sorted(targets)):
+                cur.execute(sql_query, (chunk,))
+                deleted.update(r[0] for r in cur.fetchall())
+            cnxn.commit()
+        PRODUCT_DETAILS_CACHE.invalidate(*deleted)
+    for product_id, indexes in targets.items():
+        for i in indexes:
+            if product_id in deleted:
+                statuses[i] = {"index": i, "status": "deleted", "product_id": product_id}
+            else:
+                statuses[i] = _row_error(i, f"Product with ID {product_id} not found.")
+    return _bulk_response(sql_query, statuses, "deleted", "products")
+
+
+def _postgresql_crud(
         operation: str,
         name: str = None,
         price: float = None,
@@ -681,19 +2471,32 @@ async def postgresql_crud(
         product_id: int = None,
         new_price: float = None,
         table_name: str = None,
+        records: list[dict] = None,  # Rows for bulk_create / bulk_update / bulk_delete
+        result_format: str = None,  # read: "rows" (default) or "columnar"
 ) -> Any:
-    cnxn = get_pg_conn()
+    if operation in ("bulk_create", "bulk_update", "bulk_delete"):
+        return _products_bulk(operation, records)
+    format_error = _check_result_format(result_format)
+    if format_error:
+        return {"sql": None, "result": format_error}
+
+    with get_pg_conn() as cnxn:
+        return _products_operation(cnxn, operation, name, price, description, limit, product_id, new_price,
+                                   table_name, result_format)
+
+
+def _products_operation(cnxn, operation, name, price, description, limit, product_id, new_price, table_name,
+                        result_format) -> Any:
+    """One postgresql_crud operation on a checked-out connection (released by the caller)"""
     cur = cnxn.cursor()
 
     if operation == "create":
         if not name or price is None:
-            cnxn.close()
             return {"sql": None, "result": "❌ 'name' and 'price' required for create."}
         sql_query = "INSERT INTO products (name, price, description) VALUES (%s, %s, %s)"
         cur.execute(sql_query, (name, price, description))
         cnxn.commit()
         result = f"✅ Product '{name}' added with price ${price:.2f}."
-        cnxn.close()
         return {"sql": sql_query, "result": result}
 
     elif operation == "read":
@@ -702,11 +2505,11 @@ async def postgresql_crud(
             sql_query = """
                         SELECT id, name, price, description
                         FROM products
-                        WHERE LOWER(name) LIKE LOWER(%s)
-                        ORDER BY id ASC
+                        WHERE name ILIKE %s OR name %% %s
+                        ORDER BY similarity(name, %s) DESC, id ASC
                         LIMIT %s
                         """
-            cur.execute(sql_query, (f"%{name}%", limit))
+            params = (f"%{_like_escape(name)}%", name, name, limit)
         else:
             sql_query = """
                         SELECT id, name, price, description
@@ -714,47 +2517,50 @@ async def postgresql_crud(
                         ORDER BY id ASC
                         LIMIT %s
                         """
-            cur.execute(sql_query, (limit,))
-        
-        rows = cur.fetchall()
-        result = [
-            {"id": r[0], "name": r[1], "price": float(r[2]), "description": r[3] or ""}
-            for r in rows
-        ]
-        cnxn.close()
+            params = (limit,)
+        with trace_span("execute"):
+            cur.execute(sql_query, params)
+        with trace_span("fetch"):
+            rows = cur.fetchall()
+
+        with trace_span("process"):
+            if result_format == "columnar":
+                result = to_columnar(["id", "name", "price", "description"], rows)
+            else:
+                result = [
+                    {"id": r[0], "name": r[1], "price": float(r[2]), "description": r[3] or ""}
+                    for r in rows
+                ]
         return {"sql": sql_query, "result": result}
 
     elif operation == "update":
         # Enhanced update: resolve product_id from name if not provided
         if not product_id and name:
-            product_info = find_product_by_name(name)
+            product_info = find_product_by_name(name, cnxn=cnxn)
             if not product_info["found"]:
-                cnxn.close()
                 return {"sql": None, "result": f"❌ {product_info['error']}"}
             product_id = product_info["id"]
         
         if not product_id or new_price is None:
-            cnxn.close()
             return {"sql": None, "result": "❌ 'product_id' (or 'name') and 'new_price' required for update."}
         
         sql_query = "UPDATE products SET price = %s WHERE id = %s"
-        cur.execute(sql_query, (new_price, product_id))
+        execute_prepared(cnxn, sql_query, (new_price, product_id))
         cnxn.commit()
+        PRODUCT_DETAILS_CACHE.invalidate(product_id)
         
         # Get updated product name for response
         cur.execute("SELECT name FROM products WHERE id = %s", (product_id,))
         product_name = cur.fetchone()
         product_name = product_name[0] if product_name else f"Product {product_id}"
         
-        cnxn.close()
         return {"sql": sql_query, "result": f"✅ Product '{product_name}' price updated to ${new_price:.2f}."}
 
     elif operation == "delete":
         # Enhanced delete: resolve product_id from name if not provided
         if not product_id and name:
-            product_info = find_product_by_name(name)
+            product_info = find_product_by_name(name, cnxn=cnxn)
             if not product_info["found"]:
-                cnxn.close()
                 return {"sql": None, "result": f"❌ {product_info['error']}"}
             product_id = product_info["id"]
             product_name = product_info["name"]
@@ -764,13 +2570,12 @@ async def postgresql_crud(
             result = cur.fetchone()
             product_name = result[0] if result else f"Product {product_id}"
         else:
-            cnxn.close()
             return {"sql": None, "result": "❌ 'product_id' or 'name' required for delete."}
 
         sql_query = "DELETE FROM products WHERE id = %s"
-        cur.execute(sql_query, (product_id,))
+        execute_prepared(cnxn, sql_query, (product_id,))
         cnxn.commit()
-        cnxn.close()
+        PRODUCT_DETAILS_CACHE.invalidate(product_id)
         return {"sql": sql_query, "result": f"✅ Product '{product_name}' deleted."}
 
     elif operation == "describe":
@@ -792,22 +2597,1018 @@ async def postgresql_crud(
             }
             for r in rows
         ]
-        cnxn.close()
         return {"sql": sql_query, "result": result}
 
     else:
-        cnxn.close()
         return {"sql": None, "result": f"❌ Unknown operation '{operation}'."}
 
 
+@mcp.tool()
+@traced_tool
+async def postgresql_crud(
+        operation: str,
+        name: str = None,
+        price: float = None,
+        description: str = None,
+        limit: int = 10,
+        product_id: int = None,
+        new_price: float = None,
+        table_name: str = None,
+        records: list[dict] = None,  # Rows for bulk_create / bulk_update / bulk_delete
+        result_format: str = None,  # read: "rows" (default) or "columnar"
+) -> Any:
+    return await run_storage("products", **locals())
+
+
 # ————————————————
-# 9. Sales CRUD Tool with Display Formatting Features (Unchanged)
+# 14. Sales Read Filters: where_clause compiler
 # ————————————————
+# sales_crud(read) accepts free-text conditions such as
+#   "total price > 50 and (customer name like 'ali' or quantity at least 3)"
+# The clause is tokenized with precompiled patterns and its literals
+# (numbers, quoted strings, dates) are replaced by slots. The resulting
+# template is parsed into an AND/OR tree over SALES_COLUMNS and rendered as
+# parameterized SQL. Compilation is memoized per template, so repeated
+# queries that only differ in their literals skip parsing entirely.
+
+# Fixed column mappings - standardized naming
+SALES_COLUMNS = {
+    "sale_id": "s.Id",
+    "first_name": "c.FirstName",
+    "last_name": "c.LastName",
+    "customer_name": "c.Name",  # Use the Name field which has full name
+    "product_name": "p.name",
+    "product_description": "p.description",
+    "quantity": "s.quantity",
+    "unit_price": "s.unit_price",
+    "total_price": "s.total_price",
+    "amount": "s.total_price",  # Alias for total_price
+    "sale_date": "s.sale_date",
+    "date": "s.sale_date",  # Alias for sale_date
+    "customer_email": "c.Email",
+    "email": "c.Email"  # Alias for customer_email
+}
+
+# Value type per column alias (anything not listed is text)
+SALES_COLUMN_TYPES = {
+    "sale_id": "int",
+    "quantity": "int",
+    "unit_price": "num",
+    "total_price": "num",
+    "amount": "num",
+    "sale_date": "date",
+    "date": "date",
+}
+
+WHERE_CACHE_SIZE = int(os.getenv("WHERE_CACHE_SIZE", "1024"))
+
+
+class FilterError(ValueError):
+    """A where_clause or filter_conditions value that cannot be compiled"""
+
+
+_WHERE_TOKEN_RE = re.compile(r"""
+      (?P<string>'[^']*'|"[^"]*")
+    | (?P<date>\d{4}-\d{2}-\d{2}(?:[ tT]\d{2}:\d{2}(?::\d{2})?)?)
+    | (?P<number>\$?-?\d+(?:\.\d+)?)
+    | (?P<symbol>>=|<=|!=|<>|==|=|>|<|\(|\)|,)
+    | (?P<word>[^\s'"(),<>=!]+)
+""", re.VERBOSE)
+_DATE_ONLY_RE = re.compile(r"^\d{4}-\d{2}-\d{2}$")
+
+
+def _phrases(table: dict) -> list:
+    """[(words, value)] with the longest phrase first, so 'at least' wins over 'at'"""
+    return sorted(((tuple(k.split()), v) for k, v in table.items()), key=lambda kv: -len(kv[0]))
+
+
+_FIELD_PHRASES = _phrases({
+    **{alias: alias for alias in SALES_COLUMNS},
+    **{alias.replace("_", " "): alias for alias in SALES_COLUMNS},
+    "customer": "customer_name",
+    "product": "product_name",
+    "description": "product_description",
+    "price": "total_price",
+    "total": "total_price",
+    "qty": "quantity",
+    "id": "sale_id",
+})
+
+_OP_PHRASES = _phrases({
+    ">": "gt", "exceeds": "gt", "exceed": "gt", "above": "gt", "over": "gt",
+    "greater than": "gt", "more than": "gt", "after": "gt",
+    ">=": "gte", "at least": "gte", "no less than": "gte", "on or after": "gte", "since": "gte",
+    "<": "lt", "below": "lt", "under": "lt", "less than": "lt", "fewer than": "lt", "before": "lt",
+    "<=": "lte", "at most": "lte", "no more than": "lte", "on or before": "lte", "up to": "lte",
+    "=": "eq", "==": "eq", "equals": "eq", "equal to": "eq", "on": "eq",
+    "!=": "ne", "<>": "ne", "not": "ne", "not equal to": "ne",
+    "like": "contains", "contains": "contains", "containing": "contains", "includes": "contains",
+    "starts with": "prefix", "starting with": "prefix", "begins with": "prefix", "beginning with": "prefix",
+    "between": "between",
+    "in": "in", "one of": "in",
+    "null": "is_null", "empty": "is_null", "missing": "is_null",
+    "not null": "not_null", "not empty": "not_null",
+})
+
+# Words that may precede a condition without meaning anything ("where", "show sales with ...")
+_WHERE_FILLER_WORDS = ("where", "with", "whose", "which", "that", "the", "a", "an", "all", "only",
+                       "sales", "sale", "records", "rows", "orders", "having",
+                       "show", "list", "display", "get", "find", "give", "me", "for")
+# Units that may follow a number ("over 10 dollars") and are ignored
+_NUMBER_UNIT_WORDS = ("dollars", "dollar", "usd", "bucks", "units", "unit", "items", "item", "pcs", "pieces")
+# Fallback for a clause the grammar rejects: its first number compares total_price
+_GENERIC_NUMBER_OPS = (("gt", ("exceed", "exceeds", "above", "greater", "more", "over")),
+                       ("lt", ("below", "less", "under", "fewer")))
+# Tokens that end an unquoted value such as: customer name alice johnson and ...
+_VALUE_STOP_WORDS = frozenset(("and", "or", "(", ")", ",", ">", ">=", "<", "<=", "=", "==", "!=", "<>"))
+_COMPARISON_OPS = ("eq", "ne", "gt", "gte", "lt", "lte")
+
+
+def _tokenize_where(clause: str) -> tuple:
+    """Split a clause into (template, literals): literals become ('?', kind) slots"""
+    template, literals = [], []
+    for m in _WHERE_TOKEN_RE.finditer(clause):
+        kind, text = m.lastgroup, m.group(m.lastgroup)
+        if kind == "string":
+            literals.append(text[1:-1])
+            template.append(("?", "s"))
+        elif kind == "date":
+            literals.append(text.replace("T", " ").replace("t", " "))
+            template.append(("?", "d" if _DATE_ONLY_RE.match(text) else "t"))
+        elif kind == "number":
+            literals.append(text.lstrip("$"))
+            template.append(("?", "n"))
+        else:
+            template.append(("w", text.lower()))
+    return tuple(template), literals
+
+
+class _WhereParser:
+    """Recursive descent over a template: or := and ('or' and)*, and := cond (('and' | ',') cond)*"""
+
+    def __init__(self, tokens: tuple):
+        self.tokens = tokens
+        self.pos = 0
+        self.slot = 0  # index of the next literal
+
+    def peek(self, offset: int = 0):
+        i = self.pos + offset
+        return self.tokens[i] if i < len(self.tokens) else None
+
+    def accept(self, *words) -> bool:
+        token = self.peek()
+        if token is not None and token[0] == "w" and token[1] in words:
+            self.pos += 1
+            return True
+        return False
+
+    def match_phrase(self, phrases: list):
+        for words, value in phrases:
+            if all(self.peek(i) == ("w", w) for i, w in enumerate(words)):
+                self.pos += len(words)
+                return value
+        return None
+
+    def where(self) -> str:
+        token = self.peek()
+        return "end of clause" if token is None else f"'{token[1]}'" if token[0] == "w" else "a value"
+
+    def parse(self):
+        node = self.parse_or()
+        if self.peek() is not None:
+            raise FilterError(f"unexpected {self.where()}")
+        return node
+
+    def parse_or(self):
+        children = [self.parse_and()]
+        while self.accept("or"):
+            children.append(self.parse_and())
+        return children[0] if len(children) == 1 else ("or", children)
+
+    def parse_and(self):
+        children = [self.parse_condition()]
+        while self.accept("and", ","):
+            children.append(self.parse_condition())
+        return children[0] if len(children) == 1 else ("and", children)
+
+    def parse_operator(self):
+        # An optional copula: "is above", "is not null", bare "is" means equality
+        if self.accept("is", "are"):
+            return self.match_phrase(_OP_PHRASES) or "eq"
+        return self.match_phrase(_OP_PHRASES)
+
+    def parse_condition(self):
+        if self.accept("("):
+            node = self.parse_or()
+            if not self.accept(")"):
+                raise FilterError(f"expected ')' at {self.where()}")
+            return node
+
+        field = self.match_phrase(_FIELD_PHRASES)
+        while field is None and self.accept(*_WHERE_FILLER_WORDS):
+            field = self.match_phrase(_FIELD_PHRASES)
+        if field is None:
+            return self.parse_reversed_condition()
+
+        op = self.parse_operator() or "eq"  # "customer name alice"
+        if op in ("is_null", "not_null"):
+            return ("cond", field, op, [])
+        if op == "between":
+            low = self.parse_value()
+            if not self.accept("and", "to"):
+                raise FilterError(f"expected 'and' after between value at {self.where()}")
+            return ("cond", field, op, [low, self.parse_value()])
+        if op == "in":
+            if not self.accept("("):
+                raise FilterError(f"expected '(' after in at {self.where()}")
+            values = [self.parse_value()]
+            while self.accept(","):
+                values.append(self.parse_value())
+            if not self.accept(")"):
+                raise FilterError(f"expected ')' at {self.where()}")
+            return ("cond", field, op, values)
+        return ("cond", field, op, [self.parse_value()])
+
+    def parse_reversed_condition(self):
+        """'more than 50 total price'; without a column, a number compares total_price"""
+        start, slot = self.pos, self.slot
+        op = self.parse_operator()
+        if op in _COMPARISON_OPS and self.peek() is not None and self.peek()[0] == "?":
+            value = self.parse_value()
+            field = self.match_phrase(_FIELD_PHRASES)
+            if field is None and value[2] == "n":
+                field = "total_price"
+            if field is not None:
+                return ("cond", field, op, [value])
+        self.pos, self.slot = start, slot
+        raise FilterError(f"expected a column name at {self.where()}")
+
+    def parse_value(self):
+        """('slot', index, kind) for a literal, ('const', text, 's') for unquoted words"""
+        token = self.peek()
+        if token is not None and token[0] == "?":
+            self.pos += 1
+            self.slot += 1
+            if token[1] == "n":
+                self.accept(*_NUMBER_UNIT_WORDS)
+            return ("slot", self.slot - 1, token[1])
+        words = []
+        while (token := self.peek()) is not None and token[0] == "w" and token[1] not in _VALUE_STOP_WORDS:
+            words.append(token[1])
+            self.pos += 1
+        if not words:
+            raise FilterError(f"expected a value at {self.where()}")
+        return ("const", " ".join(words), "s")
+
+
+_COMPARISON_SQL = {"eq": "=", "ne": "<>", "gt": ">", "gte": ">=", "lt": "<", "lte": "<="}
+# sale_date is a DATETIME: a bare date means the whole day, expressed as a
+# half-open range so the predicate stays index-friendly
+_DAY_RANGE_SQL = {
+    "eq": "({col} >= %s AND {col} < %s + INTERVAL 1 DAY)",
+    "ne": "({col} < %s OR {col} >= %s + INTERVAL 1 DAY)",
+    "gt": "{col} >= %s + INTERVAL 1 DAY",
+    "gte": "{col} >= %s",
+    "lt": "{col} < %s",
+    "lte": "{col} < %s + INTERVAL 1 DAY",
+}
+
+
+def emit_filter_sql(node, columns: dict = SALES_COLUMNS) -> tuple:
+    """Render a filter tree as (sql, param_spec); spec items are (source, ref, column_type, wrap)"""
+    if node[0] in ("and", "or"):
+        parts, spec = [], []
+        for child in node[1]:
+            sql, child_spec = emit_filter_sql(child, columns)
+            parts.append(f"({sql})" if child[0] in ("and", "or") else sql)
+            spec.extend(child_spec)
+        return f" {node[0].upper()} ".join(parts), tuple(spec)
+
+    _, alias, op, values = node
+    col = columns[alias]
+    ctype = SALES_COLUMN_TYPES.get(alias, "text")
+    spec = tuple((source, ref, ctype, None) for source, ref, _ in values)
+    whole_day = ctype == "date" and bool(values) and values[-1][2] == "d"
+
+    if op == "is_null":
+        return f"{col} IS NULL", ()
+    if op == "not_null":
+        return f"{col} IS NOT NULL", ()
+    if op in ("contains", "prefix"):
+        return f"{col} LIKE %s", ((values[0][0], values[0][1], "text", op),)
+    if op == "in":
+        return f"{col} IN ({', '.join(['%s'] * len(values))})", spec
+    if op == "between":
+        if whole_day:
+            return f"({col} >= %s AND {col} < %s + INTERVAL 1 DAY)", spec
+        return f"{col} BETWEEN %s AND %s", spec
+    if whole_day:
+        sql = _DAY_RANGE_SQL[op].format(col=col)
+        return sql, spec * sql.count("%s")
+    return f"{col} {_COMPARISON_SQL[op]} %s", spec
+
+
+def bind_filter_params(spec: tuple, literals=()) -> list:
+    """Turn a param_spec into driver parameters, coercing each value to its column type"""
+    params = []
+    for source, ref, ctype, wrap in spec:
+        value = literals[ref] if source == "slot" else ref
+        try:
+            if wrap == "contains":
+                value = f"%{_like_escape(str(value))}%"
+            elif wrap == "prefix":
+                value = _like_escape(str(value)) + "%"
+            elif ctype == "int":
+                value = int(float(value))
+            elif ctype == "num":
+                value = float(value)
+            elif value is not None and not isinstance(value, str):
+                value = str(value)
+        except (TypeError, ValueError):
+            raise FilterError(f"'{value}' is not a valid {ctype} value") from None
+        params.append(value)
+    return params
+
+
+# Words naming a column other than total_price: such clauses never fall back
+_OTHER_COLUMN_WORDS = frozenset(
+    word for words, alias in _FIELD_PHRASES if SALES_COLUMNS[alias] != "s.total_price" for word in words
+) - frozenset(_WHERE_FILLER_WORDS)
+
+
+def _generic_number_filter(template: tuple):
+    """total_price condition on the clause's first number, or None if it has none or names another column"""
+    slots = [token for token in template if token[0] == "?"]
+    words = {token[1] for token in template if token[0] == "w"}
+    if ("?", "n") not in slots or words & _OTHER_COLUMN_WORDS:
+        return None
+    op = next((op for op, hints in _GENERIC_NUMBER_OPS if words.intersection(hints)), "gt")
+    return ("cond", "total_price", op, [("slot", slots.index(("?", "n")), "n")])
+
+
+@functools.lru_cache(maxsize=WHERE_CACHE_SIZE)
+def _compile_where_template(template: tuple) -> tuple:
+    """(sql, param_spec) for a tokenized where_clause template"""
+    try:
+        node = _WhereParser(template).parse()
+    except FilterError:
+        # Clauses the old regex matcher accepted, e.g. "sales ending up above 50"
+        node = _generic_number_filter(template)
+        if node is None:
+            raise
+    return emit_filter_sql(node)
+
+
+def compile_where_clause(clause: str) -> tuple:
+    """(sql, params) for a natural-language where_clause; raises FilterError"""
+    template, literals = _tokenize_where(clause)
+    if not template:
+        return "", []
+    sql, spec = _compile_where_template(template)
+    return sql, bind_filter_params(spec, literals)
+
+
+# filter_conditions DSL. Keys are column aliases (or "and"/"or" holding a
+# list of nested filters); values are operator mappings or shorthands:
+#   {"sale_date": {"gte": "2024-01-01", "lt": "2024-02-01"},
+#    "sale_id": {"in": [1, 2, 3]},
+#    "customer_name": {"prefix": "Ali"},
+#    "or": [{"quantity": {"gt": 5}}, {"total_price": {"between": [10, 50]}}]}
+# Shorthands: a list means in, None means is_null, a string on a text
+# column keeps the old contains behaviour, anything else means eq.
+# Prefer eq/prefix/in/ranges: contains cannot use an index.
+FILTER_OPERATORS = ("eq", "ne", "gt", "gte", "lt", "lte", "in", "between",
+                    "prefix", "contains", "is_null", "not_null")
+
+
+def _dsl_value(alias: str, value) -> tuple:
+    if SALES_COLUMN_TYPES.get(alias) == "date" and isinstance(value, str) and _DATE_ONLY_RE.match(value.strip()):
+        return ("const", value.strip(), "d")
+    return ("const", value, "s")
+
+
+def _dsl_condition(alias: str, op: str, operand) -> tuple:
+    if op not in FILTER_OPERATORS:
+        raise FilterError(f"unknown operator '{op}' for '{alias}' (use one of: {', '.join(FILTER_OPERATORS)})")
+    if op in ("is_null", "not_null"):
+        if operand is False:  # {"is_null": false} flips the test
+            op = "not_null" if op == "is_null" else "is_null"
+        return ("cond", alias, op, [])
+    if op in ("in", "between"):
+        if not isinstance(operand, (list, tuple)) or not operand:
+            raise FilterError(f"'{op}' on '{alias}' needs a non-empty list")
+        if op == "between" and len(operand) != 2:
+            raise FilterError(f"'between' on '{alias}' needs [low, high]")
+        return ("cond", alias, op, [_dsl_value(alias, v) for v in operand])
+    if operand is None and op in ("eq", "ne"):
+        return ("cond", alias, "is_null" if op == "eq" else "not_null", [])
+    return ("cond", alias, op, [_dsl_value(alias, operand)])
+
+
+def parse_filter_conditions(filters: dict):
+    """AND/OR filter tree for a filter_conditions mapping (None when empty); raises FilterError"""
+    if not isinstance(filters, dict):
+        raise FilterError("filter_conditions must be an object")
+    children = []
+    for key, value in filters.items():
+        alias = str(key).strip().lower().replace(" ", "_")
+        if alias in ("and", "or"):
+            if not isinstance(value, list) or not value:
+                raise FilterError(f"'{key}' needs a non-empty list of filters")
+            subtrees = [t for t in (parse_filter_conditions(v) for v in value) if t is not None]
+            if subtrees:
+                children.append(subtrees[0] if len(subtrees) == 1 else (alias, subtrees))
+        elif alias not in SALES_COLUMNS:
+            raise FilterError(f"unknown column '{key}' (available: {', '.join(SALES_COLUMNS)})")
+        elif isinstance(value, dict):
+            if not value:
+                raise FilterError(f"no operator given for '{key}'")
+            children.extend(_dsl_condition(alias, str(op).strip().lower(), operand) for op, operand in value.items())
+        elif value is None:
+            children.append(("cond", alias, "is_null", []))
+        elif isinstance(value, (list, tuple)):
+            children.append(_dsl_condition(alias, "in", value))
+        elif isinstance(value, str) and SALES_COLUMN_TYPES.get(alias, "text") == "text":
+            children.append(_dsl_condition(alias, "contains", value))
+        else:
+            children.append(_dsl_condition(alias, "eq", value))
+    if not children:
+        return None
+    return children[0] if len(children) == 1 else ("and", children)
+
+
+def compile_filter_conditions(filters: dict) -> tuple:
+    """(sql, params) for a filter_conditions mapping; raises FilterError"""
+    tree = parse_filter_conditions(filters)
+    if tree is None:
+        return "", []
+    sql, spec = emit_filter_sql(tree)
+    return sql, bind_filter_params(spec)
+
+
+# ————————————————
+# 15. Sales CRUD Tool with Display Formatting Features (Unchanged)
+# ————————————————
+# Reads without an explicit limit are paged; rows are streamed from MySQL in batches
+# SQL text for sales reads is cached per query shape (columns, filter, LIMIT present)
+SQL_TEXT_CACHE_SIZE = int(os.getenv("SQL_TEXT_CACHE_SIZE", "512"))
+SALES_READ_DEFAULT_PAGE_SIZE = int(os.getenv("SALES_READ_DEFAULT_PAGE_SIZE", "500"))
+SALES_READ_MAX_PAGE_SIZE = int(os.getenv("SALES_READ_MAX_PAGE_SIZE", "5000"))
+SALES_STREAM_BATCH_SIZE = int(os.getenv("SALES_STREAM_BATCH_SIZE", "500"))
+
+
+def encode_sales_cursor(sale_date, sale_id: int) -> str:
+    """Opaque keyset cursor for the (sale_date, Id) position of the last row on a page"""
+    payload = json.dumps([sale_date.isoformat(), int(sale_id)], separators=(",", ":"))
+    return base64.urlsafe_b64encode(payload.encode("utf-8")).decode("ascii")
+
+
+def decode_sales_cursor(token: str) -> tuple:
+    try:
+        sale_date, sale_id = json.loads(base64.urlsafe_b64decode(token.encode("ascii")))
+        return datetime.fromisoformat(sale_date), int(sale_id)
+    except Exception as e:
+        raise ValueError(f"Invalid sales cursor: {token!r}") from e
+
+
+def _format_sale_row(r, column_aliases: list, display_format: str | None) -> dict | None:
+    """Apply display_format to one joined sales row; None means the row is filtered out"""
+    row_data = {}
+    for i, alias in enumerate(column_aliases):
+        if i < len(r):  # Safety check
+            value = r[i]
+            
+            # Apply formatting based on display_format
+            if display_format == "Data Format Conversion":
+                if "date" in alias or "timestamp" in alias:
+                    value = value.strftime("%Y-%m-%d %H:%M:%S") if value else "N/A"
+            elif display_format == "Decimal Value Formatting":
+                if "price" in alias or "total" in alias or "amount" in alias:
+                    value = f"{float(value):.2f}" if value is not None else "0.00"
+            elif display_format == "Null Value Removal/Handling":
+                if value is None:
+                    value = "N/A"
+            
+            row_data[alias] = value
+    
+    # Handle String Concatenation for specific display format
+    if display_format == "String Concatenation":
+        if "customer_name" in row_data or ("first_name" in row_data and "last_name" in row_data):
+            if "first_name" in row_data and "last_name" in row_data:
+                row_data["customer_full_name"] = f"{row_data['first_name']} {row_data['last_name']}"
+        
+        if "product_name" in row_data and "product_description" in row_data:
+            desc = row_data['product_description'] or 'No description'
+            row_data["product_full_description"] = f"{row_data['product_name']} ({desc})"
+        
+        # Create sale summary if we have the needed fields
+        if all(field in row_data for field in ['customer_name', 'quantity', 'product_name', 'total_price']):
+            row_data["sale_summary"] = (
+                f"{row_data['customer_name']} bought {row_data['quantity']} "
+                f"of {row_data['product_name']} for ${float(row_data['total_price']):.2f}"
+            )
+    
+    # Skip null records if specified
+    if display_format == "Null Value Removal/Handling":
+        if any(v is None for v in row_data.values()):
+            return None
+    
+    return row_data
+
+
+@functools.lru_cache(maxsize=SQL_TEXT_CACHE_SIZE)
+def _resolve_sales_columns(columns: str | None) -> tuple:
+    """Column aliases selected by a sales_crud(read) `columns` string"""
+    available_columns = SALES_COLUMNS
+
+    # FIXED: Process column selection with better parsing
+    selected_columns = []
+    column_aliases = []
+
+    logger.debug("Raw columns parameter: %r", columns)
+
+    if columns and columns.strip():
+        # Clean and split the columns string
+        columns_clean = columns.strip()
+
+        # Handle different input patterns
+        if "," in columns_clean:
+            # Comma-separated list
+            requested_cols = [col.strip().lower().replace(" ", "_") for col in columns_clean.split(",") if col.strip()]
+        else:
+            # Space-separated or single column
+            requested_cols = [col.strip().lower().replace(" ", "_") for col in columns_clean.split() if col.strip()]
+
+        logger.debug("Requested columns after parsing: %s", requested_cols)
+
+        # Build SELECT clause based on requested columns
+        for col in requested_cols:
+            matched = False
+            # Try exact match first
+            if col in available_columns:
+                selected_columns.append(available_columns[col])
+                column_aliases.append(col)
+                matched = True
+                logger.debug("Exact match found for %r: %s", col, available_columns[col])
+            else:
+                # Try fuzzy matching for common variations
+                for avail_col, db_col in available_columns.items():
+                    if (col in avail_col or avail_col in col or 
+                        col.replace("_", "") in avail_col.replace("_", "") or
+                        avail_col.replace("_", "") in col.replace("_", "")):
+                        selected_columns.append(db_col)
+                        column_aliases.append(avail_col)
+                        matched = True
+                        logger.debug("Fuzzy match found for %r -> %r: %s", col, avail_col, db_col)
+                        break
+
+            if not matched:
+                logger.debug("No match found for column %r. Skipping...", col)
+
+    # If no valid columns found or no columns specified, use default key columns
+    if not selected_columns:
+        logger.debug("Using default key columns")
+        selected_columns = [
+            "s.Id", "c.Name", "p.name", "s.quantity", "s.unit_price", "s.total_price", "s.sale_date", "c.Email"
+        ]
+        column_aliases = [
+            "sale_id", "customer_name", "product_name", "quantity", "unit_price", "total_price", "sale_date", "email"
+        ]
+
+    logger.debug("Final selected columns: %s", selected_columns)
+    logger.debug("Final column aliases: %s", column_aliases)
+    return tuple(column_aliases)
+
+
+@functools.lru_cache(maxsize=SQL_TEXT_CACHE_SIZE)
+def _sales_read_sql(column_aliases: tuple, where_sql: str, limited: bool) -> str:
+    """SELECT text for one sales read shape: columns, filter/keyset predicate, LIMIT present"""
+    select_clause = ", ".join(f"{SALES_COLUMNS[alias]} AS {alias}" for alias in column_aliases)
+    # Hidden trailing columns used to build the keyset pagination cursor
+    select_clause += ", s.sale_date AS _cursor_date, s.Id AS _cursor_id"
+    sql = f"""
+        SELECT  {select_clause}
+        FROM    Sales          s
+        JOIN    Customers      c ON c.Id = s.customer_id
+        JOIN    ProductsCache  p ON p.id = s.product_id
+        """ + where_sql
+    # Id breaks ties so the keyset order is total
+    sql += " ORDER BY s.sale_date DESC, s.Id DESC"
+    if limited:
+        sql += " LIMIT %s"
+    return sql
+
+
+# sales_crud(aggregate): GROUP BY is pushed down to MySQL so only summary
+# rows cross the wire. group_by and metrics are comma-separated lists of
+# the names below; where_clause/filter_conditions filter the input rows.
+SALES_AGGREGATE_DIMENSIONS = {
+    "customer": (("customer_id", "s.customer_id"), ("customer_name", "c.Name")),
+    "product": (("product_id", "s.product_id"), ("product_name", "p.name")),
+    "day": (("day", "DATE(s.sale_date)"),),
+    "week": (("week", "DATE(s.sale_date) - INTERVAL WEEKDAY(s.sale_date) DAY"),),  # Monday
+    "month": (("month", "DATE(s.sale_date) - INTERVAL (DAYOFMONTH(s.sale_date) - 1) DAY"),),
+}
+SALES_AGGREGATE_METRICS = {
+    "total_revenue": "SUM(s.total_price)",
+    "sale_count": "COUNT(*)",
+    "total_quantity": "SUM(s.quantity)",
+    "avg_quantity": "AVG(s.quantity)",
+    "avg_total_price": "AVG(s.total_price)",
+    "min_total_price": "MIN(s.total_price)",
+    "max_total_price": "MAX(s.total_price)",
+}
+DEFAULT_AGGREGATE_METRICS = ("total_revenue", "sale_count", "avg_quantity")
+
+_DIMENSION_ALIASES = {
+    "customers": "customer", "customer_id": "customer", "customer_name": "customer",
+    "products": "product", "product_id": "product", "product_name": "product",
+    "date": "day", "daily": "day", "sale_date": "day",
+    "weekly": "week", "monthly": "month",
+}
+_METRIC_ALIASES = {
+    "revenue": "total_revenue", "sum_total_price": "total_revenue", "sum": "total_revenue",
+    "count": "sale_count", "sales": "sale_count", "num_sales": "sale_count",
+    "quantity": "total_quantity", "sum_quantity": "total_quantity",
+    "avg_price": "avg_total_price", "average_total_price": "avg_total_price",
+    "average_quantity": "avg_quantity",
+    "min": "min_total_price", "min_price": "min_total_price",
+    "max": "max_total_price", "max_price": "max_total_price",
+}
+
+
+def _parse_aggregate_terms(value, known: dict, aliases: dict, what: str) -> tuple:
+    """Canonical, de-duplicated names from a comma-separated string or list"""
+    if not value:
+        return ()
+    items = value if isinstance(value, (list, tuple)) else str(value).split(",")
+    names = []
+    for item in items:
+        key = str(item).strip().lower().replace(" ", "_")
+        if not key:
+            continue
+        name = key if key in known else aliases.get(key)
+        if name is None:
+            raise ValueError(f"Unknown {what} '{item}' (available: {', '.join(known)})")
+        if name not in names:
+            names.append(name)
+    return tuple(names)
+
+
+def _aggregate_value(value):
+    if isinstance(value, Decimal):
+        return float(value)
+    if isinstance(value, (date, datetime)):
+        return value.isoformat()
+    return value
+
+
+@functools.lru_cache(maxsize=SQL_TEXT_CACHE_SIZE)
+def _sales_aggregate_sql(dimensions: tuple, metrics: tuple, where_sql: str, limited: bool) -> str:
+    """GROUP BY text for one aggregate shape"""
+    keys = [expr for d in dimensions for _, expr in SALES_AGGREGATE_DIMENSIONS[d]]
+    select = [f"{expr} AS {alias}" for d in dimensions for alias, expr in SALES_AGGREGATE_DIMENSIONS[d]]
+    select += [f"{SALES_AGGREGATE_METRICS[m]} AS {m}" for m in metrics]
+    sql = f"""
+        SELECT  {', '.join(select)}
+        FROM    Sales          s
+        JOIN    Customers      c ON c.Id = s.customer_id
+        JOIN    ProductsCache  p ON p.id = s.product_id
+        """ + where_sql
+    if keys:
+        positions = ", ".join(str(i + 1) for i in range(len(keys)))
+        sql += f" GROUP BY {positions} ORDER BY {positions}"
+    if limited:
+        sql += " LIMIT %s"
+    return sql
+
+
+def _sales_filter(where_clause: str | None, filter_conditions: dict | None) -> tuple:
+    """(' WHERE (...)' or '', params) for the read/aggregate filters; raises FilterError"""
+    if where_clause and where_clause.strip():
+        try:
+            filter_sql, params = compile_where_clause(where_clause)
+        except FilterError as e:
+            raise FilterError(f"Could not understand where_clause: {e}") from None
+    elif filter_conditions:
+        try:
+            filter_sql, params = compile_filter_conditions(filter_conditions)
+        except FilterError as e:
+            raise FilterError(f"Invalid filter_conditions: {e}") from None
+    else:
+        return "", []
+    # Parenthesized so a keyset predicate appended later ANDs with the whole filter
+    return (f" WHERE ({filter_sql})" if filter_sql else ""), params
+
+
+# Aggregates answer from the daily rollups when they can: at most one of
+# customer/product, metrics derivable from count/quantity/revenue, and a
+# filter (if any) that only bounds sale_date by whole days.
+SALES_ROLLUPS_ENABLED = os.getenv("SALES_ROLLUPS_ENABLED", "true").lower() in ("1", "true", "yes")
+
+_ROLLUP_TIME_DIMENSIONS = {
+    "day": "r.sale_day",
+    "week": "r.sale_day - INTERVAL WEEKDAY(r.sale_day) DAY",
+    "month": "r.sale_day - INTERVAL (DAYOFMONTH(r.sale_day) - 1) DAY",
+}
+_ROLLUP_METRICS = {
+    "total_revenue": "SUM(r.total_revenue)",
+    "sale_count": "CAST(SUM(r.sale_count) AS SIGNED)",
+    "total_quantity": "SUM(r.total_quantity)",
+    "avg_quantity": "SUM(r.total_quantity) / NULLIF(SUM(r.sale_count), 0)",
+    "avg_total_price": "SUM(r.total_revenue) / NULLIF(SUM(r.sale_count), 0)",
+}
+_ROLLUP_FILTER_COLUMNS = {"sale_date": "r.sale_day", "date": "r.sale_day"}
+
+
+@functools.lru_cache(maxsize=SQL_TEXT_CACHE_SIZE)
+def _rollup_aggregate_sql(dimensions: tuple, metrics: tuple, where_sql: str, limited: bool) -> str | None:
+    """GROUP BY text over a rollup table, or None when the shape needs the base Sales rows"""
+    entities = [d for d in dimensions if d in ("customer", "product")]
+    if len(entities) > 1 or any(m not in _ROLLUP_METRICS for m in metrics):
+        return None
+    table = "SalesDailyCustomer" if entities == ["customer"] else "SalesDailyProduct"
+
+    select, joins = [], ""
+    for d in dimensions:
+        if d == "customer":
+            select += ["r.customer_id AS customer_id", "c.Name AS customer_name"]
+            joins = " JOIN Customers c ON c.Id = r.customer_id"
+        elif d == "product":
+            select += ["r.product_id AS product_id", "p.name AS product_name"]
+            joins = " JOIN ProductsCache p ON p.id = r.product_id"
+        else:
+            select.append(f"{_ROLLUP_TIME_DIMENSIONS[d]} AS {d}")
+    keys = len(select)
+    select += [f"{_ROLLUP_METRICS[m]} AS {m}" for m in metrics]
+
+    sql = f"SELECT {', '.join(select)} FROM {table} r{joins}{where_sql}"
+    if keys:
+        positions = ", ".join(str(i + 1) for i in range(keys))
+        sql += f" GROUP BY {positions} ORDER BY {positions}"
+    if limited:
+        sql += " LIMIT %s"
+    return sql
+
+
+def _is_day_filter(node) -> bool:
+    if node[0] in ("and", "or"):
+        return all(_is_day_filter(child) for child in node[1])
+    _, alias, op, values = node
+    return (alias in _ROLLUP_FILTER_COLUMNS and op in _COMPARISON_OPS + ("in", "between")
+            and all(kind == "d" for _, _, kind in values))
+
+
+def _rollup_filter(where_clause: str | None, filter_conditions: dict | None) -> tuple | None:
+    """(' WHERE ...', params) over the rollups' sale_day, or None when the filter needs base rows"""
+    tree, literals = None, ()
+    if where_clause and where_clause.strip():
+        template, literals = _tokenize_where(where_clause)
+        try:
+            tree = _WhereParser(template).parse() if template else None
+        except FilterError:
+            # Only the total_price fallback of _compile_where_template accepts it: not a day filter
+            return None
+    elif filter_conditions:
+        tree = parse_filter_conditions(filter_conditions)
+    if tree is None:
+        return "", []
+    if not _is_day_filter(tree):
+        return None
+    sql, spec = emit_filter_sql(tree, _ROLLUP_FILTER_COLUMNS)
+    return f" WHERE ({sql})", bind_filter_params(spec, literals)
+
+
+def _aggregate_plan(dimensions, metric_names, where_clause, filter_conditions, limit) -> tuple:
+    """(source, sql, params): the rollup query when possible, else GROUP BY over Sales"""
+    # Compile the base filter first so invalid filters fail the same way on either path
+    where_sql, query_params = _sales_filter(where_clause, filter_conditions)
+    if SALES_ROLLUPS_ENABLED:
+        rollup_where = _rollup_filter(where_clause, filter_conditions)
+        sql = _rollup_aggregate_sql(dimensions, metric_names, rollup_where[0], bool(limit)) if rollup_where else None
+        if sql is not None:
+            return "rollup", sql, rollup_where[1] + ([int(limit)] if limit else [])
+    sql = _sales_aggregate_sql(dimensions, metric_names, where_sql, bool(limit))
+    return "sales", sql, query_params + ([int(limit)] if limit else [])
+
+
+def _sales_aggregate(group_by, metrics, where_clause, filter_conditions, limit, result_format=None) -> dict:
+    try:
+        dimensions = _parse_aggregate_terms(group_by, SALES_AGGREGATE_DIMENSIONS, _DIMENSION_ALIASES, "group_by dimension")
+        metric_names = _parse_aggregate_terms(metrics, SALES_AGGREGATE_METRICS, _METRIC_ALIASES, "metric")
+        metric_names = metric_names or DEFAULT_AGGREGATE_METRICS
+        with trace_span("build_sql"):
+            source, sql, query_params = _aggregate_plan(dimensions, metric_names, where_clause, filter_conditions, limit)
+    except ValueError as e:
+        return {"sql": None, "result": f"❌ {e}"}
+    trace_set(source=source)
+
+    with get_mysql_conn() as mysql_cnxn:
+        try:
+            mysql_cur = execute_prepared(mysql_cnxn, sql, query_params)
+            with trace_span("fetch"):
+                rows = mysql_cur.fetchall()
+        except Exception as e:
+            return {"sql": sql, "result": f"❌ SQL Error: {str(e)}"}
+
+    names = [alias for d in dimensions for alias, _ in SALES_AGGREGATE_DIMENSIONS[d]] + list(metric_names)
+    with trace_span("process"):
+        if result_format == "columnar":
+            result = to_columnar(names, rows)
+        else:
+            result = [{name: _aggregate_value(v) for name, v in zip(names, r)} for r in rows]
+    return {"sql": sql, "result": result, "group_by": list(dimensions), "metrics": list(metric_names), "source": source}
+
+
+def _sales_bulk(operation: str, records: list) -> dict:
+    """Bulk create/update/delete for PostgreSQL sales with per-row status.
+
+    Referenced customers and products are validated with one set-based query
+    per backend and rows are written with multi-row VALUES statements.
+    """
+    if not records or not isinstance(records, list):
+        return {"sql": None, "result": f"❌ 'records' (a list of objects) required for {operation}."}
+    statuses: list = [None] * len(records)
+
+    if operation == "bulk_create":
+        parsed = []
+        for i, rec in enumerate(records):
+            rec = rec if isinstance(rec, dict) else {}
+            cid, pid = _as_int(rec.get("customer_id")), _as_int(rec.get("product_id"))
+            qty = _as_int(rec.get("quantity", 1))
+            try:
+                unit_price = float(rec["unit_price"]) if rec.get("unit_price") else None
+                total_amount = float(rec["total_amount"]) if rec.get("total_amount") else None
+            except (TypeError, ValueError):
+                statuses[i] = _row_error(i, "'unit_price' and 'total_amount' must be numbers.")
+                continue
+            if not cid or not pid or not qty:
+                statuses[i] = _row_error(i, "'customer_id' and 'product_id' required for create.")
+                continue
+            parsed.append((i, cid, pid, qty, unit_price, total_amount))
+
+        known_customers = existing_customer_ids(p[1] for p in parsed)
+        prices = get_product_prices(p[2] for p in parsed)
+
+        rows, row_index = [], []
+        for i, cid, pid, qty, unit_price, total_amount in parsed:
+            if cid not in known_customers:
+                statuses[i] = _row_error(i, f"Customer with ID {cid} not found.")
+            elif pid not in prices:
+                statuses[i] = _row_error(i, f"Product with ID {pid} not found.")
+            else:
+                unit_price = unit_price or prices[pid]
+                rows.append((cid, pid, qty, unit_price, total_amount or unit_price * qty))
+                row_index.append(i)
+
+        sql_query = """
+                    INSERT INTO sales (customer_id, product_id, quantity, unit_price, total_amount)
+                    VALUES %s
+                    RETURNING id
+                    """
+        if rows:
+            with get_pg_sales_conn() as sales_cnxn:
+                sales_cur = sales_cnxn.cursor()
+                new_ids = execute_values(sales_cur, sql_query, rows, page_size=BULK_CHUNK_SIZE, fetch=True)
+                sales_cnxn.commit()
+            for i, (new_id,) in zip(row_index, new_ids):
+                statuses[i] = {"index": i, "status": "created", "sale_id": new_id}
+        return _bulk_response(sql_query, statuses, "created", "sales")
+
+    if operation == "bulk_update":
+        updates = {}
+        for i, rec in enumerate(records):
+            rec = rec if isinstance(rec, dict) else {}
+            sale_id, new_quantity = _as_int(rec.get("sale_id")), _as_int(rec.get("new_quantity"))
+            if not sale_id or new_quantity is None:
+                statuses[i] = _row_error(i, "'sale_id' and 'new_quantity' required for update.")
+                continue
+            updates.setdefault(sale_id, []).append((i, new_quantity))
+
+        sql_query = """
+                    UPDATE sales AS s
+                    SET    quantity     = v.quantity,
+                           total_amount = s.unit_price * v.quantity
+                    FROM   (VALUES %s) AS v(id, quantity)
+                    WHERE  s.id = v.id
+                    RETURNING s.id
+                    """
+        updated = set()
+        if updates:
+            # Last record wins when the same sale appears twice
+            rows = [(sale_id, entries[-1][1]) for sale_id, entries in updates.items()]
+            with get_pg_sales_conn() as sales_cnxn:
+                sales_cur = sales_cnxn.cursor()
+                returned = execute_values(sales_cur, sql_query, rows, template="(%s::int, %s::int)",
+                                          page_size=BULK_CHUNK_SIZE, fetch=True)
+                sales_cnxn.commit()
+            updated = {r[0] for r in returned}
+        for sale_id, entries in updates.items():
+            for i, _ in entries:
+                if sale_id in updated:
+                    statuses[i] = {"index": i, "status": "updated", "sale_id": sale_id}
+                else:
+                    statuses[i] = _row_error(i, f"Sale with ID {sale_id} not found.")
+        return _bulk_response(sql_query, statuses, "updated", "sales")
+
+    # bulk_delete: records are sale ids or {"sale_id": ...}
+    targets = {}
+    for i, rec in enumerate(records):
+        sale_id = _as_int(rec.get("sale_id") if isinstance(rec, dict) else rec)
+        if not sale_id:
+            statuses[i] = _row_error(i, "'sale_id' required for delete.")
+            continue
+        targets.setdefault(sale_id, []).append(i)
+
+    sql_query = "DELETE FROM sales WHERE id = ANY(%s) RETURNING id"
+    deleted = set()
+    if targets:
+        with get_pg_sales_conn() as sales_cnxn:
+            sales_cur = sales_cnxn.cursor()
+            for chunk in _chunks(sorted(targets)):
+                sales_cur.execute(sql_query, (chunk,))
+                deleted.update(r[0] for r in sales_cur.fetchall())
+            sales_cnxn.commit()
+    for sale_id, indexes in targets.items():
+        for i in indexes:
+            if sale_id in deleted:
+                statuses[i] = {"index": i, "status": "deleted", "sale_id": sale_id}
+            else:
+                statuses[i] = _row_error(i, f"Sale with ID {sale_id} not found.")
+    return _bulk_response(sql_query, statuses, "deleted", "sales")
+
+
+def _sales_write(sales_cnxn, operation, customer_id, product_id, quantity, unit_price, total_amount, sale_id,
+                 new_quantity) -> dict:
+    """sales_crud create/update/delete on a checked-out sales connection (released by the caller)"""
+    if operation == "create":
+        if not customer_id or not product_id:
+            return {"sql": None, "result": "❌ 'customer_id' and 'product_id' required for create."}
+
+        # Validate customer exists
+        if not validate_customer_exists(customer_id):
+            return {"sql": None, "result": f"❌ Customer with ID {customer_id} not found."}
+
+        # Validate product exists and get price
+        if not validate_product_exists(product_id):
+            return {"sql": None, "result": f"❌ Product with ID {product_id} not found."}
+
+        # Get product price if not provided
+        if not unit_price:
+            product_details = get_product_details(product_id)
+            unit_price = product_details["price"]
+
+        if not total_amount:
+            total_amount = unit_price * quantity
+
+        sql_query = """
+                    INSERT INTO sales (customer_id, product_id, quantity, unit_price, total_amount)
+                    VALUES (%s, %s, %s, %s, %s)
+                    """
+        execute_prepared(sales_cnxn, sql_query, (customer_id, product_id, quantity, unit_price, total_amount))
+        sales_cnxn.commit()
+        request_sync()
+
+        # Get customer and product names for response
+        customer_name = get_customer_name(customer_id)
+        product_details = get_product_details(product_id)
+
+        result = f"✅ Sale created: {customer_name} bought {quantity} {product_details['name']}(s) for ${total_amount:.2f}"
+        return {"sql": sql_query, "result": result}
+
+    elif operation == "update":
+        if not sale_id or new_quantity is None:
+            return {"sql": None, "result": "❌ 'sale_id' and 'new_quantity' required for update."}
+
+        # Recalculate total amount
+        sql_query = """
+                    UPDATE sales
+                    SET quantity     = %s,
+                        total_amount = unit_price * %s
+                    WHERE id = %s
+                    """
+        execute_prepared(sales_cnxn, sql_query, (new_quantity, new_quantity, sale_id))
+        sales_cnxn.commit()
+        request_sync()
+        result = f"✅ Sale id={sale_id} updated to quantity {new_quantity}."
+        return {"sql": sql_query, "result": result}
+
+    elif operation == "delete":
+        if not sale_id:
+            return {"sql": None, "result": "❌ 'sale_id' required for delete."}
+
+        sql_query = "DELETE FROM sales WHERE id = %s"
+        execute_prepared(sales_cnxn, sql_query, (sale_id,))
+        sales_cnxn.commit()
+        request_sync()
+        result = f"✅ Sale id={sale_id} deleted."
+        return {"sql": sql_query, "result": result}
+
+
 # Fixed sales_crud function with proper column selection
 # Fixed sales_crud function with proper WHERE clause and column selection
 # Fixed sales_crud function with proper WHERE clause and column selection
-@mcp.tool()
-async def sales_crud(
+def _sales_crud(
         operation: str,
         customer_id: int = None,
         product_id: int = None,
@@ -826,407 +3627,971 @@ async def sales_crud(
         columns: str = None,  # Comma-separated list of columns to display
         where_clause: str = None,  # WHERE conditions
         filter_conditions: dict = None,  # Alternative: structured filters
-        limit: int = None  # Row limit
+        limit: int = None,  # Row limit
+        records: list[dict] = None,  # Rows for bulk_create / bulk_update / bulk_delete
+        cursor: str = None,  # Opaque next_cursor from a previous read page
+        page_size: int = None,  # Rows per page for cursor-paginated reads
+        group_by: str = None,  # aggregate: customer, product, day, week, month (comma-separated)
+        metrics: str = None,  # aggregate: total_revenue, sale_count, avg_quantity, ... (comma-separated)
+        result_format: str = None  # read/aggregate: "rows" (default) or "columnar"
 ) -> Any:
+    if operation in ("bulk_create", "bulk_update", "bulk_delete"):
+        response = _sales_bulk(operation, records)
+        request_sync()
+        return response
+    format_error = _check_result_format(result_format)
+    if format_error:
+        return {"sql": None, "result": format_error}
+
     # For PostgreSQL sales operations (create, update, delete)
     if operation in ["create", "update", "delete"]:
-        sales_cnxn = get_pg_sales_conn()
-        sales_cur = sales_cnxn.cursor()
+        with get_pg_sales_conn() as sales_cnxn:
+            return _sales_write(sales_cnxn, operation, customer_id, product_id, quantity, unit_price, total_amount,
+                                sale_id, new_quantity)
+
+    # Enhanced READ operation with FIXED column selection AND WHERE clause filtering
+    elif operation == "read":
+        build_started = time.perf_counter()
+
+        # Parsed once per distinct `columns` string
+        column_aliases = list(_resolve_sales_columns(columns))
+
+        # where_clause (natural language) or filter_conditions (structured DSL)
+        try:
+            where_sql, query_params = _sales_filter(where_clause, filter_conditions)
+        except FilterError as e:
+            return {"sql": None, "result": f"❌ {e}"}
+
+        # Keyset pagination on (sale_date, Id): explicit page_size/cursor, or the
+        # default page when no limit is given (so a bare read never ships the whole table)
+        paginate = cursor is not None or page_size is not None or not limit
+        if paginate:
+            page_size = max(1, min(int(page_size or SALES_READ_DEFAULT_PAGE_SIZE), SALES_READ_MAX_PAGE_SIZE))
+            if cursor:
+                try:
+                    cursor_date, cursor_id = decode_sales_cursor(cursor)
+                except ValueError:
+                    return {"sql": None, "result": "❌ Invalid or expired 'cursor'."}
+                where_sql += (" AND " if where_sql else " WHERE ") + "(s.sale_date, s.Id) < (%s, %s)"
+                query_params.extend([cursor_date, cursor_id])
+
+        # LIMIT is a bound parameter, so every page size reuses one prepared statement
+        row_limit = None
+        if paginate:
+            row_limit = page_size + 1  # one extra row tells us whether another page exists
+        elif limit:
+            row_limit = int(limit)
+        sql = _sales_read_sql(tuple(column_aliases), where_sql, row_limit is not None)
+        if row_limit is not None:
+            query_params.append(row_limit)
+        add_span("build_sql", time.perf_counter() - build_started)
+
+        logger.debug("Final SQL: %s", sql)
+        logger.debug("Final Parameters: %s", query_params)
+
+        # Execute as a prepared statement and stream rows in fetchmany() batches,
+        # so we never hold the full result set. Columnar reads without a
+        # display_format keep the raw tuples and convert whole columns at the end.
+        raw_rows = result_format == "columnar" and not display_format
+        processed_results = []
+        fetched = 0
+        last_row = None
+        has_more = False
+        fetch_time = process_time = 0.0
+        mysql_cnxn = get_mysql_conn()
+        try:
+            mysql_cur = execute_prepared(mysql_cnxn, sql, query_params)
+
+            while True:
+                batch_started = time.perf_counter()
+                batch = mysql_cur.fetchmany(SALES_STREAM_BATCH_SIZE)
+                fetch_time += time.perf_counter() - batch_started
+                if not batch:
+                    break
+                batch_started = time.perf_counter()
+                for r in batch:
+                    if paginate and fetched == page_size:
+                        has_more = True
+                        continue  # drain the look-ahead row
+                    fetched += 1
+                    last_row = r
+                    if raw_rows:
+                        processed_results.append(r)
+                        continue
+                    row_data = _format_sale_row(r, column_aliases, display_format)
+                    if row_data is not None:
+                        processed_results.append(row_data)
+                process_time += time.perf_counter() - batch_started
+            logger.debug("Query returned %d rows", fetched)
+        except Exception as e:
+            mysql_cnxn.close(discard=True)
+            return {"sql": sql, "result": f"❌ SQL Error: {str(e)}"}
+        finally:
+            mysql_cnxn.close()
+        add_span("fetch", fetch_time, rows=fetched)
+
+        logger.debug("Processed results count: %d", len(processed_results))
+        if processed_results and not raw_rows and logger.isEnabledFor(logging.DEBUG):
+            logger.debug("First result keys: %s", list(processed_results[0].keys()))
+
+        process_started = time.perf_counter()
+        if raw_rows:
+            result = to_columnar(column_aliases, processed_results)
+        elif result_format == "columnar":
+            result = records_to_columnar(processed_results) if processed_results else to_columnar(column_aliases, [])
+        else:
+            result = processed_results
+        add_span("process", process_time + time.perf_counter() - process_started)
+        response = {"sql": sql, "result": result}
+        if paginate:
+            # last_row ends with the hidden (sale_date, Id) keyset columns
+            response["next_cursor"] = encode_sales_cursor(last_row[-2], last_row[-1]) if has_more else None
+        return response
+
+    elif operation == "aggregate":
+        return _sales_aggregate(group_by, metrics, where_clause, filter_conditions, limit, result_format)
+
+    else:
+        return {"sql": None, "result": f"❌ Unknown operation '{operation}'."}
+
+@mcp.tool()
+@traced_tool
+async def sales_crud(
+        operation: str,
+        customer_id: int = None,
+        product_id: int = None,
+        quantity: int = 1,
+        unit_price: float = None,
+        total_amount: float = None,
+        sale_id: int = None,
+        new_quantity: int = None,
+        table_name: str = None,
+        display_format: str = None,  # Display formatting parameter
+        customer_name: str = None,
+        product_name: str = None,
+        email: str = None,
+        total_price: float = None,
+        # Enhanced parameters for column selection and filtering
+        columns: str = None,  # Comma-separated list of columns to display
+        where_clause: str = None,  # WHERE conditions
+        filter_conditions: dict = None,  # Alternative: structured filters
+        limit: int = None,  # Row limit
+        records: list[dict] = None,  # Rows for bulk_create / bulk_update / bulk_delete
+        cursor: str = None,  # Opaque next_cursor from a previous read page
+        page_size: int = None,  # Rows per page for cursor-paginated reads
+        group_by: str = None,  # aggregate: customer, product, day, week, month (comma-separated)
+        metrics: str = None,  # aggregate: total_revenue, sale_count, avg_quantity, ... (comma-separated)
+        result_format: str = None  # read/aggregate: "rows" (default) or "columnar"
+) -> Any:
+    return await run_storage("sales", **locals())
+
+
+# ————————————————
+# 16. Storage Backends
+# ————————————————
+# The MCP tools reach storage through the StorageBackend selected with
+# STORAGE_BACKEND:
+#   remote (default): the MySQL / PostgreSQL implementation above (pools,
+#       prepared statements, PostgreSQL -> MySQL sync, rollups)
+#   sqlite: one embedded SQLite database in WAL mode (SQLITE_PATH) holding
+#       Customers, products and Sales. No network hop and no sync, for
+#       single-node deployments and local load tests.
+# Both return the same response shapes. The SQLite backend reuses the sales
+# column map, where_clause/filter_conditions compiler and read SQL, and
+# translates the few MySQL-only constructs to SQLite.
+STORAGE_BACKEND = os.getenv("STORAGE_BACKEND", "remote").lower()
+SQLITE_PATH = os.getenv("SQLITE_PATH", "crud.sqlite3")
+# Remote databases this replica migrates and warms at startup (default: all).
+# The others are still used, lazily, on the first call of their tools.
+REMOTE_DATABASES = tuple(
+    name.strip() for name in os.getenv("REMOTE_DATABASES", "mysql,pg_products,pg_sales").split(",") if name.strip()
+)
+SQLITE_BUSY_TIMEOUT_MS = int(os.getenv("SQLITE_BUSY_TIMEOUT_MS", "5000"))
+
+
+class StorageBackend(ABC):
+    """Storage behind the three MCP tools: one entry point per entity plus lifecycle hooks"""
+
+    name = "base"
+
+    @abstractmethod
+    def migrate(self) -> dict:
+        """Apply pending schema migrations; {database: version report}"""
+
+    @abstractmethod
+    def seed(self) -> dict:
+        """Sample rows for empty tables; {table: rows inserted}"""
+
+    def startup(self):
+        """Everything that has to happen before serving (a version check on a warm restart)"""
+        self.migrate()
+
+    @abstractmethod
+    def executor(self, entity: str, operation: str | None) -> str:
+        """run_db executor key for an entity operation"""
+
+    @abstractmethod
+    def customers(self, **kwargs) -> dict:
+        """Customers CRUD; the customers tool's arguments, its response dict"""
+
+    @abstractmethod
+    def products(self, **kwargs) -> dict:
+        """Products CRUD; the products tool's arguments, its response dict"""
+
+    @abstractmethod
+    def sales(self, **kwargs) -> dict:
+        """Sales CRUD; the sales tool's arguments, its response dict"""
+
+
+class RemoteBackend(StorageBackend):
+    """MySQL customers and read model, PostgreSQL products and sales"""
+
+    name = "remote"
+
+    def migrate(self) -> dict:
+        return run_migrations(tuple(t for t in MIGRATION_TARGETS if t.name in REMOTE_DATABASES))
+
+    def seed(self) -> dict:
+        return seed_databases()
+
+    def startup(self):
+        self.migrate()
+        for pool in DB_POOLS:
+            if pool.name in REMOTE_DATABASES:
+                pool.warm()
+        # The sync reads both PostgreSQL databases and writes the MySQL read model
+        if SYNC_ENABLED and set(REMOTE_DATABASES) == {pool.name for pool in DB_POOLS}:
+            run_sync_once()
+            start_sync_worker()
+
+    def executor(self, entity: str, operation: str | None) -> str:
+        if entity == "customers":
+            return MYSQL_POOL.name
+        if entity == "products":
+            return PG_POOL.name
+        # Reads and aggregates hit the MySQL join; writes go to the PostgreSQL sales database
+        return MYSQL_POOL.name if operation in ("read", "aggregate") else PG_SALES_POOL.name
+
+    def customers(self, **kwargs) -> dict:
+        return _sqlserver_crud(**kwargs)
+
+    def products(self, **kwargs) -> dict:
+        return _postgresql_crud(**kwargs)
+
+    def sales(self, **kwargs) -> dict:
+        return _sales_crud(**kwargs)
+
+
+SQLITE_MIGRATIONS = [Migration(1, "Customers, products, ProductsCache view and Sales", [
+    """
+    CREATE TABLE IF NOT EXISTS Customers
+    (
+        Id        INTEGER PRIMARY KEY AUTOINCREMENT,
+        FirstName TEXT      NOT NULL COLLATE NOCASE,
+        LastName  TEXT      NOT NULL DEFAULT '' COLLATE NOCASE,
+        Name      TEXT      NOT NULL COLLATE NOCASE,
+        Email     TEXT,
+        CreatedAt TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP
+    )
+    """,
+    "CREATE INDEX IF NOT EXISTS idx_customers_name ON Customers (Name)",
+    "CREATE INDEX IF NOT EXISTS idx_customers_first_name ON Customers (FirstName)",
+    "CREATE INDEX IF NOT EXISTS idx_customers_last_name ON Customers (LastName)",
+    """
+    CREATE TABLE IF NOT EXISTS products
+    (
+        id          INTEGER PRIMARY KEY AUTOINCREMENT,
+        name        TEXT NOT NULL COLLATE NOCASE,
+        price       REAL NOT NULL,
+        description TEXT
+    )
+    """,
+    "CREATE INDEX IF NOT EXISTS idx_products_name ON products (name)",
+    # The shared sales read SQL joins ProductsCache (the MySQL read model name)
+    "CREATE VIEW IF NOT EXISTS ProductsCache AS SELECT id, name, price, description FROM products",
+    """
+    CREATE TABLE IF NOT EXISTS Sales
+    (
+        Id          INTEGER PRIMARY KEY AUTOINCREMENT,
+        customer_id INTEGER   NOT NULL REFERENCES Customers (Id) ON DELETE CASCADE,
+        product_id  INTEGER   NOT NULL REFERENCES products (id) ON DELETE CASCADE,
+        quantity    INTEGER   NOT NULL DEFAULT 1,
+        unit_price  REAL      NOT NULL,
+        total_price REAL      NOT NULL,
+        sale_date   TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP
+    )
+    """,
+    "CREATE INDEX IF NOT EXISTS idx_sales_date_id ON Sales (sale_date, Id)",
+    "CREATE INDEX IF NOT EXISTS idx_sales_customer ON Sales (customer_id)",
+    "CREATE INDEX IF NOT EXISTS idx_sales_product ON Sales (product_id)",
+    "CREATE INDEX IF NOT EXISTS idx_sales_total_price ON Sales (total_price)",
+])]
+
+# SQLite spellings of the aggregate time buckets (weeks start on Monday)
+SQLITE_AGGREGATE_DIMENSIONS = {
+    **SALES_AGGREGATE_DIMENSIONS,
+    "day": (("day", "date(s.sale_date)"),),
+    "week": (("week", "date(s.sale_date, 'weekday 0', '-6 days')"),),
+    "month": (("month", "date(s.sale_date, 'start of month')"),),
+}
+
+_SQLITE_REWRITES = (
+    (re.compile(r"%s \+ INTERVAL 1 DAY"), "datetime(?, '+1 day')"),
+    (re.compile(r" LIKE %s"), r" LIKE ? ESCAPE '\\'"),
+    (re.compile(r"%s"), "?"),
+)
+
+
+@functools.lru_cache(maxsize=SQL_TEXT_CACHE_SIZE)
+def sqlite_sql(sql: str) -> str:
+    """Translate the shared MySQL-flavoured SQL text (placeholders, day ranges, LIKE escapes) to SQLite"""
+    for pattern, replacement in _SQLITE_REWRITES:
+        sql = pattern.sub(replacement, sql)
+    return sql
+
+
+@functools.lru_cache(maxsize=SQL_TEXT_CACHE_SIZE)
+def _sqlite_aggregate_sql(dimensions: tuple, metrics: tuple, where_sql: str, limited: bool) -> str:
+    keys = [expr for d in dimensions for _, expr in SQLITE_AGGREGATE_DIMENSIONS[d]]
+    select = [f"{expr} AS {alias}" for d in dimensions for alias, expr in SQLITE_AGGREGATE_DIMENSIONS[d]]
+    select += [f"{SALES_AGGREGATE_METRICS[m]} AS {m}" for m in metrics]
+    sql = f"""
+        SELECT  {', '.join(select)}
+        FROM    Sales          s
+        JOIN    Customers      c ON c.Id = s.customer_id
+        JOIN    ProductsCache  p ON p.id = s.product_id
+        """ + where_sql
+    if keys:
+        positions = ", ".join(str(i + 1) for i in range(len(keys)))
+        sql += f" GROUP BY {positions} ORDER BY {positions}"
+    if limited:
+        sql += " LIMIT %s"
+    return sqlite_sql(sql)
+
+
+def _required(rec: dict, *keys) -> tuple:
+    """Values of the given record keys; KeyError when one is missing or empty"""
+    values = tuple(rec.get(k) for k in keys)
+    if any(v in (None, "") for v in values):
+        raise KeyError(keys)
+    return values
+
+
+def _split_name(name: str) -> tuple:
+    """(FirstName, LastName) for a full name, as stored in Customers"""
+    name_parts = name.split(' ', 1)
+    return name_parts[0], name_parts[1] if len(name_parts) > 1 else ""
+
+
+class SQLiteBackend(StorageBackend):
+    """Customers, products and sales in one embedded SQLite database (WAL mode)"""
+
+    name = "sqlite"
+
+    def __init__(self, path: str = SQLITE_PATH):
+        self.path = path
+        self._local = threading.local()
+        # Timestamps round-trip as datetime; SQLite's own defaults use "YYYY-MM-DD HH:MM:SS"
+        sqlite3.register_adapter(datetime, lambda v: v.isoformat(" "))
+        sqlite3.register_adapter(date, date.isoformat)
+        sqlite3.register_adapter(Decimal, float)
+        sqlite3.register_converter("TIMESTAMP", lambda v: datetime.fromisoformat(v.decode()))
+
+    def _open(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(self.path, detect_types=sqlite3.PARSE_DECLTYPES, timeout=SQLITE_BUSY_TIMEOUT_MS / 1000)
+        conn.execute("PRAGMA journal_mode = WAL")
+        conn.execute("PRAGMA synchronous = NORMAL")
+        conn.execute("PRAGMA foreign_keys = ON")
+        return conn
+
+    def connect(self) -> sqlite3.Connection:
+        """This thread's connection (one per executor thread; WAL lets readers run beside the writer)"""
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = self._local.conn = self._open()
+        return conn
+
+    def migrate(self) -> dict:
+        return {self.name: migrate_database(MigrationTarget(self.name, self._open, SQLITE_MIGRATIONS, param="?"))}
+
+    def seed(self) -> dict:
+        conn = self.connect()
+        cur = conn.cursor()
+        with conn:
+            seeded = {
+                "Customers": seed_table(
+                    cur, "Customers", "INSERT INTO Customers (FirstName, LastName, Name, Email) VALUES (?, ?, ?, ?)",
+                    [("Alice", "Johnson", "Alice Johnson", "alice@example.com"),
+                     ("Bob", "Smith", "Bob Smith", "bob@example.com"),
+                     ("Charlie", "Brown", "Charlie Brown", None)],
+                ),
+                "products": seed_table(
+                    cur, "products", "INSERT INTO products (name, price, description) VALUES (?, ?, ?)",
+                    [("Widget", 9.99, "A standard widget."),
+                     ("Gadget", 14.99, "A useful gadget."),
+                     ("Tool", 24.99, None)],
+                ),
+                "Sales": seed_table(
+                    cur, "Sales",
+                    "INSERT INTO Sales (customer_id, product_id, quantity, unit_price, total_price) VALUES (?, ?, ?, ?, ?)",
+                    [(1, 1, 2, 9.99, 19.98), (2, 2, 1, 14.99, 14.99), (3, 3, 3, 24.99, 74.97)],
+                ),
+            }
+        return seeded
+
+    def executor(self, entity: str, operation: str | None) -> str:
+        return "sqlite"
+
+    # ---------- shared helpers ----------
+    def _describe(self, conn, table: str) -> dict:
+        sql_query = f"PRAGMA table_info({table})"
+        rows = conn.execute(sql_query).fetchall()
+        if not rows:
+            return {"sql": sql_query, "result": f"❌ Table '{table}' not found."}
+        result = [
+            {"Field": r[1], "Type": r[2], "Null": "NO" if r[3] else "YES", "Key": "PRI" if r[5] else "",
+             "Default": r[4], "Extra": ""}
+            for r in rows
+        ]
+        return {"sql": sql_query, "result": result}
+
+    def _read(self, conn, sql_query: str, params: tuple, names: list, result_format: str | None, row_dict) -> dict:
+        with trace_span("execute"):
+            cur = conn.execute(sql_query, params)
+        with trace_span("fetch"):
+            rows = cur.fetchall()
+        with trace_span("process"):
+            result = to_columnar(names, rows) if result_format == "columnar" else [row_dict(r) for r in rows]
+        return {"sql": sql_query, "result": result}
+
+    def _bulk(self, conn, operation: str, records: list, spec: dict) -> dict:
+        """Per-row bulk create/update/delete in one transaction; spec holds the entity's SQL and row params"""
+        if not records or not isinstance(records, list):
+            return {"sql": None, "result": f"❌ 'records' (a list of objects) required for {operation}."}
+        verb = operation.split("_", 1)[1] + "d"
+        sql_query = sqlite_sql(spec[operation])
+        statuses = []
+        with conn:
+            for i, rec in enumerate(records):
+                if operation == "bulk_delete" and not isinstance(rec, dict):
+                    rec = {spec["key"]: rec}  # bare ids are accepted for deletes
+                try:
+                    params = spec[f"{operation}_params"](rec if isinstance(rec, dict) else {})
+                except (KeyError, TypeError, ValueError):
+                    statuses.append(_row_error(i, spec[f"{operation}_error"]))
+                    continue
+                try:
+                    cur = conn.execute(sql_query, params)
+                except sqlite3.IntegrityError as e:
+                    statuses.append(_row_error(i, f"Constraint violation: {e}"))
+                    continue
+                if not cur.rowcount:
+                    statuses.append(_row_error(i, spec[f"{operation}_missing"](params)))
+                elif operation == "bulk_create":
+                    statuses.append({"index": i, "status": verb, **spec["created"](params, cur.lastrowid)})
+                else:
+                    statuses.append({"index": i, "status": verb, spec["key"]: params[-1]})
+        return _bulk_response(sql_query, statuses, verb, spec["noun"])
+
+    # ---------- customers ----------
+    def _match_customers(self, conn, name: str) -> list:
+        """Exact full-name matches, else exact first/last-name matches (case-insensitive)"""
+        rows = conn.execute(
+            """
+            SELECT Id, Name, Email, CASE WHEN Name = ? THEN 1 ELSE 2 END AS tier
+            FROM Customers
+            WHERE Name = ? OR FirstName = ? OR LastName = ?
+            ORDER BY tier, Id
+            LIMIT ?
+            """,
+            (name, name, name, name, CUSTOMER_SEARCH_LIMIT),
+        ).fetchall()
+        best = rows[0][3] if rows else None
+        return [{"id": r[0], "name": r[1], "email": r[2]} for r in rows if r[3] == best]
+
+    def _resolve_customer(self, conn, customer_id, name) -> tuple:
+        """(customer_id, customer_name, error_response)"""
+        if not customer_id and name:
+            matches = self._match_customers(conn, name.strip())
+            if not matches:
+                return None, None, {"sql": None, "result": f"❌ No customer found matching '{name}'."}
+            if len(matches) > 1:
+                return None, None, {"sql": None, "result": f"❓ Multiple customers found matching '{name}':\n{_describe_customer_matches(matches)}\n\nPlease specify the full name or the customer ID."}
+            return matches[0]["id"], matches[0]["name"], None
+        if customer_id:
+            row = conn.execute("SELECT Name FROM Customers WHERE Id = ?", (customer_id,)).fetchone()
+            if not row:
+                return None, None, {"sql": None, "result": f"❌ Customer with ID {customer_id} not found."}
+            return customer_id, row[0], None
+        return None, None, None
+
+    _CUSTOMERS_BULK = {
+        "key": "customer_id",
+        "noun": "customers",
+        "bulk_create": "INSERT INTO Customers (FirstName, LastName, Name, Email) VALUES (%s, %s, %s, %s)",
+        "bulk_create_params": lambda r: (*_split_name(_required(r, "name", "email")[0].strip()),
+                                         r["name"].strip(), r["email"]),
+        "bulk_create_error": "'name' and 'email' required for create.",
+        "bulk_create_missing": lambda p: f"Customer '{p[2]}' was not created.",
+        "created": lambda p, new_id: {"name": p[2]},
+        "bulk_update": "UPDATE Customers SET Email = %s WHERE Id = %s",
+        "bulk_update_params": lambda r: (*_required(r, "new_email"), int(_required(r, "customer_id")[0])),
+        "bulk_update_error": "'customer_id' and 'new_email' required for update.",
+        "bulk_update_missing": lambda p: f"Customer with ID {p[-1]} not found.",
+        "bulk_delete": "DELETE FROM Customers WHERE Id = %s",
+        "bulk_delete_params": lambda r: (int(_required(r, "customer_id")[0]),),
+        "bulk_delete_error": "'customer_id' required for delete.",
+        "bulk_delete_missing": lambda p: f"Customer with ID {p[-1]} not found.",
+    }
+
+    def customers(self, operation: str, name: str = None, email: str = None, limit: int = 10,
+                  customer_id: int = None, new_email: str = None, table_name: str = None,
+                  records: list = None, result_format: str = None) -> dict:
+        conn = self.connect()
+        if operation in ("bulk_create", "bulk_update", "bulk_delete"):
+            return self._bulk(conn, operation, records, self._CUSTOMERS_BULK)
+        format_error = _check_result_format(result_format)
+        if format_error:
+            return {"sql": None, "result": format_error}
 
         if operation == "create":
-            if not customer_id or not product_id:
-                sales_cnxn.close()
-                return {"sql": None, "result": "❌ 'customer_id' and 'product_id' required for create."}
+            if not name or not email:
+                return {"sql": None, "result": "❌ 'name' and 'email' required for create."}
+            matches = self._match_customers(conn, name.strip())
+            if len(matches) > 1:
+                return {"sql": None, "result": f"❓ Multiple customers found with name '{name.strip()}':\n{_describe_customer_matches(matches)}\n\nPlease specify the full name (first and last name) to identify which customer you want to add the email to, or use a different name if you want to create a new customer."}
+            if matches:
+                match = matches[0]
+                if match["email"]:
+                    return {"sql": None, "result": f"ℹ️ Customer '{match['name']}' already has email '{match['email']}'. If you want to update it, please specify the full name."}
+                sql_query = "UPDATE Customers SET Email = ? WHERE Id = ?"
+                with conn:
+                    conn.execute(sql_query, (email, match["id"]))
+                return {"sql": sql_query, "result": f"✅ Email '{email}' added to existing customer '{match['name']}'."}
+            sql_query = "INSERT INTO Customers (FirstName, LastName, Name, Email) VALUES (?, ?, ?, ?)"
+            with conn:
+                conn.execute(sql_query, (*_split_name(name), name, email))
+            return {"sql": sql_query, "result": f"✅ New customer '{name}' created with email '{email}'."}
 
-            # Validate customer exists
-            if not validate_customer_exists(customer_id):
-                sales_cnxn.close()
-                return {"sql": None, "result": f"❌ Customer with ID {customer_id} not found."}
+        if operation == "read":
+            sql_query = "SELECT Id, FirstName, LastName, Name, Email, CreatedAt FROM Customers"
+            params = (limit,)
+            if name:
+                pattern = f"%{_like_escape(name)}%"
+                sql_query += " WHERE Name LIKE ? ESCAPE '\\' OR FirstName LIKE ? ESCAPE '\\' OR LastName LIKE ? ESCAPE '\\'"
+                params = (pattern, pattern, pattern, limit)
+            sql_query += " ORDER BY Id ASC LIMIT ?"
+            return self._read(
+                conn, sql_query, params, ["Id", "FirstName", "LastName", "Name", "Email", "CreatedAt"], result_format,
+                lambda r: {"Id": r[0], "FirstName": r[1], "LastName": r[2], "Name": r[3], "Email": r[4],
+                           "CreatedAt": r[5].isoformat()},
+            )
 
-            # Validate product exists and get price
-            if not validate_product_exists(product_id):
-                sales_cnxn.close()
-                return {"sql": None, "result": f"❌ Product with ID {product_id} not found."}
+        if operation in ("update", "delete"):
+            customer_id, customer_name, error = self._resolve_customer(conn, customer_id, name)
+            if error:
+                return error
+            if operation == "update":
+                if not customer_id or not new_email:
+                    return {"sql": None, "result": "❌ 'customer_id' (or 'name') and 'new_email' required for update."}
+                sql_query = "UPDATE Customers SET Email = ? WHERE Id = ?"
+                with conn:
+                    conn.execute(sql_query, (new_email, customer_id))
+                return {"sql": sql_query, "result": f"✅ Customer '{customer_name}' email updated to '{new_email}'."}
+            if not customer_id:
+                return {"sql": None, "result": "❌ 'customer_id' or 'name' required for delete."}
+            sql_query = "DELETE FROM Customers WHERE Id = ?"
+            with conn:
+                conn.execute(sql_query, (customer_id,))
+            return {"sql": sql_query, "result": f"✅ Customer '{customer_name}' deleted."}
 
-            # Get product price if not provided
-            if not unit_price:
-                product_details = get_product_details(product_id)
-                unit_price = product_details["price"]
+        if operation == "describe":
+            return self._describe(conn, table_name or "Customers")
+        return {"sql": None, "result": f"❌ Unknown operation '{operation}'."}
 
-            if not total_amount:
-                total_amount = unit_price * quantity
+    # ---------- products ----------
+    _PRODUCTS_BULK = {
+        "key": "product_id",
+        "noun": "products",
+        "bulk_create": "INSERT INTO products (name, price, description) VALUES (%s, %s, %s)",
+        "bulk_create_params": lambda r: (_required(r, "name")[0], float(r["price"]), r.get("description")),
+        "bulk_create_error": "'name' and a numeric 'price' required for create.",
+        "bulk_create_missing": lambda p: f"Product '{p[0]}' was not created.",
+        "created": lambda p, new_id: {"product_id": new_id},
+        "bulk_update": "UPDATE products SET price = %s WHERE id = %s",
+        "bulk_update_params": lambda r: (float(r["new_price"]), int(_required(r, "product_id")[0])),
+        "bulk_update_error": "'product_id' and a numeric 'new_price' required for update.",
+        "bulk_update_missing": lambda p: f"Product with ID {p[-1]} not found.",
+        "bulk_delete": "DELETE FROM products WHERE id = %s",
+        "bulk_delete_params": lambda r: (int(_required(r, "product_id")[0]),),
+        "bulk_delete_error": "'product_id' required for delete.",
+        "bulk_delete_missing": lambda p: f"Product with ID {p[-1]} not found.",
+    }
 
-            sql_query = """
-                        INSERT INTO sales (customer_id, product_id, quantity, unit_price, total_amount)
-                        VALUES (%s, %s, %s, %s, %s)
-                        """
-            sales_cur.execute(sql_query, (customer_id, product_id, quantity, unit_price, total_amount))
-            sales_cnxn.commit()
+    def _resolve_product(self, conn, product_id, name) -> tuple:
+        if not product_id and name:
+            row = conn.execute(
+                """
+                SELECT id, name FROM products
+                WHERE name LIKE ? ESCAPE '\\'
+                ORDER BY name = ? DESC, length(name), id
+                LIMIT 1
+                """,
+                (f"%{_like_escape(name)}%", name),
+            ).fetchone()
+            if not row:
+                return None, None, {"sql": None, "result": f"❌ No product found matching '{name}'."}
+            return row[0], row[1], None
+        if product_id:
+            row = conn.execute("SELECT name FROM products WHERE id = ?", (product_id,)).fetchone()
+            return product_id, row[0] if row else f"Product {product_id}", None
+        return None, None, None
 
-            # Get customer and product names for response
-            customer_name = get_customer_name(customer_id)
-            product_details = get_product_details(product_id)
+    def products(self, operation: str, name: str = None, price: float = None, description: str = None,
+                 limit: int = 10, product_id: int = None, new_price: float = None, table_name: str = None,
+                 records: list = None, result_format: str = None) -> dict:
+        conn = self.connect()
+        if operation in ("bulk_create", "bulk_update", "bulk_delete"):
+            return self._bulk(conn, operation, records, self._PRODUCTS_BULK)
+        format_error = _check_result_format(result_format)
+        if format_error:
+            return {"sql": None, "result": format_error}
+
+        if operation == "create":
+            if not name or price is None:
+                return {"sql": None, "result": "❌ 'name' and 'price' required for create."}
+            sql_query = "INSERT INTO products (name, price, description) VALUES (?, ?, ?)"
+            with conn:
+                conn.execute(sql_query, (name, price, description))
+            return {"sql": sql_query, "result": f"✅ Product '{name}' added with price ${price:.2f}."}
+
+        if operation == "read":
+            sql_query = "SELECT id, name, price, description FROM products"
+            params = (limit,)
+            if name:
+                # Exact (case-insensitive) match first, then shorter names
+                sql_query += " WHERE name LIKE ? ESCAPE '\\' ORDER BY name = ? DESC, length(name), id LIMIT ?"
+                params = (f"%{_like_escape(name)}%", name, limit)
+            else:
+                sql_query += " ORDER BY id ASC LIMIT ?"
+            return self._read(
+                conn, sql_query, params, ["id", "name", "price", "description"], result_format,
+                lambda r: {"id": r[0], "name": r[1], "price": float(r[2]), "description": r[3] or ""},
+            )
 
-            result = f"✅ Sale created: {customer_name} bought {quantity} {product_details['name']}(s) for ${total_amount:.2f}"
-            sales_cnxn.close()
-            return {"sql": sql_query, "result": result}
+        if operation in ("update", "delete"):
+            product_id, product_name, error = self._resolve_product(conn, product_id, name)
+            if error:
+                return error
+            if operation == "update":
+                if not product_id or new_price is None:
+                    return {"sql": None, "result": "❌ 'product_id' (or 'name') and 'new_price' required for update."}
+                sql_query = "UPDATE products SET price = ? WHERE id = ?"
+                with conn:
+                    conn.execute(sql_query, (new_price, product_id))
+                return {"sql": sql_query, "result": f"✅ Product '{product_name}' price updated to ${new_price:.2f}."}
+            if not product_id:
+                return {"sql": None, "result": "❌ 'product_id' or 'name' required for delete."}
+            sql_query = "DELETE FROM products WHERE id = ?"
+            with conn:
+                conn.execute(sql_query, (product_id,))
+            return {"sql": sql_query, "result": f"✅ Product '{product_name}' deleted."}
 
-        elif operation == "update":
+        if operation == "describe":
+            return self._describe(conn, table_name or "products")
+        return {"sql": None, "result": f"❌ Unknown operation '{operation}'."}
+
+    # ---------- sales ----------
+    _SALES_BULK = {
+        "key": "sale_id",
+        "noun": "sales",
+        "bulk_create": """
+            INSERT INTO Sales (customer_id, product_id, quantity, unit_price, total_price)
+            SELECT %s, id, %s, COALESCE(%s, price), COALESCE(%s, COALESCE(%s, price) * %s) FROM products WHERE id = %s
+            """,
+        # Missing unit_price/total_amount default from the product price, like the remote path
+        "bulk_create_params": lambda r: (
+            int(_required(r, "customer_id")[0]), int(r.get("quantity") or 1), r.get("unit_price"),
+            r.get("total_amount"), r.get("unit_price"), int(r.get("quantity") or 1), int(_required(r, "product_id")[0]),
+        ),
+        "bulk_create_error": "'customer_id' and 'product_id' required for create.",
+        "bulk_create_missing": lambda p: f"Product with ID {p[-1]} not found.",
+        "created": lambda p, new_id: {"sale_id": new_id},
+        "bulk_update": "UPDATE Sales SET quantity = %s, total_price = unit_price * %s WHERE Id = %s",
+        "bulk_update_params": lambda r: (int(r["new_quantity"]), int(r["new_quantity"]), int(_required(r, "sale_id")[0])),
+        "bulk_update_error": "'sale_id' and 'new_quantity' required for update.",
+        "bulk_update_missing": lambda p: f"Sale with ID {p[-1]} not found.",
+        "bulk_delete": "DELETE FROM Sales WHERE Id = %s",
+        "bulk_delete_params": lambda r: (int(_required(r, "sale_id")[0]),),
+        "bulk_delete_error": "'sale_id' required for delete.",
+        "bulk_delete_missing": lambda p: f"Sale with ID {p[-1]} not found.",
+    }
+
+    def sales(self, operation: str, customer_id: int = None, product_id: int = None, quantity: int = 1,
+              unit_price: float = None, total_amount: float = None, sale_id: int = None, new_quantity: int = None,
+              table_name: str = None, display_format: str = None, customer_name: str = None,
+              product_name: str = None, email: str = None, total_price: float = None, columns: str = None,
+              where_clause: str = None, filter_conditions: dict = None, limit: int = None, records: list = None,
+              cursor: str = None, page_size: int = None, group_by: str = None, metrics: str = None,
+              result_format: str = None) -> dict:
+        conn = self.connect()
+        if operation in ("bulk_create", "bulk_update", "bulk_delete"):
+            return self._bulk(conn, operation, records, self._SALES_BULK)
+        format_error = _check_result_format(result_format)
+        if format_error:
+            return {"sql": None, "result": format_error}
+
+        if operation == "create":
+            if not customer_id or not product_id:
+                return {"sql": None, "result": "❌ 'customer_id' and 'product_id' required for create."}
+            customer = conn.execute("SELECT Name FROM Customers WHERE Id = ?", (customer_id,)).fetchone()
+            if not customer:
+                return {"sql": None, "result": f"❌ Customer with ID {customer_id} not found."}
+            product = conn.execute("SELECT name, price FROM products WHERE id = ?", (product_id,)).fetchone()
+            if not product:
+                return {"sql": None, "result": f"❌ Product with ID {product_id} not found."}
+            unit_price = unit_price or product[1]
+            total_amount = total_amount or unit_price * quantity
+            sql_query = "INSERT INTO Sales (customer_id, product_id, quantity, unit_price, total_price) VALUES (?, ?, ?, ?, ?)"
+            with conn:
+                conn.execute(sql_query, (customer_id, product_id, quantity, unit_price, total_amount))
+            return {"sql": sql_query, "result": f"✅ Sale created: {customer[0]} bought {quantity} {product[0]}(s) for ${total_amount:.2f}"}
+
+        if operation == "update":
             if not sale_id or new_quantity is None:
-                sales_cnxn.close()
                 return {"sql": None, "result": "❌ 'sale_id' and 'new_quantity' required for update."}
+            sql_query = "UPDATE Sales SET quantity = ?, total_price = unit_price * ? WHERE Id = ?"
+            with conn:
+                conn.execute(sql_query, (new_quantity, new_quantity, sale_id))
+            return {"sql": sql_query, "result": f"✅ Sale id={sale_id} updated to quantity {new_quantity}."}
 
-            # Recalculate total amount
-            sql_query = """
-                        UPDATE sales
-                        SET quantity     = %s,
-                            total_amount = unit_price * %s
-                        WHERE id = %s
-                        """
-            sales_cur.execute(sql_query, (new_quantity, new_quantity, sale_id))
-            sales_cnxn.commit()
-            result = f"✅ Sale id={sale_id} updated to quantity {new_quantity}."
-            sales_cnxn.close()
-            return {"sql": sql_query, "result": result}
-
-        elif operation == "delete":
+        if operation == "delete":
             if not sale_id:
-                sales_cnxn.close()
                 return {"sql": None, "result": "❌ 'sale_id' required for delete."}
+            sql_query = "DELETE FROM Sales WHERE Id = ?"
+            with conn:
+                conn.execute(sql_query, (sale_id,))
+            return {"sql": sql_query, "result": f"✅ Sale id={sale_id} deleted."}
 
-            sql_query = "DELETE FROM sales WHERE id = %s"
-            sales_cur.execute(sql_query, (sale_id,))
-            sales_cnxn.commit()
-            result = f"✅ Sale id={sale_id} deleted."
-            sales_cnxn.close()
-            return {"sql": sql_query, "result": result}
+        if operation == "read":
+            return self._sales_read(conn, columns, where_clause, filter_conditions, limit, cursor, page_size,
+                                    display_format, result_format)
 
-    # Enhanced READ operation with FIXED column selection AND WHERE clause filtering
-    elif operation == "read":
-        mysql_cnxn = get_mysql_conn()
-        mysql_cur = mysql_cnxn.cursor()
+        if operation == "aggregate":
+            try:
+                dimensions = _parse_aggregate_terms(group_by, SALES_AGGREGATE_DIMENSIONS, _DIMENSION_ALIASES, "group_by dimension")
+                metric_names = _parse_aggregate_terms(metrics, SALES_AGGREGATE_METRICS, _METRIC_ALIASES, "metric")
+                metric_names = metric_names or DEFAULT_AGGREGATE_METRICS
+                with trace_span("build_sql"):
+                    where_sql, query_params = _sales_filter(where_clause, filter_conditions)
+                    sql = _sqlite_aggregate_sql(dimensions, metric_names, where_sql, bool(limit))
+            except ValueError as e:
+                return {"sql": None, "result": f"❌ {e}"}
+            names = [alias for d in dimensions for alias, _ in SQLITE_AGGREGATE_DIMENSIONS[d]] + list(metric_names)
+            response = self._read(conn, sql, tuple(query_params + ([int(limit)] if limit else [])), names,
+                                  result_format, lambda r: {n: _aggregate_value(v) for n, v in zip(names, r)})
+            response.update({"group_by": list(dimensions), "metrics": list(metric_names), "source": "sales"})
+            return response
 
-        # Fixed column mappings - standardized naming
-        available_columns = {
-            "sale_id": "s.Id",
-            "first_name": "c.FirstName", 
-            "last_name": "c.LastName",
-            "customer_name": "c.Name",  # Use the Name field which has full name
-            "product_name": "p.name",
-            "product_description": "p.description",
-            "quantity": "s.quantity",
-            "unit_price": "s.unit_price",
-            "total_price": "s.total_price",
-            "amount": "s.total_price",  # Alias for total_price
-            "sale_date": "s.sale_date",
-            "date": "s.sale_date",  # Alias for sale_date
-            "customer_email": "c.Email",
-            "email": "c.Email"  # Alias for customer_email
-        }
+        return {"sql": None, "result": f"❌ Unknown operation '{operation}'."}
 
-        # FIXED: Process column selection with better parsing
-        selected_columns = []
-        column_aliases = []
-        
-        print(f"DEBUG: Raw columns parameter: '{columns}'")
-        
-        if columns and columns.strip():
-            # Clean and split the columns string
-            columns_clean = columns.strip()
-            
-            # Handle different input patterns
-            if "," in columns_clean:
-                # Comma-separated list
-                requested_cols = [col.strip().lower().replace(" ", "_") for col in columns_clean.split(",") if col.strip()]
-            else:
-                # Space-separated or single column
-                requested_cols = [col.strip().lower().replace(" ", "_") for col in columns_clean.split() if col.strip()]
-            
-            print(f"DEBUG: Requested columns after parsing: {requested_cols}")
-            
-            # Build SELECT clause based on requested columns
-            for col in requested_cols:
-                matched = False
-                # Try exact match first
-                if col in available_columns:
-                    selected_columns.append(available_columns[col])
-                    column_aliases.append(col)
-                    matched = True
-                    print(f"DEBUG: Exact match found for '{col}': {available_columns[col]}")
-                else:
-                    # Try fuzzy matching for common variations
-                    for avail_col, db_col in available_columns.items():
-                        if (col in avail_col or avail_col in col or 
-                            col.replace("_", "") in avail_col.replace("_", "") or
-                            avail_col.replace("_", "") in col.replace("_", "")):
-                            selected_columns.append(db_col)
-                            column_aliases.append(avail_col)
-                            matched = True
-                            print(f"DEBUG: Fuzzy match found for '{col}' -> '{avail_col}': {db_col}")
-                            break
-                
-                if not matched:
-                    print(f"DEBUG: No match found for column '{col}'. Skipping...")
-
-        # If no valid columns found or no columns specified, use default key columns
-        if not selected_columns:
-            print("DEBUG: Using default key columns")
-            selected_columns = [
-                "s.Id", "c.Name", "p.name", "s.quantity", "s.unit_price", "s.total_price", "s.sale_date", "c.Email"
-            ]
-            column_aliases = [
-                "sale_id", "customer_name", "product_name", "quantity", "unit_price", "total_price", "sale_date", "email"
-            ]
-
-        print(f"DEBUG: Final selected columns: {selected_columns}")
-        print(f"DEBUG: Final column aliases: {column_aliases}")
-
-        # Build dynamic SQL query
-        select_clause = ", ".join([f"{col} AS {alias}" for col, alias in zip(selected_columns, column_aliases)])
-        
-        # Base query
-        base_sql = f"""
-        SELECT  {select_clause}
-        FROM    Sales          s
-        JOIN    Customers      c ON c.Id = s.customer_id
-        JOIN    ProductsCache  p ON p.id = s.product_id
-        """
-        
-        # COMPLETELY REWRITTEN WHERE clause processing
-        where_sql = ""
-        query_params = []
-        
-        if where_clause and where_clause.strip():
-            print(f"DEBUG: Processing WHERE clause: '{where_clause}'")
-            
-            import re
-            
-            # Clean the input
-            clause = where_clause.strip().lower()
-            
-            # Enhanced pattern matching for various query formats
-            where_conditions = []
-            
-            # Pattern 1: "total_price > 50", "total price exceed 50", "total price exceeds $50"
-            price_patterns = [
-                r'total[_\s]*price[_\s]*(>|>=|exceed[s]?|above|greater\s+than|more\s+than)\s*\$?(\d+(?:\.\d+)?)',
-                r'(>|>=|exceed[s]?|above|greater\s+than|more\s+than)\s*\$?(\d+(?:\.\d+)?)\s*total[_\s]*price',
-                r'total[_\s]*price[_\s]*(<|<=|below|less\s+than|under)\s*\$?(\d+(?:\.\d+)?)',
-                r'total[_\s]*price[_\s]*(=|equals?|is)\s*\$?(\d+(?:\.\d+)?)'
-            ]
-            
-            for pattern in price_patterns:
-                match = re.search(pattern, clause)
-                if match:
-                    if len(match.groups()) == 2:
-                        operator_text, value = match.groups()
-                        # Map operator text to SQL operator
-                        if any(word in operator_text for word in ['exceed', 'above', 'greater', 'more', '>']):
-                            operator = '>'
-                        elif any(word in operator_text for word in ['below', 'less', 'under', '<']):
-                            operator = '<'
-                        elif any(word in operator_text for word in ['equal', 'is', '=']):
-                            operator = '='
-                        else:
-                            operator = '>'  # default
-                        
-                        where_conditions.append(f"s.total_price {operator} %s")
-                        query_params.append(float(value))
-                        print(f"DEBUG: Found price condition: s.total_price {operator} {value}")
-                        break
-            
-            # Pattern 2: Quantity conditions
-            quantity_patterns = [
-                r'quantity[_\s]*(>|>=|greater\s+than|more\s+than|above)\s*(\d+)',
-                r'quantity[_\s]*(<|<=|less\s+than|below|under)\s*(\d+)',
-                r'quantity[_\s]*(=|equals?|is)\s*(\d+)'
-            ]
-            
-            for pattern in quantity_patterns:
-                match = re.search(pattern, clause)
-                if match:
-                    operator_text, value = match.groups()
-                    if any(symbol in operator_text for symbol in ['>', 'greater', 'more', 'above']):
-                        operator = '>'
-                    elif any(symbol in operator_text for symbol in ['<', 'less', 'below', 'under']):
-                        operator = '<'
-                    else:
-                        operator = '='
-                    
-                    where_conditions.append(f"s.quantity {operator} %s")
-                    query_params.append(int(value))
-                    print(f"DEBUG: Found quantity condition: s.quantity {operator} {value}")
-                    break
-            
-            # Pattern 3: Customer name conditions
-            customer_patterns = [
-                r'customer[_\s]*name[_\s]*like[_\s]*["\']([^"\']+)["\']',
-                r'customer[_\s]*name[_\s]*=[_\s]*["\']([^"\']+)["\']',
-                r'customer[_\s]*=[_\s]*["\']([^"\']+)["\']',
-                r'customer[_\s]*name[_\s]*([a-zA-Z\s]+?)(?:\s|$)'
-            ]
-            
-            for pattern in customer_patterns:
-                match = re.search(pattern, clause)
-                if match:
-                    name_value = match.group(1).strip()
-                    if 'like' in clause:
-                        where_conditions.append("c.Name LIKE %s")
-                        query_params.append(f"%{name_value}%")
-                    else:
-                        where_conditions.append("c.Name = %s")
-                        query_params.append(name_value)
-                    print(f"DEBUG: Found customer condition: {name_value}")
-                    break
-            
-            # Pattern 4: Product name conditions
-            product_patterns = [
-                r'product[_\s]*name[_\s]*like[_\s]*["\']([^"\']+)["\']',
-                r'product[_\s]*name[_\s]*=[_\s]*["\']([^"\']+)["\']',
-                r'product[_\s]*=[_\s]*["\']([^"\']+)["\']'
-            ]
-            
-            for pattern in product_patterns:
-                match = re.search(pattern, clause)
-                if match:
-                    product_value = match.group(1).strip()
-                    if 'like' in clause:
-                        where_conditions.append("p.name LIKE %s")
-                        query_params.append(f"%{product_value}%")
-                    else:
-                        where_conditions.append("p.name = %s")
-                        query_params.append(product_value)
-                    print(f"DEBUG: Found product condition: {product_value}")
-                    break
-            
-            # If no specific patterns matched, try a generic approach
-            if not where_conditions:
-                # Look for any number that might be a price threshold
-                number_match = re.search(r'\$?(\d+(?:\.\d+)?)', clause)
-                if number_match:
-                    value = float(number_match.group(1))
-                    # Default to total_price filter if no specific field mentioned
-                    if any(word in clause for word in ['exceed', 'above', 'greater', 'more']):
-                        where_conditions.append("s.total_price > %s")
-                    elif any(word in clause for word in ['below', 'less', 'under']):
-                        where_conditions.append("s.total_price < %s")
-                    else:
-                        where_conditions.append("s.total_price > %s")  # Default assumption
-                    
-                    query_params.append(value)
-                    print(f"DEBUG: Generic number condition: {value}")
-            
-            # Build the WHERE clause
-            if where_conditions:
-                where_sql = " WHERE " + " AND ".join(where_conditions)
-                print(f"DEBUG: Final WHERE clause: {where_sql}")
-                print(f"DEBUG: Query parameters: {query_params}")
-        
-        # Handle structured filter conditions (alternative to where_clause)
-        elif filter_conditions:
-            where_conditions = []
-            for field, value in filter_conditions.items():
-                if field in available_columns:
-                    db_field = available_columns[field]
-                    if isinstance(value, str):
-                        where_conditions.append(f"{db_field} LIKE %s")
-                        query_params.append(f"%{value}%")
-                    else:
-                        where_conditions.append(f"{db_field} = %s")
-                        query_params.append(value)
-            
-            if where_conditions:
-                where_sql = " WHERE " + " AND ".join(where_conditions)
-        
-        # Add ORDER BY and LIMIT
-        order_sql = " ORDER BY s.sale_date DESC"
-        limit_sql = ""
-        if limit:
-            limit_sql = f" LIMIT {limit}"
-        
-        # Complete SQL query
-        sql = base_sql + where_sql + order_sql + limit_sql
-        
-        print(f"DEBUG: Final SQL: {sql}")
-        print(f"DEBUG: Final Parameters: {query_params}")
+    def _sales_read(self, conn, columns, where_clause, filter_conditions, limit, cursor, page_size,
+                    display_format, result_format) -> dict:
+        """sales_crud(read) over the local tables: same columns, filters and keyset pagination as MySQL"""
+        build_started = time.perf_counter()
+        column_aliases = list(_resolve_sales_columns(columns))
+        try:
+            where_sql, query_params = _sales_filter(where_clause, filter_conditions)
+        except FilterError as e:
+            return {"sql": None, "result": f"❌ {e}"}
+        paginate = cursor is not None or page_size is not None or not limit
+        if paginate:
+            page_size = max(1, min(int(page_size or SALES_READ_DEFAULT_PAGE_SIZE), SALES_READ_MAX_PAGE_SIZE))
+            if cursor:
+                try:
+                    cursor_date, cursor_id = decode_sales_cursor(cursor)
+                except ValueError:
+                    return {"sql": None, "result": "❌ Invalid or expired 'cursor'."}
+                where_sql += (" AND " if where_sql else " WHERE ") + "(s.sale_date, s.Id) < (%s, %s)"
+                query_params.extend([cursor_date, cursor_id])
+        row_limit = page_size + 1 if paginate else int(limit)
+        sql = sqlite_sql(_sales_read_sql(tuple(column_aliases), where_sql, True))
+        query_params.append(row_limit)
+        add_span("build_sql", time.perf_counter() - build_started)
 
-        # Execute query
         try:
-            if query_params:
-                mysql_cur.execute(sql, query_params)
-            else:
-                mysql_cur.execute(sql)
-            
-            rows = mysql_cur.fetchall()
-            print(f"DEBUG: Query returned {len(rows)} rows")
-        except Exception as e:
-            mysql_cnxn.close()
+            with trace_span("execute"):
+                cur = conn.execute(sql, query_params)
+            with trace_span("fetch"):
+                rows = cur.fetchall()
+        except sqlite3.Error as e:
             return {"sql": sql, "result": f"❌ SQL Error: {str(e)}"}
-        
-        mysql_cnxn.close()
+        has_more = paginate and len(rows) > page_size
+        if has_more:
+            rows = rows[:page_size]
 
-        # Build result with only requested columns
-        processed_results = []
-        for r in rows:
-            row_data = {}
-            for i, alias in enumerate(column_aliases):
-                if i < len(r):  # Safety check
-                    value = r[i]
-                    
-                    # Apply formatting based on display_format
-                    if display_format == "Data Format Conversion":
-                        if "date" in alias or "timestamp" in alias:
-                            value = value.strftime("%Y-%m-%d %H:%M:%S") if value else "N/A"
-                    elif display_format == "Decimal Value Formatting":
-                        if "price" in alias or "total" in alias or "amount" in alias:
-                            value = f"{float(value):.2f}" if value is not None else "0.00"
-                    elif display_format == "Null Value Removal/Handling":
-                        if value is None:
-                            value = "N/A"
-                    
-                    row_data[alias] = value
-            
-            # Handle String Concatenation for specific display format
-            if display_format == "String Concatenation":
-                if "customer_name" in row_data or ("first_name" in row_data and "last_name" in row_data):
-                    if "first_name" in row_data and "last_name" in row_data:
-                        row_data["customer_full_name"] = f"{row_data['first_name']} {row_data['last_name']}"
-                
-                if "product_name" in row_data and "product_description" in row_data:
-                    desc = row_data['product_description'] or 'No description'
-                    row_data["product_full_description"] = f"{row_data['product_name']} ({desc})"
-                
-                # Create sale summary if we have the needed fields
-                if all(field in row_data for field in ['customer_name', 'quantity', 'product_name', 'total_price']):
-                    row_data["sale_summary"] = (
-                        f"{row_data['customer_name']} bought {row_data['quantity']} "
-                        f"of {row_data['product_name']} for ${float(row_data['total_price']):.2f}"
-                    )
-            
-            # Skip null records if specified
-            if display_format == "Null Value Removal/Handling":
-                if any(v is None for v in row_data.values()):
-                    continue
-                    
-            processed_results.append(row_data)
+        with trace_span("process", rows=len(rows)):
+            if result_format == "columnar" and not display_format:
+                result = to_columnar(column_aliases, rows)
+            else:
+                formatted = [row for row in (_format_sale_row(r, column_aliases, display_format) for r in rows) if row is not None]
+                if result_format == "columnar":
+                    result = records_to_columnar(formatted) if formatted else to_columnar(column_aliases, [])
+                else:
+                    result = formatted
+        response = {"sql": sql, "result": result}
+        if paginate:
+            response["next_cursor"] = encode_sales_cursor(rows[-1][-2], rows[-1][-1]) if has_more else None
+        return response
 
-        print(f"DEBUG: Processed results count: {len(processed_results)}")
-        if processed_results:
-            print(f"DEBUG: First result keys: {list(processed_results[0].keys())}")
 
-        return {"sql": sql, "result": processed_results}
+STORAGE_BACKENDS = {"remote": RemoteBackend, "sqlite": SQLiteBackend}
+if STORAGE_BACKEND not in STORAGE_BACKENDS:
+    raise RuntimeError(f"Unknown STORAGE_BACKEND '{STORAGE_BACKEND}' (use one of: {', '.join(STORAGE_BACKENDS)})")
+STORAGE: StorageBackend = STORAGE_BACKENDS[STORAGE_BACKEND]()
+
+
+async def run_storage(entity: str, **kwargs) -> Any:
+    """Run one tool call on the configured storage backend, off the event loop"""
+    return await run_db(STORAGE.executor(entity, kwargs.get("operation")), getattr(STORAGE, entity), **kwargs)
 
-    else:
-        return {"sql": None, "result": f"❌ Unknown operation '{operation}'."}
 
 # ————————————————
-# 10. Main: seed + run server
+# 17. Prometheus /metrics Endpoint
+# ————————————————
+# Plain-text exposition (format 0.0.4) served next to /mcp: tool latency
+# histograms, errors, rows and in-flight calls, connection pool state and
+# cache hit ratios. Everything is read from in-process counters, so a
+# scrape never touches the databases.
+METRICS_PATH = os.getenv("METRICS_PATH", "/metrics")
+
+
+def _prom_escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+class _PromWriter:
+    def __init__(self):
+        self.lines = []
+
+    def family(self, name: str, kind: str, help_text: str):
+        self.lines.append(f"# HELP {name} {help_text}")
+        self.lines.append(f"# TYPE {name} {kind}")
+
+    def sample(self, name: str, value, **labels):
+        label_text = ",".join(f'{k}="{_prom_escape(v)}"' for k, v in labels.items())
+        self.lines.append(f"{name}{{{label_text}}} {value}" if label_text else f"{name} {value}")
+
+    def text(self) -> str:
+        return "\n".join(self.lines) + "\n"
+
+
+def render_prometheus_metrics() -> str:
+    out = _PromWriter()
+    series, in_flight = TOOL_METRICS.snapshot()
+
+    out.family("mcp_tool_calls_total", "counter", "Tool calls by tool and operation")
+    for (tool, operation), s in sorted(series.items()):
+        out.sample("mcp_tool_calls_total", s["calls"], tool=tool, operation=operation)
+    out.family("mcp_tool_errors_total", "counter", "Tool calls that raised or returned an error result")
+    for (tool, operation), s in sorted(series.items()):
+        out.sample("mcp_tool_errors_total", s["errors"], tool=tool, operation=operation)
+    out.family("mcp_tool_rows_returned_total", "counter", "Rows returned by tool calls")
+    for (tool, operation), s in sorted(series.items()):
+        out.sample("mcp_tool_rows_returned_total", s["rows"], tool=tool, operation=operation)
+
+    out.family("mcp_tool_duration_seconds", "histogram", "Tool call latency")
+    for (tool, operation), s in sorted(series.items()):
+        cumulative = 0
+        for bound, count in zip(TOOL_METRICS.buckets, s["buckets"]):
+            cumulative += count
+            out.sample("mcp_tool_duration_seconds_bucket", cumulative, tool=tool, operation=operation, le=bound)
+        out.sample("mcp_tool_duration_seconds_bucket", s["calls"], tool=tool, operation=operation, le="+Inf")
+        out.sample("mcp_tool_duration_seconds_sum", round(s["seconds"], 6), tool=tool, operation=operation)
+        out.sample("mcp_tool_duration_seconds_count", s["calls"], tool=tool, operation=operation)
+
+    out.family("mcp_tool_in_flight", "gauge", "Tool calls currently running")
+    for tool, count in sorted(in_flight.items()):
+        out.sample("mcp_tool_in_flight", count, tool=tool)
+
+    pools = get_pool_metrics()
+    out.family("db_pool_connections", "gauge", "Pooled connections by state")
+    for name, stats in pools.items():
+        out.sample("db_pool_connections", stats["idle"], pool=name, state="idle")
+        out.sample("db_pool_connections", stats["in_use"], pool=name, state="in_use")
+    out.family("db_pool_max_connections", "gauge", "Configured pool size limit")
+    for name, stats in pools.items():
+        out.sample("db_pool_max_connections", stats["max_size"], pool=name)
+    for counter in ("checkouts", "created", "closed", "evicted_idle", "health_check_failures", "waits", "timeouts"):
+        out.family(f"db_pool_{counter}_total", "counter", f"Connection pool {counter.replace('_', ' ')}")
+        for name, stats in pools.items():
+            out.sample(f"db_pool_{counter}_total", stats[counter], pool=name)
+
+    caches = get_cache_metrics()
+    for name, stats in get_statement_metrics().items():
+        caches[f"prepared_statements_{name}"] = stats
+    caches.pop("prepared_statements", None)
+    out.family("cache_hits_total", "counter", "Cache hits")
+    for name, stats in caches.items():
+        out.sample("cache_hits_total", stats["hits"], cache=name)
+    out.family("cache_misses_total", "counter", "Cache misses")
+    for name, stats in caches.items():
+        out.sample("cache_misses_total", stats["misses"], cache=name)
+    out.family("cache_hit_ratio", "gauge", "Cache hits / lookups since start")
+    for name, stats in caches.items():
+        out.sample("cache_hit_ratio", stats["hit_rate"], cache=name)
+    return out.text()
+
+
+@mcp.custom_route(METRICS_PATH, methods=["GET"])
+async def prometheus_metrics(request: Request) -> PlainTextResponse:
+    return PlainTextResponse(render_prometheus_metrics(), media_type="text/plain; version=0.0.4; charset=utf-8")
+
+
+STARTUP_REPORT["import_ms"] = round((time.perf_counter() - _IMPORT_STARTED) * 1000, 3)
+
+
+# ————————————————
+# 18. Main: migrate + run server
 # ————————————————
 if __name__ == "__main__":
-    # 1) Create + seed all databases (if needed)
-    seed_databases()
+    import argparse
+
+    parser = argparse.ArgumentParser(description="CRUD MCP server")
+    parser.add_argument(
+        "command", nargs="?", default="serve", choices=("serve", "migrate", "seed", "rebuild-rollups"),
+        help="serve (default): apply pending migrations and run the MCP server; migrate: only apply migrations; "
+             "seed: apply migrations and insert the sample rows into empty tables; "
+             "rebuild-rollups: recompute the sales rollup tables",
+    )
+    cli = parser.parse_args()
+
+    if cli.command == "rebuild-rollups":
+        if STORAGE.name != "remote":
+            raise SystemExit("rebuild-rollups only applies to STORAGE_BACKEND=remote")
+        print(f"Rebuilt sales rollups: {rebuild_sales_rollups()}")
+        raise SystemExit(0)
+
+    if cli.command == "migrate":
+        print(json.dumps(STORAGE.migrate(), indent=2))
+        raise SystemExit(0)
+
+    if cli.command == "seed":
+        STORAGE.migrate()
+        print(f"Seeded rows: {STORAGE.seed()}")
+        raise SystemExit(0)
+
+    # 1) Apply pending schema migrations (just a version check on a warm restart).
+    #    For remote storage this also opens min_size connections per pool (skipping
+    #    the TLS handshake on the first requests) and starts the PostgreSQL -> MySQL
+    #    read-model sync.
+    logger.info("Storage backend: %s", STORAGE.name)
+    startup_started = time.perf_counter()
+    STORAGE.startup()
+    STARTUP_REPORT["startup_ms"] = round((time.perf_counter() - startup_started) * 1000, 3)
+    logger.info("Startup report: %s", json.dumps(STARTUP_REPORT))
 
-    # 2) Launch the MCP server for cloud deployment
+    # 3) Launch the MCP server for cloud deployment
     import os
 
     port = int(os.environ.get("PORT", 8000))
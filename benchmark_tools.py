@@ -0,0 +1,448 @@
+"""Offline benchmark for the sqlserver_crud / postgresql_crud / sales_crud tools.
+
+Calls go through FastMCP's in-process client (no HTTP), so the numbers cover
+the tool code, the MCP round trip and the databases behind them.
+
+    python benchmark_tools.py                                # all scenarios, concurrency 1 and 8
+    python benchmark_tools.py --scenario mixed --concurrency 1,8,32 --requests 2000
+    python benchmark_tools.py --backend sqlite               # embedded SQLite storage backend
+    python benchmark_tools.py --backend memory               # in-memory stand-in (MCP overhead only)
+    python benchmark_tools.py --output bench.json            # JSON report to compare commits
+
+--backend live (the default) imports Server_Tools1, so the usual MYSQL_* /
+PG_* / PG_SALES_* variables must point at running databases (e.g. local
+Docker instances); --seed applies the migrations and inserts the sample rows
+into empty tables first. --backend sqlite
+runs the same tools on STORAGE_BACKEND=sqlite, in a fresh temporary database
+unless SQLITE_PATH is set. The report lists
+p50/p95/p99 latency and ops/sec per scenario and concurrency level.
+"""
+import os
+import json
+import time
+import random
+import asyncio
+import argparse
+import tempfile
+import subprocess
+from datetime import datetime, timezone
+from typing import Any
+
+from fastmcp import Client
+from fastmcp.exceptions import ToolError
+
+SCENARIOS = ("point_reads", "filtered_sales_reads", "creates", "mixed")
+
+# Weights of the mixed workload: mostly reads, some aggregates, a few writes
+# (create alternates customer and sale inserts)
+MIXED_WEIGHTS = {"point_read": 60, "filtered_sales_read": 25, "aggregate": 10, "create": 5}
+
+# Sales created by a run use this quantity, so cleanup can tell them apart
+BENCH_SALE_QUANTITY = 97
+# How long cleanup waits for new sales to reach the MySQL read model (live backend)
+CLEANUP_SYNC_WAIT_S = 30.0
+
+SALES_WHERE_CLAUSES = (
+    "total price > 20",
+    "quantity >= 2",
+    "total price between 5 and 50",
+    "quantity > 1 and total price < 100",
+)
+
+
+# ————————————————
+# In-memory stand-in server
+# ————————————————
+def build_memory_server(customers: int = 200, products: int = 100, sales: int = 5000):
+    """FastMCP server with the three tool names over in-memory tables.
+
+    Answers in the same {"sql", "result"} shape as the real tools but with
+    no database behind it, so a run against it measures the harness and the
+    MCP round trip; subtract it from a live run to see the database share.
+    """
+    from fastmcp import FastMCP
+
+    rng = random.Random(7)
+    server = FastMCP("CRUDServerStandIn")
+    customer_rows = {
+        i: {"Id": i, "FirstName": f"First{i}", "LastName": f"Last{i}", "Name": f"First{i} Last{i}",
+            "Email": f"user{i}@example.com", "CreatedAt": "2024-01-01T00:00:00"}
+        for i in range(1, customers + 1)
+    }
+    product_rows = {
+        i: {"id": i, "name": f"Product {i}", "price": round(rng.uniform(1, 100), 2), "description": ""}
+        for i in range(1, products + 1)
+    }
+    sale_rows = {}
+
+    def _add_sale(customer, product, quantity, sale_date="2024-01-01T00:00:00"):
+        sale_id = max(sale_rows, default=0) + 1
+        sale_rows[sale_id] = {
+            "sale_id": sale_id, "customer_name": customer_rows[customer]["Name"],
+            "product_name": product_rows[product]["name"], "quantity": quantity,
+            "unit_price": product_rows[product]["price"],
+            "total_price": round(quantity * product_rows[product]["price"], 2), "sale_date": sale_date,
+        }
+        return sale_rows[sale_id]
+
+    for _ in range(sales):
+        _add_sale(rng.randint(1, customers), rng.randint(1, products), rng.randint(1, 5))
+
+    def _matches(row, filters):
+        # Just the filter_conditions shapes the workload sends: {"col": value} and {"col": {"gt": value}}
+        for column, test in filters.items():
+            if isinstance(test, dict):
+                if "gt" in test and not row[column] > test["gt"]:
+                    return False
+            elif row[column] != test:
+                return False
+        return True
+
+    def _by_name(rows, key, name, limit):
+        matches = [r for r in rows.values() if not name or name.lower() in r[key].lower()]
+        return matches[:limit or 10]
+
+    @server.tool()
+    async def sqlserver_crud(operation: str, name: str = None, email: str = None, limit: int = 10,
+                             customer_id: int = None, records: list[dict] = None) -> Any:
+        if operation == "read":
+            return {"sql": "SELECT ... FROM Customers", "result": _by_name(customer_rows, "Name", name, limit)}
+        if operation == "create":
+            new_id = max(customer_rows, default=0) + 1
+            first, _, last = (name or "").partition(" ")
+            customer_rows[new_id] = {"Id": new_id, "FirstName": first, "LastName": last, "Name": name,
+                                     "Email": email, "CreatedAt": datetime.now().isoformat()}
+            return {"sql": "INSERT INTO Customers ...", "result": f"✅ New customer '{name}' created with email '{email}'."}
+        if operation == "bulk_delete":
+            for rec in records or []:
+                customer_rows.pop(rec.get("customer_id"), None)
+            return {"sql": "DELETE FROM Customers ...", "result": []}
+        return {"sql": None, "result": f"❌ Unknown operation '{operation}'."}
+
+    @server.tool()
+    async def postgresql_crud(operation: str, name: str = None, limit: int = 10, product_id: int = None) -> Any:
+        if operation == "read":
+            return {"sql": "SELECT ... FROM products", "result": _by_name(product_rows, "name", name, limit)}
+        return {"sql": None, "result": f"❌ Unknown operation '{operation}'."}
+
+    @server.tool()
+    async def sales_crud(operation: str, customer_id: int = None, product_id: int = None, quantity: int = 1,
+                         where_clause: str = None, filter_conditions: dict = None, limit: int = None,
+                         page_size: int = None, group_by: str = None, metrics: str = None,
+                         records: list[dict] = None) -> Any:
+        if operation == "read":
+            rows = [r for r in sale_rows.values() if _matches(r, filter_conditions or {})]
+            return {"sql": "SELECT ... FROM Sales", "result": rows[:limit or page_size or 100], "next_cursor": None}
+        if operation == "create":
+            if customer_id not in customer_rows:
+                return {"sql": None, "result": f"❌ Customer with ID {customer_id} not found."}
+            if product_id not in product_rows:
+                return {"sql": None, "result": f"❌ Product with ID {product_id} not found."}
+            sale = _add_sale(customer_id, product_id, quantity, datetime.now().isoformat())
+            return {"sql": "INSERT INTO sales ...", "result": f"✅ Sale created: {sale['customer_name']} bought "
+                                                               f"{quantity} {sale['product_name']}(s) for ${sale['total_price']:.2f}"}
+        if operation == "bulk_delete":
+            for rec in records or []:
+                sale_rows.pop(rec.get("sale_id"), None)
+            return {"sql": "DELETE FROM sales ...", "result": []}
+        if operation == "aggregate":
+            totals = {}
+            for r in sale_rows.values():
+                totals[r["customer_name"]] = totals.get(r["customer_name"], 0) + r["total_price"]
+            return {"sql": "SELECT ... GROUP BY ...", "result": [
+                {"customer_name": k, "total_revenue": round(v, 2)} for k, v in list(totals.items())[:limit or 50]
+            ]}
+        return {"sql": None, "result": f"❌ Unknown operation '{operation}'."}
+
+    return server
+
+
+def load_server(backend: str, seed: bool):
+    if backend == "memory":
+        return build_memory_server()
+    if backend == "sqlite":
+        os.environ["STORAGE_BACKEND"] = "sqlite"
+        if "SQLITE_PATH" not in os.environ:
+            os.environ["SQLITE_PATH"] = os.path.join(tempfile.mkdtemp(prefix="crud-bench-"), "crud.sqlite3")
+    else:
+        os.environ["STORAGE_BACKEND"] = "remote"
+    import Server_Tools1  # needs the MySQL / PostgreSQL environment variables
+
+    if backend == "sqlite":
+        # Migrates a fresh database and fills its empty tables
+        Server_Tools1.STORAGE.startup()
+        Server_Tools1.STORAGE.seed()
+        return Server_Tools1.mcp
+    if seed:
+        Server_Tools1.STORAGE.migrate()
+        Server_Tools1.STORAGE.seed()
+    for pool in Server_Tools1.DB_POOLS:
+        pool.warm()
+    return Server_Tools1.mcp
+
+
+# ————————————————
+# Workload
+# ————————————————
+def _payload(result) -> Any:
+    if getattr(result, "structured_content", None) is not None:
+        return result.structured_content
+    text = "".join(getattr(block, "text", "") for block in result.content)
+    try:
+        return json.loads(text)
+    except ValueError:
+        return text
+
+
+def _rows(response) -> list:
+    result = response.get("result") if isinstance(response, dict) else None
+    if isinstance(result, list):
+        return result
+    if isinstance(result, dict) and "data" in result:  # columnar encoding
+        return [dict(zip(result["columns"], values)) for values in zip(*result["data"])]
+    return []
+
+
+class Workload:
+    """Ids and names sampled from the server, used to build realistic tool calls"""
+
+    def __init__(self, run_id: str, rng: random.Random):
+        self.run_id = run_id
+        self.rng = rng
+        self.customer_names = []
+        self.product_names = []
+        self.customer_ids = []
+        self.product_ids = []
+        self.sale_ids = []
+        self.last_sale_id = 0  # highest sale id before the run
+        self.created = 0  # customers created
+        self.sales_created = 0
+
+    async def discover(self, client: Client):
+        customers = _rows(_payload(await client.call_tool("sqlserver_crud", {"operation": "read", "limit": 200})))
+        products = _rows(_payload(await client.call_tool("postgresql_crud", {"operation": "read", "limit": 200})))
+        sales = _rows(_payload(await client.call_tool("sales_crud", {"operation": "read", "page_size": 500})))
+        self.customer_names = [c["FirstName"] for c in customers if c.get("FirstName")] or ["a"]
+        self.product_names = [p["name"].split()[0] for p in products if p.get("name")] or ["a"]
+        self.sale_ids = [s["sale_id"] for s in sales if s.get("sale_id") is not None] or [1]
+        self.customer_ids = [c["Id"] for c in customers if c.get("Id") is not None]
+        self.product_ids = [p["id"] for p in products if p.get("id") is not None]
+        self.last_sale_id = max(self.sale_ids)
+
+    def point_read(self) -> tuple:
+        kind = self.rng.randrange(3)
+        if kind == 0:
+            return "sqlserver_crud", {"operation": "read", "name": self.rng.choice(self.customer_names), "limit": 10}
+        if kind == 1:
+            return "postgresql_crud", {"operation": "read", "name": self.rng.choice(self.product_names), "limit": 10}
+        return "sales_crud", {"operation": "read", "filter_conditions": {"sale_id": self.rng.choice(self.sale_ids)}, "limit": 1}
+
+    def filtered_sales_read(self) -> tuple:
+        return "sales_crud", {"operation": "read", "where_clause": self.rng.choice(SALES_WHERE_CLAUSES), "page_size": 100}
+
+    def aggregate(self) -> tuple:
+        group_by = self.rng.choice(("customer", "product", "month", "customer,month"))
+        return "sales_crud", {"operation": "aggregate", "group_by": group_by, "limit": 50}
+
+    def create(self) -> tuple:
+        """Customer and sale inserts, alternating (sales need existing customers and products)"""
+        if self.customer_ids and self.product_ids and (self.created + self.sales_created) % 2:
+            return self.create_sale()
+        return self.create_customer()
+
+    def create_customer(self) -> tuple:
+        self.created += 1
+        name = f"Bench{self.run_id} User{self.created}"
+        return "sqlserver_crud", {"operation": "create", "name": name, "email": f"bench{self.run_id}.{self.created}@example.com"}
+
+    def create_sale(self) -> tuple:
+        # Cross-database path: customer (MySQL) and product (PostgreSQL) lookups, then the insert
+        self.sales_created += 1
+        return "sales_crud", {"operation": "create", "customer_id": self.rng.choice(self.customer_ids),
+                              "product_id": self.rng.choice(self.product_ids), "quantity": BENCH_SALE_QUANTITY}
+
+    def next_call(self, scenario: str) -> tuple:
+        if scenario == "point_reads":
+            return self.point_read()
+        if scenario == "filtered_sales_reads":
+            return self.filtered_sales_read()
+        if scenario == "creates":
+            return self.create()
+        kind = self.rng.choices(list(MIXED_WEIGHTS), weights=list(MIXED_WEIGHTS.values()))[0]
+        return getattr(self, kind)()
+
+    async def cleanup(self, client: Client) -> int:
+        """Delete the customers and sales created by this run; returns how many were removed"""
+        removed = await self._cleanup_sales(client)
+        if not self.created:
+            return removed
+        found = _rows(_payload(await client.call_tool(
+            "sqlserver_crud", {"operation": "read", "name": f"Bench{self.run_id}", "limit": self.created + 10}
+        )))
+        ids = [{"customer_id": c["Id"]} for c in found if str(c.get("Name", "")).startswith(f"Bench{self.run_id} ")]
+        if ids:
+            await client.call_tool("sqlserver_crud", {"operation": "bulk_delete", "records": ids})
+        return removed + len(ids)
+
+    async def _new_sale_ids(self, client: Client) -> list:
+        filters = {"sale_id": {"gt": self.last_sale_id}, "quantity": BENCH_SALE_QUANTITY}
+        ids, cursor = [], None
+        while True:
+            args = {"operation": "read", "filter_conditions": filters, "page_size": 500}
+            if cursor:
+                args["cursor"] = cursor
+            response = _payload(await client.call_tool("sales_crud", args))
+            ids += [s["sale_id"] for s in _rows(response)]
+            cursor = response.get("next_cursor") if isinstance(response, dict) else None
+            if not cursor:
+                return ids
+
+    async def _cleanup_sales(self, client: Client) -> int:
+        if not self.sales_created:
+            return 0
+        # Sales are read from the MySQL mirror, which the sync worker fills shortly after the insert
+        deadline = time.monotonic() + CLEANUP_SYNC_WAIT_S
+        ids = await self._new_sale_ids(client)
+        while len(ids) < self.sales_created and time.monotonic() < deadline:
+            await asyncio.sleep(0.5)
+            ids = await self._new_sale_ids(client)
+        if ids:
+            await client.call_tool("sales_crud", {"operation": "bulk_delete", "records": [{"sale_id": i} for i in ids]})
+        return len(ids)
+
+
+# ————————————————
+# Runner and report
+# ————————————————
+def _percentile(sorted_values: list, pct: float) -> float:
+    if not sorted_values:
+        return 0.0
+    rank = max(0, min(len(sorted_values) - 1, round(pct / 100 * len(sorted_values) + 0.5) - 1))
+    return sorted_values[rank]
+
+
+def _latency_summary(latencies: list) -> dict:
+    values = sorted(latencies)
+    ms = lambda v: round(v * 1000, 3)
+    return {
+        "p50": ms(_percentile(values, 50)),
+        "p95": ms(_percentile(values, 95)),
+        "p99": ms(_percentile(values, 99)),
+        "mean": ms(sum(values) / len(values)) if values else 0.0,
+        "max": ms(values[-1]) if values else 0.0,
+    }
+
+
+async def run_scenario(client: Client, workload: Workload, scenario: str, concurrency: int, requests: int) -> dict:
+    """Issue `requests` tool calls from `concurrency` workers and summarise their latencies"""
+    calls = [workload.next_call(scenario) for _ in range(requests)]
+    latencies, by_tool, errors = [], {}, 0
+    next_index = 0
+
+    async def worker():
+        nonlocal next_index, errors
+        while next_index < len(calls):
+            tool, args = calls[next_index]
+            next_index += 1
+            started = time.perf_counter()
+            try:
+                result = await client.call_tool(tool, args)
+                elapsed = time.perf_counter() - started
+                response = _payload(result)
+                failed = isinstance(response, dict) and isinstance(response.get("result"), str) \
+                    and response["result"].startswith("❌")
+            except ToolError:
+                elapsed = time.perf_counter() - started
+                failed = True
+            latencies.append(elapsed)
+            by_tool.setdefault(f"{tool}.{args['operation']}", []).append(elapsed)
+            errors += failed
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    duration = time.perf_counter() - started
+    return {
+        "scenario": scenario,
+        "concurrency": concurrency,
+        "ops": len(latencies),
+        "errors": errors,
+        "duration_s": round(duration, 3),
+        "ops_per_sec": round(len(latencies) / duration, 2) if duration else 0.0,
+        "latency_ms": _latency_summary(latencies),
+        "by_operation": {name: {"ops": len(v), "latency_ms": _latency_summary(v)} for name, v in sorted(by_tool.items())},
+    }
+
+
+def _git_commit() -> str | None:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True,
+            cwd=os.path.dirname(os.path.abspath(__file__)),
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+async def run_benchmark(args) -> dict:
+    server = load_server(args.backend, args.seed)
+    rng = random.Random(args.random_seed)
+    workload = Workload(run_id=f"{int(time.time())}{rng.randrange(1000):03d}", rng=rng)
+    scenarios = SCENARIOS if args.scenario == "all" else (args.scenario,)
+    concurrency_levels = [int(c) for c in args.concurrency.split(",") if c.strip()]
+
+    results = []
+    async with Client(server) as client:
+        await workload.discover(client)
+        for scenario in scenarios:
+            for concurrency in concurrency_levels:
+                if args.warmup:
+                    await run_scenario(client, workload, scenario, concurrency, args.warmup)
+                result = await run_scenario(client, workload, scenario, concurrency, args.requests)
+                print(f"{scenario:<22} c={concurrency:<4} {result['ops_per_sec']:>10.1f} ops/s  "
+                      f"p50 {result['latency_ms']['p50']:>8.2f} ms  p95 {result['latency_ms']['p95']:>8.2f} ms  "
+                      f"p99 {result['latency_ms']['p99']:>8.2f} ms  errors {result['errors']}", flush=True)
+                results.append(result)
+        cleaned = await workload.cleanup(client) if args.cleanup else 0
+
+    return {
+        "run": {
+            "started_at": datetime.now(timezone.utc).isoformat(),
+            "git_commit": _git_commit(),
+            "backend": args.backend,
+            "requests": args.requests,
+            "warmup": args.warmup,
+            "random_seed": args.random_seed,
+            "rows_cleaned_up": cleaned,
+        },
+        "results": results,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the CRUD MCP tools through FastMCP's in-process client")
+    parser.add_argument("--backend", choices=("live", "sqlite", "memory"), default="live",
+                        help="live: Server_Tools1 against the configured databases; "
+                             "sqlite: Server_Tools1 on the embedded SQLite backend; memory: in-memory stand-in")
+    parser.add_argument("--scenario", choices=SCENARIOS + ("all",), default="all")
+    parser.add_argument("--concurrency", default="1,8", help="comma-separated concurrency levels (default 1,8)")
+    parser.add_argument("--requests", type=int, default=500, help="tool calls per scenario and concurrency level")
+    parser.add_argument("--warmup", type=int, default=50, help="untimed calls before each measurement")
+    parser.add_argument("--random-seed", type=int, default=42)
+    parser.add_argument("--seed", action="store_true", help="migrate and seed the databases before benchmarking (live only)")
+    parser.add_argument("--no-cleanup", dest="cleanup", action="store_false",
+                        help="keep the customers and sales created by the creates/mixed scenarios")
+    parser.add_argument("--output", help="write the JSON report here (default: stdout)")
+    args = parser.parse_args()
+
+    report = asyncio.run(run_benchmark(args))
+    text = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(text + "\n")
+        print(f"Report written to {args.output}")
+    else:
+        print(text)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,13 +1,12 @@
-import os, re, json, ast, asyncio
-import pandas as pd
+import os, re, json, ast, time, asyncio, hashlib, importlib, threading, concurrent.futures
+
+_RUN_STARTED = time.perf_counter()
+
 import streamlit as st
 import base64
-from io import BytesIO
-from PIL import Image
-from langchain_groq import ChatGroq
-from langchain_core.messages import HumanMessage, SystemMessage
 from fastmcp import Client
 from fastmcp.client.transports import StreamableHttpTransport
+from fastmcp.exceptions import ToolError
 import streamlit.components.v1 as components
 import re
 from dotenv import load_dotenv
@@ -20,10 +19,65 @@ if not GROQ_API_KEY:
     st.error("🔐 GROQ_API_KEY environment variable is not set. Please add it to your environment.")
     st.stop()
 
-groq_client = ChatGroq(
-    groq_api_key=GROQ_API_KEY,
-    model_name=os.environ.get("GROQ_MODEL", "llama3-70b-8192")
-)
+GROQ_MODEL = os.environ.get("GROQ_MODEL", "llama3-70b-8192")
+
+
+# ========== PROCESS-WIDE CACHES & LAZY IMPORTS ==========
+# Streamlit re-executes this script on every interaction. Anything expensive
+# (the LLM client, static assets, discovered tool schemas) lives in
+# st.cache_resource / st.cache_data, and pandas / langchain are imported on
+# first use, so first paint and plain reruns stay fast. Timings are shown
+# in the sidebar debug panel.
+TOOLS_CACHE_TTL = float(os.environ.get("MCP_TOOLS_CACHE_TTL", "300"))
+
+
+@st.cache_resource(show_spinner=False)
+def client_stats() -> dict:
+    """Counters and timings shared by every session of this server process"""
+    return {
+        "imports_ms": {},
+        "tool_discovery": {"calls": 0, "last_ms": None},
+        "parser": {"fast_path": 0, "plan_cache": 0, "llm": 0},
+        "plan_cache": {"hits": 0, "misses": 0, "stored": 0},
+    }
+
+
+class LazyModule:
+    """Stands in for a module and imports it on first attribute access"""
+
+    def __init__(self, name: str):
+        self._name = name
+        self._module = None
+
+    def __getattr__(self, attr):
+        if self._module is None:
+            self._module = lazy_import(self._name)
+        return getattr(self._module, attr)
+
+
+def lazy_import(name: str):
+    """importlib.import_module, recording how long the first import in this process took"""
+    stats = client_stats()["imports_ms"]
+    started = time.perf_counter()
+    module = importlib.import_module(name)
+    if name not in stats:
+        stats[name] = round((time.perf_counter() - started) * 1000, 1)
+    return module
+
+
+pd = LazyModule("pandas")
+
+
+@st.cache_resource(show_spinner=False)
+def get_llm(model_name: str = GROQ_MODEL):
+    """One ChatGroq client per model for the whole process"""
+    ChatGroq = lazy_import("langchain_groq").ChatGroq
+    return ChatGroq(groq_api_key=GROQ_API_KEY, model_name=model_name)
+
+
+def chat_messages(system_prompt: str, user_prompt: str) -> list:
+    messages = lazy_import("langchain_core.messages")
+    return [messages.SystemMessage(content=system_prompt), messages.HumanMessage(content=user_prompt)]
 
 # ========== PAGE CONFIG ==========
 st.set_page_config(page_title="MCP CRUD Chat", layout="wide")
@@ -265,24 +319,121 @@ st.markdown("""
 """, unsafe_allow_html=True)
 
 
+# ========== PERSISTENT MCP SESSION ==========
+MCP_CALL_TIMEOUT = float(os.environ.get("MCP_CALL_TIMEOUT", "120"))
+# Tool operations that are safe to send twice (a dropped connection may have
+# hidden a request the server already executed)
+IDEMPOTENT_OPERATIONS = {"read", "describe", "aggregate"}
+
+
+class MCPSession:
+    """One long-lived MCP client session running on a background event loop.
+
+    Streamlit reruns the script on every interaction; instead of paying for a
+    new HTTP session per call, every rerun (and every browser session) in this
+    server process shares this object via st.cache_resource. If the session
+    drops, the next call reconnects; list_tools and read-only tool calls are
+    retried once, writes are not (they may already have been applied).
+    """
+
+    def __init__(self, server_url: str):
+        self.server_url = server_url
+        self._loop = asyncio.new_event_loop()
+        self._thread = threading.Thread(target=self._loop.run_forever, name="mcp-session", daemon=True)
+        self._thread.start()
+        self._connect_lock = None
+        self._client = None
+        self._owner = None
+        self._stop = None
+
+    async def _session_owner(self, ready: asyncio.Future, stop: asyncio.Event):
+        # The client context must be entered and exited by the same task
+        try:
+            transport = StreamableHttpTransport(f"{self.server_url}/mcp")
+            async with Client(transport) as client:
+                ready.set_result(client)
+                await stop.wait()
+        except Exception as e:
+            if not ready.done():
+                ready.set_exception(e)
+
+    async def _ensure_client(self):
+        if self._connect_lock is None:
+            self._connect_lock = asyncio.Lock()
+        async with self._connect_lock:
+            if self._client is None or self._owner is None or self._owner.done():
+                ready = self._loop.create_future()
+                self._stop = asyncio.Event()
+                self._owner = asyncio.create_task(self._session_owner(ready, self._stop))
+                self._client = await ready
+            return self._client
+
+    async def _reset(self, client):
+        async with self._connect_lock:
+            if client is not self._client:
+                return  # another caller already reconnected
+            self._client = None
+            self._stop.set()
+            try:
+                await self._owner
+            except Exception:
+                pass
+
+    async def _request(self, method: str, *args, retry: bool = True):
+        for attempt in range(2):
+            client = await self._ensure_client()
+            try:
+                return await getattr(client, method)(*args)
+            except ToolError:
+                raise  # the server answered; the session is fine
+            except Exception:
+                await self._reset(client)
+                if attempt or not retry:
+                    raise
+
+    def _run(self, method: str, *args, retry: bool = True):
+        future = asyncio.run_coroutine_threadsafe(self._request(method, *args, retry=retry), self._loop)
+        try:
+            return future.result(timeout=MCP_CALL_TIMEOUT)
+        except concurrent.futures.TimeoutError:
+            future.cancel()  # don't let a call reported as timed out complete later
+            raise
+
+    def list_tools(self):
+        return self._run("list_tools")
+
+    def call_tool(self, tool: str, payload: dict):
+        return self._run("call_tool", tool, payload, retry=payload.get("operation") in IDEMPOTENT_OPERATIONS)
+
+
+@st.cache_resource(show_spinner=False)
+def get_mcp_session(server_url: str) -> MCPSession:
+    return MCPSession(server_url)
+
+
 # ========== DYNAMIC TOOL DISCOVERY FUNCTIONS ==========
-async def _discover_tools() -> dict:
-    """Discover available tools from the MCP server"""
+@st.cache_data(ttl=TOOLS_CACHE_TTL, show_spinner=False)
+def discover_tool_schemas(server_url: str) -> dict:
+    """{tool name: description} from the MCP server, shared by all sessions for TOOLS_CACHE_TTL seconds"""
+    started = time.perf_counter()
+    tools = get_mcp_session(server_url).list_tools()
+    stats = client_stats()["tool_discovery"]
+    stats["calls"] += 1
+    stats["last_ms"] = round((time.perf_counter() - started) * 1000, 1)
+    return {tool.name: tool.description for tool in tools}
+
+
+def discover_tools(refresh: bool = False) -> dict:
+    """Discover available tools from the MCP server (cached; refresh=True asks the server again)"""
+    if refresh:
+        discover_tool_schemas.clear()
     try:
-        transport = StreamableHttpTransport(f"{st.session_state.get('MCP_SERVER_URL', 'http://localhost:8000')}/mcp")
-        async with Client(transport) as client:
-            tools = await client.list_tools()
-            return {tool.name: tool.description for tool in tools}
+        return discover_tool_schemas(st.session_state.get('MCP_SERVER_URL', 'http://localhost:8000'))
     except Exception as e:
         st.error(f"Failed to discover tools: {e}")
         return {}
 
 
-def discover_tools() -> dict:
-    """Synchronous wrapper for tool discovery"""
-    return asyncio.run(_discover_tools())
-
-
 def generate_tool_descriptions(tools_dict: dict) -> str:
     """Generate tool descriptions string from discovered tools"""
     if not tools_dict:
@@ -295,13 +446,11 @@ def generate_tool_descriptions(tools_dict: dict) -> str:
     return "\n".join(descriptions)
 
 
+@st.cache_data(show_spinner=False)
 def get_image_base64(img_path):
-    img = Image.open(img_path)
-    buffered = BytesIO()
-    img.save(buffered, format="PNG")
-    img_bytes = buffered.getvalue()
-    img_base64 = base64.b64encode(img_bytes).decode()
-    return img_base64
+    # PNG bytes are embedded as-is; no need to decode and re-encode them
+    with open(img_path, "rb") as fh:
+        return base64.b64encode(fh.read()).decode()
 
 
 # ========== SIDEBAR NAVIGATION ==========
@@ -445,7 +594,16 @@ if "chat_input_box" not in st.session_state:
     st.session_state["chat_input_box"] = ""
 
 
+# Per-session timings for the debug panel (see render_debug_panel)
+if "timings" not in st.session_state:
+    st.session_state["timings"] = {"reruns": 0, "rerun_ms_total": 0.0}
+
+
 # ========== HELPER FUNCTIONS ==========
+def record_timing(name: str, started: float) -> None:
+    st.session_state["timings"][name] = round((time.perf_counter() - started) * 1000, 1)
+
+
 def _clean_json(raw: str) -> str:
     fences = re.findall(r"``````", raw, re.DOTALL)
     if fences:
@@ -455,6 +613,62 @@ def _clean_json(raw: str) -> str:
     return json_match.group(0).strip() if json_match else raw.strip()
 
 
+class DiskLRUCache:
+    """Small bounded on-disk JSON cache (one file per key, LRU by file mtime)"""
+
+    def __init__(self, directory: str, max_entries: int = 500):
+        self.directory = directory
+        self.max_entries = max_entries
+        os.makedirs(directory, exist_ok=True)
+
+    @staticmethod
+    def make_key(*parts) -> str:
+        blob = json.dumps(parts, sort_keys=True, default=str)
+        return hashlib.sha256(blob.encode("utf-8")).hexdigest()
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.directory, f"{key}.json")
+
+    def get(self, key: str):
+        path = self._path(key)
+        try:
+            with open(path, "r", encoding="utf-8") as fh:
+                value = json.load(fh)
+            os.utime(path)  # mark as recently used
+            return value
+        except (OSError, ValueError):
+            return None
+
+    def set(self, key: str, value) -> None:
+        path = self._path(key)
+        tmp_path = f"{path}.tmp"
+        try:
+            with open(tmp_path, "w", encoding="utf-8") as fh:
+                json.dump(value, fh, default=str)
+            os.replace(tmp_path, path)
+            self._evict()
+        except OSError:
+            pass
+
+    def _evict(self) -> None:
+        entries = [e for e in os.scandir(self.directory) if e.name.endswith(".json")]
+        if len(entries) <= self.max_entries:
+            return
+        entries.sort(key=lambda e: e.stat().st_mtime)
+        for entry in entries[:len(entries) - self.max_entries]:
+            try:
+                os.remove(entry.path)
+            except OSError:
+                pass
+
+
+# Optional persistent cache for LLM replies; disabled unless LLM_RESPONSE_CACHE_DIR is set
+LLM_RESPONSE_CACHE = (
+    DiskLRUCache(os.environ["LLM_RESPONSE_CACHE_DIR"], int(os.environ.get("LLM_RESPONSE_CACHE_MAX_ENTRIES", "500")))
+    if os.environ.get("LLM_RESPONSE_CACHE_DIR") else None
+)
+
+
 # ========== PARAMETER VALIDATION FUNCTION ==========
 def validate_and_clean_parameters(tool_name: str, args: dict) -> dict:
     """Validate and clean parameters for specific tools"""
@@ -469,7 +683,12 @@ def validate_and_clean_parameters(tool_name: str, args: dict) -> dict:
             'columns',  # Column selection
             'where_clause',  # WHERE conditions
             'filter_conditions',  # Structured filters
-            'limit'  # Row limit
+            'limit',  # Row limit
+            'records',  # Bulk operations
+            'cursor',  # Keyset pagination cursor
+            'page_size',  # Rows per page
+            'group_by',  # Aggregate dimensions
+            'metrics'  # Aggregate metrics
         }
 
         # Clean args to only include allowed parameters
@@ -500,6 +719,11 @@ def validate_and_clean_parameters(tool_name: str, args: dict) -> dict:
             if not isinstance(cleaned_args['where_clause'], str) or not cleaned_args['where_clause'].strip():
                 cleaned_args.pop('where_clause', None)
 
+        # Validate structured filters
+        if 'filter_conditions' in cleaned_args:
+            if not isinstance(cleaned_args['filter_conditions'], dict) or not cleaned_args['filter_conditions']:
+                cleaned_args.pop('filter_conditions', None)
+
         # Validate limit
         if 'limit' in cleaned_args:
             try:
@@ -516,14 +740,14 @@ def validate_and_clean_parameters(tool_name: str, args: dict) -> dict:
     elif tool_name == "sqlserver_crud":
         allowed_params = {
             'operation', 'name', 'email', 'limit', 'customer_id',
-            'new_email', 'table_name'
+            'new_email', 'table_name', 'records'
         }
         return {k: v for k, v in args.items() if k in allowed_params}
 
     elif tool_name == "postgresql_crud":
         allowed_params = {
             'operation', 'name', 'price', 'description', 'limit',
-            'product_id', 'new_price', 'table_name'
+            'product_id', 'new_price', 'table_name', 'records'
         }
         return {k: v for k, v in args.items() if k in allowed_params}
 
@@ -560,11 +784,8 @@ def generate_llm_response(operation_result: dict, action: str, tool: str, user_q
     """
 
     try:
-        messages = [
-            SystemMessage(content=system_prompt),
-            HumanMessage(content=user_prompt)
-        ]
-        response = groq_client.invoke(messages)
+        messages = chat_messages(system_prompt, user_prompt)
+        response = get_llm().invoke(messages)
         return response.content.strip()
     except Exception as e:
         # Fallback response if LLM call fails
@@ -582,12 +803,126 @@ def generate_llm_response(operation_result: dict, action: str, tool: str, user_q
             return f"Operation completed successfully using {tool}."
 
 
+def cached_llm_response(operation_result: dict, action: str, tool: str, user_query: str) -> str:
+    """generate_llm_response, served from the on-disk cache when one is configured"""
+    if LLM_RESPONSE_CACHE is None:
+        return generate_llm_response(operation_result, action, tool, user_query)
+    key = DiskLRUCache.make_key("llm_response", operation_result, action, tool, user_query)
+    cached = LLM_RESPONSE_CACHE.get(key)
+    if isinstance(cached, str):
+        return cached
+    response = generate_llm_response(operation_result, action, tool, user_query)
+    LLM_RESPONSE_CACHE.set(key, response)
+    return response
+
+
+# Table reads ask for result_format="columnar" ({columns, types, data}): column
+# names travel once and the DataFrame is built from the column arrays directly
+COLUMNAR_RESULTS = os.getenv("MCP_COLUMNAR_RESULTS", "true").lower() in ("1", "true", "yes")
+
+
+def is_columnar_result(result) -> bool:
+    return isinstance(result, dict) and "columns" in result and "data" in result
+
+
+def is_table_result(result) -> bool:
+    return isinstance(result, list) or is_columnar_result(result)
+
+
+def result_to_dataframe(result) -> "pd.DataFrame":
+    """DataFrame from a tool result in either encoding (columnar or a list of row dicts)"""
+    if not is_columnar_result(result):
+        return pd.DataFrame(result)
+    df = pd.DataFrame(dict(zip(result["columns"], result["data"])), columns=result["columns"])
+    for column, kind in zip(result["columns"], result.get("types", [])):
+        if kind in ("datetime", "date"):
+            df[column] = pd.to_datetime(df[column], format="ISO8601")
+    return df
+
+
+def read_args(args: dict) -> dict:
+    """Arguments for a table read, requesting the columnar encoding when enabled"""
+    return {**args, "result_format": "columnar"} if COLUMNAR_RESULTS else dict(args)
+
+
+def fetch_table_snapshot(tool: str) -> dict:
+    """Read the table behind `tool` once so the post-write view can be replayed on rerun"""
+    try:
+        updated_table = call_mcp_tool(tool, "read", read_args({}))
+    except Exception as fetch_err:
+        return {"error": str(fetch_err)}
+    if isinstance(updated_table, dict) and "result" in updated_table:
+        return {"result": updated_table["result"]}
+    return {"result": None}
+
+
+def ensure_message_artifacts(msg: dict) -> dict:
+    """Compute the NL reply and post-write snapshot for a sql_crud message exactly once.
+
+    The values are stored on the message itself, so later Streamlit reruns only
+    replay them instead of calling Groq / the MCP server again.
+    """
+    content = msg["content"]
+    action = msg.get("action", "")
+    tool = msg.get("tool", "")
+    if "llm_response" not in msg:
+        msg["llm_response"] = cached_llm_response(content, action, tool, msg.get("user_query", ""))
+    if action in {"create", "update", "delete"} and "table_snapshot" not in msg:
+        msg["table_snapshot"] = fetch_table_snapshot(tool)
+    return msg
+
+
+def load_more_rows(msg: dict) -> None:
+    """Fetch the next keyset page of a paginated read and append it to the message"""
+    content = msg["content"]
+    args = {k: v for k, v in (msg.get("args") or {}).items() if k != "cursor"}
+    page = call_mcp_tool(msg.get("tool"), "read", {**args, "cursor": content["next_cursor"]})
+    result = page.get("result") if isinstance(page, dict) else None
+    if is_columnar_result(content["result"]) and is_columnar_result(result):
+        for values, more in zip(content["result"]["data"], result["data"]):
+            values.extend(more)
+        content["next_cursor"] = page.get("next_cursor")
+    elif isinstance(content["result"], list) and isinstance(result, list):
+        content["result"].extend(result)
+        content["next_cursor"] = page.get("next_cursor")
+    else:
+        content["next_cursor"] = None
+        st.error(f"Could not load more rows: {page.get('result') if isinstance(page, dict) else page}")
+
+
 def parse_user_query(query: str, available_tools: dict) -> dict:
     """Enhanced parse user query with display format detection"""
 
     if not available_tools:
         return {"error": "No tools available"}
 
+    parser = client_stats()["parser"]
+    # Common command shapes are parsed locally; only the rest costs an LLM call
+    plan = fast_path_plan(query, available_tools) if FAST_PATH_PARSER else None
+    if plan:
+        parser["fast_path"] += 1
+        return plan
+
+    template, slots = plan_template(query) if PLAN_CACHE is not None else (None, None)
+    if template is not None:
+        plan = cached_plan(template, slots, available_tools)
+        if plan:
+            parser["plan_cache"] += 1
+            return plan
+
+    parser["llm"] += 1
+    plan = llm_parse_user_query(query, available_tools)
+    args = plan.get("args")
+    if isinstance(args, dict):
+        remember_entity_names(args.get(k) for k in ("name", "customer_name", "product_name"))
+    if template is not None:
+        store_plan(template, slots, plan, available_tools)
+    return plan
+
+
+def llm_parse_user_query(query: str, available_tools: dict) -> dict:
+    """Parse a user query into {tool, action, args} with the LLM"""
+
     # Build comprehensive tool information for the LLM
     tool_info = []
     for tool_name, tool_desc in available_tools.items():
@@ -607,7 +942,8 @@ def parse_user_query(query: str, available_tools: dict) -> dict:
         "- 'create': for adding, inserting, or creating NEW records\n"
         "- 'update': for modifying, changing, or updating existing records\n"
         "- 'delete': for removing, deleting, or destroying records\n"
-        "- 'describe': for showing table structure, schema, or column information\n\n"
+        "- 'describe': for showing table structure, schema, or column information\n"
+        "- 'aggregate': (sales_crud only) totals, counts or averages per customer, product, day, week or month\n\n"
 
         "CRITICAL TOOL SELECTION RULES:\n"
         "\n"
@@ -636,6 +972,13 @@ def parse_user_query(query: str, available_tools: dict) -> dict:
         "   - Any query asking for combined data from multiple tables\n"
         "   - ETL formatting queries with display_format parameter\n"
         "\n"
+        "SALES AGGREGATES (action 'aggregate' on sales_crud):\n"
+        "- group_by: comma-separated customer, product, day, week, month\n"
+        "- metrics: comma-separated total_revenue, sale_count, total_quantity, avg_quantity, avg_total_price, min_total_price, max_total_price\n"
+        "- 'revenue per customer' → {\"tool\": \"sales_crud\", \"action\": \"aggregate\", \"args\": {\"group_by\": \"customer\", \"metrics\": \"total_revenue\"}}\n"
+        "- 'daily sales count for Widget' → {\"tool\": \"sales_crud\", \"action\": \"aggregate\", \"args\": {\"group_by\": \"day\", \"metrics\": \"sale_count\", \"where_clause\": \"product_name = 'Widget'\"}}\n"
+        "- Date ranges and ID lists go in 'filter_conditions', e.g. {\"sale_date\": {\"gte\": \"2024-01-01\", \"lt\": \"2024-02-01\"}}\n"
+        "\n"
         "ENHANCED DISPLAY FORMAT DETECTION (CRITICAL FOR SALES_CRUD):\n"
         "\n"
         "For sales_crud queries, detect display_format from these EXACT patterns:\n"
@@ -758,11 +1101,8 @@ DISPLAY FORMAT DETECTION (CRITICAL):
 Respond with the exact JSON format with properly extracted parameters."""
 
     try:
-        messages = [
-            SystemMessage(content=system_prompt),
-            HumanMessage(content=user_prompt)
-        ]
-        resp = groq_client.invoke(messages)
+        messages = chat_messages(system_prompt, user_prompt)
+        resp = get_llm().invoke(messages)
 
         raw = _clean_json(resp.content)
 
@@ -1025,6 +1365,10 @@ Respond with the exact JSON format with properly extracted parameters."""
         "- 'sales by Alice Johnson' → {\"where_clause\": \"customer_name = 'Alice Johnson'\"}\n"
         "- 'sales for product Widget' → {\"where_clause\": \"product_name = 'Widget'\"}\n"
         "\n"
+        "For date ranges and ID lists use structured 'filter_conditions' instead (operators: eq, ne, gt, gte, lt, lte, in, between, prefix, contains, is_null):\n"
+        "- 'sales in January 2024' → {\"filter_conditions\": {\"sale_date\": {\"gte\": \"2024-01-01\", \"lt\": \"2024-02-01\"}}}\n"
+        "- 'sales 1, 4 and 7' → {\"filter_conditions\": {\"sale_id\": {\"in\": [1, 4, 7]}}}\n"
+        "\n"
         "CUSTOMER CREATE PATTERNS (Enhanced):\n"
         "- 'create customer [FirstName LastName] with [email]'\n"
         "- 'add customer [FirstName LastName] with email [email]'\n"
@@ -1099,11 +1443,8 @@ WHERE CLAUSE EXTRACTION GUIDELINES:
 Respond with the exact JSON format with properly extracted parameters."""
 
     try:
-        messages = [
-            SystemMessage(content=system_prompt),
-            HumanMessage(content=user_prompt)
-        ]
-        resp = groq_client.invoke(messages)
+        messages = chat_messages(system_prompt, user_prompt)
+        resp = get_llm().invoke(messages)
 
         raw = _clean_json(resp.content)
 
@@ -1339,11 +1680,7 @@ Respond with the exact JSON format with properly extracted parameters."""
         }
 
 
-async def _invoke_tool(tool: str, action: str, args: dict) -> any:
-    transport = StreamableHttpTransport(f"{st.session_state['MCP_SERVER_URL']}/mcp")
-    async with Client(transport) as client:
-        payload = {"operation": action, **{k: v for k, v in args.items() if k != "operation"}}
-        res_obj = await client.call_tool(tool, payload)
+def _decode_tool_result(res_obj) -> any:
     if res_obj.structured_content is not None:
         return res_obj.structured_content
     text = "".join(b.text for b in res_obj.content).strip()
@@ -1356,7 +1693,9 @@ async def _invoke_tool(tool: str, action: str, args: dict) -> any:
 
 
 def call_mcp_tool(tool: str, action: str, args: dict) -> any:
-    return asyncio.run(_invoke_tool(tool, action, args))
+    payload = {"operation": action, **{k: v for k, v in args.items() if k != "operation"}}
+    res_obj = get_mcp_session(st.session_state['MCP_SERVER_URL']).call_tool(tool, payload)
+    return _decode_tool_result(res_obj)
 
 
 def format_natural(data) -> str:
@@ -1439,7 +1778,302 @@ def extract_price(text):
     return None
 
 
-def generate_table_description(df: pd.DataFrame, content: dict, action: str, tool: str) -> str:
+# ========== FAST-PATH INTENT PARSER ==========
+# Common command shapes ("list products", "delete customer Alice",
+# "update price of Tool to 30") are routed locally, without a Groq round
+# trip. Every rule is anchored to the whole (normalized) query, so only
+# unambiguous phrasings take the fast path; everything else still goes
+# to the LLM. Set FAST_PATH_PARSER=false to always use the LLM.
+FAST_PATH_PARSER = os.getenv("FAST_PATH_PARSER", "true").lower() in ("1", "true", "yes")
+
+_FP_NAME = r"([a-z][\w'.-]*(?: [a-z][\w'.-]*){0,2}?)"
+_FP_NUMBER = r"\$?(\d+(?:\.\d+)?)(?: dollars?)?"
+_FP_EMAIL = r"([\w.+-]+@[\w-]+(?:\.[\w-]+)+)"
+_FP_READ = r"(?:list|show|display|view|get|see|fetch)(?: me)?(?: all| the| all the)?"
+_FP_ENTITY_TOOLS = {
+    "customer": ("sqlserver_crud", "Customers"),
+    "client": ("sqlserver_crud", "Customers"),
+    "product": ("postgresql_crud", "products"),
+    "item": ("postgresql_crud", "products"),
+    "sale": ("sales_crud", None),
+    "transaction": ("sales_crud", None),
+}
+_FP_ENTITY = r"(customer|client|product|item|sale|transaction)s?"
+_FP_COMPARISONS = {
+    "above": ">", "over": ">", "greater than": ">", "more than": ">", "exceeding": ">",
+    "below": "<", "under": "<", "less than": "<",
+}
+_FP_COMPARISON = "(" + "|".join(_FP_COMPARISONS) + ")"
+
+
+def _fp_read(m, query):
+    tool, _ = _FP_ENTITY_TOOLS[m.group(1)]
+    return tool, "read", {}
+
+
+def _fp_describe(m, query):
+    tool, table = _FP_ENTITY_TOOLS[m.group(1)]
+    return (tool, "describe", {"table_name": table}) if table else None
+
+
+def _fp_sales_total_filter(m, query):
+    return "sales_crud", "read", {"where_clause": f"total_price {_FP_COMPARISONS[m.group(1)]} {m.group(2)}"}
+
+
+def _fp_delete(m, query):
+    tool, _ = _FP_ENTITY_TOOLS[m.group(1)]
+    if tool == "sales_crud":
+        return None  # sales are deleted by id
+    return tool, "delete", {"name": _fp_original(query, m.start(2), m.end(2))}
+
+
+def _fp_update_price(m, query):
+    new_price = extract_price(query)
+    if new_price is None:
+        return None
+    return "postgresql_crud", "update", {"name": _fp_original(query, m.start(1), m.end(1)), "new_price": new_price}
+
+
+def _fp_update_email(m, query):
+    new_email = extract_email(query)
+    if not new_email:
+        return None
+    return "sqlserver_crud", "update", {"name": _fp_original(query, m.start(1), m.end(1)), "new_email": new_email}
+
+
+def _fp_create_customer(m, query):
+    email = extract_email(query)
+    if not email:
+        return None
+    return "sqlserver_crud", "create", {"name": _fp_original(query, m.start(1), m.end(1)), "email": email}
+
+
+def _fp_create_product(m, query):
+    return "postgresql_crud", "create", {"name": _fp_original(query, m.start(1), m.end(1)), "price": float(m.group(2))}
+
+
+# (pattern over the normalized query, builder -> (tool, action, args) or None)
+FAST_PATH_RULES = [
+    (re.compile(rf"{_FP_READ} {_FP_ENTITY}"), _fp_read),
+    (re.compile(rf"(?:all )?{_FP_ENTITY}"), _fp_read),
+    (re.compile(rf"describe(?: the)? {_FP_ENTITY}(?: table)?"), _fp_describe),
+    (re.compile(rf"(?:show|display)(?: the)? (?:schema|structure|columns) (?:of|for)(?: the)? {_FP_ENTITY}(?: table)?"),
+     _fp_describe),
+    (re.compile(rf"(?:{_FP_READ} )?sales(?: with| where)?(?: total(?: price| amount)?)? {_FP_COMPARISON} {_FP_NUMBER}"),
+     _fp_sales_total_filter),
+    (re.compile(rf"(?:delete|remove) {_FP_ENTITY} {_FP_NAME}"), _fp_delete),
+    (re.compile(rf"(?:update|change|set)(?: the)? price of(?: product)? {_FP_NAME} to {_FP_NUMBER}"), _fp_update_price),
+    (re.compile(rf"(?:update|change|set)(?: the)? email of(?: customer)? {_FP_NAME} to {_FP_EMAIL}"), _fp_update_email),
+    (re.compile(rf"(?:add|create)(?: a)?(?: new)? customer {_FP_NAME}(?: with email)? {_FP_EMAIL}"), _fp_create_customer),
+    (re.compile(rf"(?:add|create)(?: a)?(?: new)? product {_FP_NAME} (?:with price|priced at|at|for) {_FP_NUMBER}"),
+     _fp_create_product),
+]
+
+
+def _fp_normalize(query: str) -> tuple[str, str]:
+    """(lower-cased query for matching, the same text with original casing); spacing and trailing punctuation removed"""
+    text = re.sub(r"\s+", " ", query).strip()
+    text = re.sub(r"^(?:please|can you|could you)\s+|\s+please$|[?.!]+$", "", text, flags=re.IGNORECASE).strip()
+    return text.lower(), text
+
+
+def _fp_original(query: str, start: int, end: int) -> str:
+    """Span of the normalized query with the user's casing (names go to the server as typed)"""
+    return _fp_normalize(query)[1][start:end]
+
+
+def fast_path_plan(query: str, available_tools: dict) -> dict | None:
+    """{tool, action, args} for a high-confidence command shape, or None to use the LLM"""
+    text, _ = _fp_normalize(query)
+    for pattern, build in FAST_PATH_RULES:
+        m = pattern.fullmatch(text)
+        if not m:
+            continue
+        plan = build(m, query)
+        if plan is None or plan[0] not in available_tools:
+            return None
+        tool, action, args = plan
+        return {"tool": tool, "action": action, "args": validate_and_clean_parameters(tool, args), "parser": "fast_path"}
+    return None
+
+
+# ========== TEMPLATE PLAN CACHE ==========
+# Queries that differ only in their literals ("show sales above 50" /
+# "show sales above 80") share one LLM plan. The query is reduced to a
+# template with emails, dates, known entity names and numbers replaced by slots,
+# the LLM's plan is stored per template with those literals replaced by
+# slot markers, and a later query with the same template gets the plan
+# back with its own literals bound in. Entries live on disk (DiskLRUCache),
+# so they survive restarts; set PLAN_CACHE_DIR="" to disable.
+PLAN_CACHE_DIR = os.getenv("PLAN_CACHE_DIR", ".mcp_plan_cache")
+PLAN_CACHE = (
+    DiskLRUCache(PLAN_CACHE_DIR, int(os.getenv("PLAN_CACHE_MAX_ENTRIES", "1000")))
+    if PLAN_CACHE_DIR else None
+)
+ENTITY_NAMES_KEY = DiskLRUCache.make_key("entity_names")
+MAX_ENTITY_NAMES = 2000
+
+_PLAN_NUMBER = r"(?<![\w.])\d+(?:\.\d+)?(?!\w)"
+_PLAN_DATE = re.compile(r"(\d{4}-\d{2}-\d{2}(?:[ T]\d{2}:\d{2}(?::\d{2})?)?)")
+_PLAN_MARKER = re.compile(r"<<(\w+)>>")
+
+
+@st.cache_resource(show_spinner=False)
+def known_entity_names() -> dict:
+    """Customer/product names seen so far (process-wide, persisted with the plan cache)"""
+    names = PLAN_CACHE.get(ENTITY_NAMES_KEY) if PLAN_CACHE is not None else None
+    return {"names": set(names or []), "pattern": None}
+
+
+def remember_entity_names(names) -> None:
+    """Add names (from name lookups or LLM plans) so later queries can slot them"""
+    known = known_entity_names()
+    new = {
+        n.strip() for n in names
+        if isinstance(n, str) and len(n.strip()) >= 3 and not re.fullmatch(_FP_ENTITY, n.strip().lower())
+    } - known["names"]
+    if not new or len(known["names"]) >= MAX_ENTITY_NAMES:
+        return
+    known["names"] |= new
+    known["pattern"] = None
+    if PLAN_CACHE is not None:
+        PLAN_CACHE.set(ENTITY_NAMES_KEY, sorted(known["names"]))
+
+
+def _entity_name_pattern():
+    known = known_entity_names()
+    if known["pattern"] is None and known["names"]:
+        # Longest first, so "John Doe" wins over "John"
+        alternatives = "|".join(re.escape(n) for n in sorted(known["names"], key=len, reverse=True))
+        known["pattern"] = re.compile(rf"(?<!\w)(?:{alternatives})(?!\w)", re.IGNORECASE)
+    return known["pattern"]
+
+
+def plan_template(query: str) -> tuple[str, dict]:
+    """(template, {slot: literal}) with emails, dates, known names and numbers abstracted"""
+    _, text = _fp_normalize(query)
+    slots = {}
+
+    def slot(kind):
+        def replace(m):
+            name = f"{kind}{sum(s.startswith(kind) for s in slots)}"
+            slots[name] = m.group(0)
+            return f"<{name}>"
+        return replace
+
+    text = re.sub(_FP_EMAIL, slot("email"), text)
+    text = _PLAN_DATE.sub(slot("date"), text)
+    names = _entity_name_pattern()
+    if names is not None:
+        text = names.sub(slot("name"), text)
+    text = re.sub(_PLAN_NUMBER, slot("num"), text)
+    return text.lower(), slots
+
+
+def _slot_pattern(slot: str, literal: str):
+    if slot.startswith("num"):
+        return re.compile(rf"(?<![\w.]){re.escape(literal)}(?!\w|\.\d)")
+    return re.compile(rf"(?<!\w){re.escape(literal)}(?!\w)", re.IGNORECASE)
+
+
+def _plan_skeleton(value, slots: dict, used: set):
+    """value with slot literals replaced by markers; slots found are added to used"""
+    if isinstance(value, dict):
+        return {k: _plan_skeleton(v, slots, used) for k, v in value.items()}
+    if isinstance(value, list):
+        return [_plan_skeleton(v, slots, used) for v in value]
+    if isinstance(value, (int, float)) and not isinstance(value, bool):
+        for slot, literal in slots.items():
+            if slot.startswith("num") and float(literal) == value:
+                used.add(slot)
+                return {"$slot": slot, "as": type(value).__name__}
+        return value
+    if isinstance(value, str):
+        for slot, literal in slots.items():
+            if value.strip().lower() == literal.lower():
+                used.add(slot)
+                return {"$slot": slot, "as": "str"}
+        # Odd parts are dates: only a date slot may stand for one, and only as a
+        # whole ("2024" in "2024-01-01" was derived from the query, not copied)
+        parts = _PLAN_DATE.split(value)
+        for i, part in enumerate(parts):
+            for slot, literal in slots.items():
+                if i % 2 != slot.startswith("date"):
+                    continue
+                part, count = _slot_pattern(slot, literal).subn(f"<<{slot}>>", part)
+                if count:
+                    used.add(slot)
+            parts[i] = part
+        return "".join(parts)
+    return value
+
+
+def _unbound_literals(value) -> bool:
+    """True if a skeleton still holds a number or date that no slot stands for"""
+    if isinstance(value, dict):
+        return "$slot" not in value and any(_unbound_literals(v) for v in value.values())
+    if isinstance(value, list):
+        return any(_unbound_literals(v) for v in value)
+    if isinstance(value, (int, float)) and not isinstance(value, bool):
+        return True
+    if isinstance(value, str):
+        return re.search(r"\d", _PLAN_MARKER.sub("", value)) is not None
+    return False
+
+
+def _bind_plan(value, slots: dict):
+    """Inverse of _plan_skeleton for this query's literals"""
+    if isinstance(value, dict):
+        if "$slot" in value:
+            literal = slots[value["$slot"]]
+            if value["as"] == "str":
+                return literal
+            number = float(literal)
+            return int(number) if value["as"] == "int" and number.is_integer() else number
+        return {k: _bind_plan(v, slots) for k, v in value.items()}
+    if isinstance(value, list):
+        return [_bind_plan(v, slots) for v in value]
+    if isinstance(value, str):
+        return _PLAN_MARKER.sub(lambda m: slots[m.group(1)], value)
+    return value
+
+
+def _plan_cache_key(template: str, available_tools: dict) -> str:
+    return DiskLRUCache.make_key("plan", GROQ_MODEL, sorted(available_tools), template)
+
+
+def cached_plan(template: str, slots: dict, available_tools: dict) -> dict | None:
+    """The stored plan for template with this query's literals bound in, or None"""
+    stats = client_stats()["plan_cache"]
+    entry = PLAN_CACHE.get(_plan_cache_key(template, available_tools))
+    if not isinstance(entry, dict) or set(entry.get("slots", [])) != set(slots):
+        stats["misses"] += 1
+        return None
+    stats["hits"] += 1
+    return {**_bind_plan(entry["plan"], slots), "parser": "plan_cache"}
+
+
+def store_plan(template: str, slots: dict, plan: dict, available_tools: dict) -> None:
+    """Cache an LLM plan under its template, if it is built from the slots and nothing else"""
+    if plan.get("error") or plan.get("tool") not in available_tools or not plan.get("action"):
+        return
+    # Equal literals (e.g. two 50s) cannot be told apart when binding
+    if len({v.lower() for v in slots.values()}) != len(slots):
+        return
+    used = set()
+    skeleton = _plan_skeleton(plan, slots, used)
+    if used != set(slots):
+        # Some literal shaped the plan in a way we cannot re-bind (e.g. "50k" -> 50000)
+        return
+    if _unbound_literals(skeleton):
+        # A number or date the LLM derived ("in 2024" -> lt 2025-01-01) or added
+        # (a default limit) would be replayed unchanged for other literals
+        return
+    PLAN_CACHE.set(_plan_cache_key(template, available_tools), {"slots": sorted(slots), "plan": skeleton})
+    client_stats()["plan_cache"]["stored"] += 1
+
+
+def generate_table_description(df: "pd.DataFrame", content: dict, action: str, tool: str) -> str:
     """Generate LLM-based table description from JSON response data"""
 
     # Sample first few rows for context (don't send all data to LLM)
@@ -1471,11 +2105,8 @@ def generate_table_description(df: pd.DataFrame, content: dict, action: str, too
     """
 
     try:
-        messages = [
-            SystemMessage(content=system_prompt),
-            HumanMessage(content=user_prompt)
-        ]
-        response = groq_client.invoke(messages)
+        messages = chat_messages(system_prompt, user_prompt)
+        response = get_llm().invoke(messages)
         return response.content.strip()
     except Exception as e:
         return f"Retrieved {len(df)} records from the database."
@@ -1489,7 +2120,7 @@ if application == "MCP Application":
     MCP_SERVER_URL = os.getenv("MCP_SERVER_URL", "http://localhost:8000")
     st.session_state["MCP_SERVER_URL"] = MCP_SERVER_URL
 
-    # Discover tools dynamically if not already done
+    # Discover tools dynamically if not already done (served from the process-wide cache)
     if not st.session_state.available_tools:
         with st.spinner("Discovering available tools..."):
             discovered_tools = discover_tools()
@@ -1518,7 +2149,7 @@ if application == "MCP Application":
             with st.spinner("Refreshing tools..."):
                 MCP_SERVER_URL = os.getenv("MCP_SERVER_URL", "http://localhost:8000")
                 st.session_state["MCP_SERVER_URL"] = MCP_SERVER_URL
-                discovered_tools = discover_tools()
+                discovered_tools = discover_tools(refresh=True)
                 st.session_state.available_tools = discovered_tools
                 st.session_state.tool_states = {tool: True for tool in discovered_tools.keys()}
                 st.rerun()
@@ -1526,7 +2157,7 @@ if application == "MCP Application":
 
     # ========== 1. RENDER CHAT MESSAGES ==========
     st.markdown('<div class="stChatPaddingBottom">', unsafe_allow_html=True)
-    for msg in st.session_state.messages:
+    for msg_index, msg in enumerate(st.session_state.messages):
         if msg["role"] == "user":
             st.markdown(
                 f"""
@@ -1595,8 +2226,8 @@ if application == "MCP Application":
                 else:
                     st.code(content["result"])
 
-            # Generate LLM response for the operation
-            llm_response = generate_llm_response(content, action, tool, user_query)
+            # LLM response is computed once when the message is created (older messages: on first render)
+            llm_response = ensure_message_artifacts(msg)["llm_response"]
 
             st.markdown(
                 f"""
@@ -1615,20 +2246,20 @@ if application == "MCP Application":
                     st.error(result_msg)
                 else:
                     st.info(result_msg)
-                try:
-                    st.markdown("#### Here's the updated table after your operation:")
-                    read_tool = tool
-                    read_args = {}
-                    updated_table = call_mcp_tool(read_tool, "read", read_args)
-                    if isinstance(updated_table, dict) and "result" in updated_table:
-                        updated_df = pd.DataFrame(updated_table["result"])
-                        st.table(updated_df)
-                except Exception as fetch_err:
-                    st.info(f"Could not retrieve updated table: {fetch_err}")
-
-            if action == "read" and isinstance(content["result"], list):
+                st.markdown("#### Here's the updated table after your operation:")
+                snapshot = msg["table_snapshot"]
+                if "error" in snapshot:
+                    st.info(f"Could not retrieve updated table: {snapshot['error']}")
+                elif snapshot.get("result") is not None:
+                    updated_df = result_to_dataframe(snapshot["result"])
+                    st.table(updated_df)
+
+            if action == "aggregate" and is_table_result(content["result"]):
+                st.markdown("#### Summary:")
+                st.table(result_to_dataframe(content["result"]))
+            elif action == "read" and is_table_result(content["result"]):
                 st.markdown("#### Here's the current table:")
-                df = pd.DataFrame(content["result"])
+                df = result_to_dataframe(content["result"])
                 st.table(df)
                 # Check if this is ETL formatted data by looking for specific formatting
                 if tool == "sales_crud" and len(df.columns) > 0:
@@ -1654,6 +2285,11 @@ if application == "MCP Application":
                     )
                 else:
                     st.markdown(f"The table contains {len(df)} records.")
+                if content.get("next_cursor"):
+                    if st.button("⬇️ Load more", key=f"load_more_{msg_index}", help="Fetch the next page of rows"):
+                        with st.spinner("Loading more rows..."):
+                            load_more_rows(msg)
+                        st.rerun()
             elif action == "describe" and isinstance(content['result'], list):
                 st.markdown("#### Table Schema: ")
                 df = pd.DataFrame(content['result'])
@@ -1725,7 +2361,9 @@ if application == "MCP Application":
             if not enabled_tools:
                 raise Exception("No tools are enabled. Please enable at least one tool in the menu.")
 
+            parse_started = time.perf_counter()
             p = parse_user_query(user_query, st.session_state.available_tools)
+            record_timing("last_parse_ms", parse_started)
             tool = p.get("tool")
             if tool not in enabled_tools:
                 raise Exception(f"Tool '{tool}' is disabled. Please enable it in the menu.")
@@ -1753,6 +2391,7 @@ if application == "MCP Application":
                         read_result = call_mcp_tool(tool, "read", {})
                         if isinstance(read_result, dict) and "result" in read_result:
                             customers = read_result["result"]
+                            remember_entity_names(c.get("Name") for c in customers)
                             # Try exact match first
                             exact_matches = [c for c in customers if c.get("Name", "").lower() == name_to_find.lower()]
                             if exact_matches:
@@ -1789,6 +2428,7 @@ if application == "MCP Application":
                         read_result = call_mcp_tool(tool, "read", {})
                         if isinstance(read_result, dict) and "result" in read_result:
                             products = read_result["result"]
+                            remember_entity_names(p.get("name") for p in products)
                             # Try exact match first
                             exact_matches = [p for p in products if p.get("name", "").lower() == name_to_find.lower()]
                             if exact_matches:
@@ -1813,6 +2453,10 @@ if application == "MCP Application":
                     if possible_price is not None:
                         args['new_price'] = possible_price
 
+            # Table reads come back column-oriented (see result_to_dataframe)
+            if action in ("read", "aggregate"):
+                args = read_args(args)
+
             # Update the parsed args
             p["args"] = args
 
@@ -1823,7 +2467,9 @@ if application == "MCP Application":
                 if tool == "postgresql_crud" and args["table_name"].lower() in ["product", "product table"]:
                     args["table_name"] = "products"
 
+            call_started = time.perf_counter()
             raw = call_mcp_tool(p["tool"], p["action"], p.get("args", {}))
+            record_timing("last_tool_call_ms", call_started)
         except Exception as e:
             reply, fmt = f"⚠️ Error: {e}", "text"
             assistant_message = {
@@ -1859,6 +2505,8 @@ if application == "MCP Application":
                 "args": p.get("args"),
                 "user_query": user_query,  # Added user_query to the message
             }
+            if fmt == "sql_crud":
+                ensure_message_artifacts(assistant_message)
             st.session_state.messages.append(assistant_message)
         st.rerun()  # Rerun so chat output appears
 
@@ -1933,3 +2581,53 @@ with st.expander("🔧 Enhanced Features & Working Examples"):
     - **"change email of Bob to bob@new.com"** - Updates Bob's email
     """)
 
+
+# ========== DEBUG PANEL ==========
+def render_debug_panel() -> None:
+    """Sidebar panel with first paint / rerun times, lazy import costs and cache state"""
+    timings = st.session_state["timings"]
+    run_ms = round((time.perf_counter() - _RUN_STARTED) * 1000, 1)
+    timings.setdefault("first_paint_ms", run_ms)
+    timings["last_rerun_ms"] = run_ms
+    timings["reruns"] += 1
+    timings["rerun_ms_total"] += run_ms
+    stats = client_stats()
+
+    with st.sidebar.expander("⏱️ Debug panel", expanded=False):
+        st.markdown(
+            f"**First paint:** {timings['first_paint_ms']} ms  \n"
+            f"**Last rerun:** {run_ms} ms (avg {timings['rerun_ms_total'] / timings['reruns']:.1f} ms "
+            f"over {timings['reruns']} runs)  \n"
+            f"**Last parse:** {timings.get('last_parse_ms', '–')} ms  \n"
+            f"**Last tool call:** {timings.get('last_tool_call_ms', '–')} ms"
+        )
+        st.markdown("**Lazy imports (first import in this process, ms)**")
+        st.json(stats["imports_ms"] or {"none yet": 0}, expanded=False)
+        discovery = stats["tool_discovery"]
+        st.markdown(
+            f"**Tool discovery:** {discovery['calls']} server calls, last {discovery['last_ms'] or '–'} ms "
+            f"(cached for {TOOLS_CACHE_TTL:.0f} s)"
+        )
+        parser = stats["parser"]
+        parsed = sum(parser.values())
+        coverage = f"{parser['fast_path'] / parsed:.0%}" if parsed else "–"
+        st.markdown(
+            f"**Query parsing:** {parser['fast_path']} fast path, {parser['plan_cache']} plan cache, "
+            f"{parser['llm']} LLM (fast-path coverage {coverage}{'' if FAST_PATH_PARSER else ', disabled'})"
+        )
+        plan_cache = stats["plan_cache"]
+        lookups = plan_cache["hits"] + plan_cache["misses"]
+        hit_rate = f"{plan_cache['hits'] / lookups:.0%}" if lookups else "–"
+        st.markdown(
+            f"**Plan cache:** hit rate {hit_rate} ({plan_cache['hits']}/{lookups}), "
+            f"{plan_cache['stored']} plans stored, {len(known_entity_names()['names'])} known names"
+            if PLAN_CACHE is not None else "**Plan cache:** disabled"
+        )
+        if st.button("Refresh cached tools & LLM client", key="debug_clear_caches"):
+            discover_tool_schemas.clear()
+            get_llm.clear()
+            st.session_state.available_tools = {}
+            st.rerun()
+
+
+render_debug_panel()
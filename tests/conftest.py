@@ -0,0 +1,15 @@
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+@pytest.fixture(scope="session")
+def server():
+    """Server_Tools1, imported without touching any database (drivers load lazily)"""
+    pytest.importorskip("fastmcp")
+    pytest.importorskip("dotenv")
+    import Server_Tools1
+    return Server_Tools1
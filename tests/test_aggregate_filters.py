@@ -0,0 +1,35 @@
+import pytest
+
+
+@pytest.fixture(autouse=True)
+def rollups_enabled(server, monkeypatch):
+    monkeypatch.setattr(server, "SALES_ROLLUPS_ENABLED", True)
+
+
+def test_day_filter_uses_rollups(server):
+    source, sql, params = server._aggregate_plan(
+        ("customer",), ("total_revenue",), "sale date between 2024-01-01 and 2024-02-01", None, 10
+    )
+    assert source == "rollup"
+    assert params == ["2024-01-01", "2024-02-01", 10]
+
+
+def test_non_day_filter_uses_base_table(server):
+    source, sql, params = server._aggregate_plan(("customer",), ("total_revenue",), "quantity > 2", None, None)
+    assert source == "sales"
+    assert params == [2]
+
+
+def test_fallback_only_clause_uses_base_table(server):
+    # Rejected by the grammar, accepted by the read path's total_price fallback
+    clause = "sales ending up above 50"
+    assert server._sales_filter(clause, None) == (" WHERE (s.total_price > %s)", [50.0])
+    source, sql, params = server._aggregate_plan(("customer",), ("total_revenue",), clause, None, 10)
+    assert source == "sales"
+    assert "s.total_price > %s" in sql
+    assert params == [50.0, 10]
+
+
+def test_invalid_clause_still_fails(server):
+    with pytest.raises(server.FilterError):
+        server._aggregate_plan(("customer",), ("total_revenue",), "quantity above 3 blah", None, None)
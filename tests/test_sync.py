@@ -0,0 +1,148 @@
+"""sync_source_once against in-process stand-ins for the PostgreSQL change log and MySQL.
+
+The stand-ins only understand the statements the sync pipeline sends; what
+they model is visibility: a change_log row exists from its insert (its id is
+taken then) but is seen by other sessions only once its transaction commits.
+"""
+import types
+from datetime import datetime
+
+import pytest
+
+
+class ChangeLogDB:
+    """PostgreSQL side: sales rows and change_log entries, each with a commit flag"""
+
+    def __init__(self):
+        self.next_id = 1
+        self.log = []  # [id, table_name, row_id, op, changed_at, committed]
+        self.rows = {}  # row_id -> (row tuple, committed)
+
+    def write(self, row_id: int, row: tuple) -> "Transaction":
+        """Session doing an insert: the log id is assigned now, visibility comes at commit"""
+        entry = [self.next_id, "sales", row_id, "I", datetime(2024, 1, 1), False]
+        self.next_id += 1
+        self.log.append(entry)
+        self.rows[row_id] = (row, False)
+        return Transaction(self, entry, row_id)
+
+    def visible_log(self, table: str) -> list:
+        return sorted((e for e in self.log if e[5] and e[1] == table), key=lambda e: e[0])
+
+
+class Transaction:
+    def __init__(self, db: ChangeLogDB, entry: list, row_id: int):
+        self.db, self.entry, self.row_id = db, entry, row_id
+
+    def commit(self):
+        self.entry[5] = True
+        self.db.rows[self.row_id] = (self.db.rows[self.row_id][0], True)
+
+
+class PgCursor:
+    def __init__(self, db: ChangeLogDB):
+        self.db = db
+        self.result = []
+
+    def execute(self, sql: str, params=()):
+        sql = " ".join(sql.split())
+        if sql.startswith("SELECT id, row_id, op, changed_at FROM change_log"):
+            table, limit = params
+            self.result = [(e[0], e[2], e[3], e[4]) for e in self.db.visible_log(table)][:limit]
+        elif sql.startswith("SELECT") and "WHERE id = ANY" in sql:
+            ids = set(params[0])
+            self.result = [row for row_id, (row, committed) in self.db.rows.items() if committed and row_id in ids]
+        elif sql == "DELETE FROM change_log WHERE id = ANY(%s)":
+            ids = set(params[0])
+            self.db.log = [e for e in self.db.log if e[0] not in ids]
+        elif sql == "DELETE FROM change_log WHERE table_name = %s AND id <= %s":
+            table, last_id = params
+            self.db.log = [e for e in self.db.log if not (e[1] == table and e[0] <= last_id and e[5])]
+        else:
+            raise AssertionError(f"unexpected PostgreSQL statement: {sql}")
+
+    def fetchall(self):
+        return self.result
+
+
+class MySQLCursor:
+    def __init__(self, mirror: dict):
+        self.mirror = mirror
+
+    def executemany(self, sql: str, rows: list):
+        for row in rows:
+            self.mirror[row[0]] = row
+
+    def execute(self, sql: str, params=()):
+        pass  # watermark bookkeeping
+
+
+class Connection:
+    def __init__(self, cursor, on_commit=None):
+        self._cursor = cursor
+        self.on_commit = on_commit
+
+    def cursor(self):
+        return self._cursor
+
+    def start_transaction(self):
+        pass
+
+    def rollback(self):
+        pass
+
+    def commit(self):
+        if self.on_commit:
+            self.on_commit()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+@pytest.fixture
+def sync(server, monkeypatch):
+    """(db, mirror, run) where run(between_batches) syncs once"""
+    db, mirror = ChangeLogDB(), {}
+    hooks = []
+    monkeypatch.setattr(server, "mysql_driver", lambda: types.SimpleNamespace(IntegrityError=KeyError))
+    monkeypatch.setattr(server, "get_mysql_conn",
+                        lambda: Connection(MySQLCursor(mirror), on_commit=lambda: hooks and hooks.pop(0)()))
+    source = server.SyncSource("sales", lambda: Connection(PgCursor(db)),
+                               "SELECT * FROM sales WHERE id = ANY(%s)", "INSERT ...", "DELETE ...")
+
+    def run(after_mysql_commit=None):
+        # after_mysql_commit runs between the batch's MySQL commit and the change_log cleanup
+        if after_mysql_commit:
+            hooks.append(after_mysql_commit)
+        return server.sync_source_once(source)
+
+    return db, mirror, run
+
+
+def test_late_commit_with_lower_id_is_not_lost(sync):
+    db, mirror, run = sync
+    # Session A takes change_log id 1 but has not committed yet
+    late = db.write(101, (101, 1, 1, 1, 9.5, 9.5, datetime(2024, 1, 1)))
+    # Session B takes id 2 and commits: the sync sees only B
+    db.write(102, (102, 1, 1, 2, 9.5, 19.0, datetime(2024, 1, 1))).commit()
+
+    # A commits while the batch {2} is applied, before its change_log rows are deleted
+    assert run(after_mysql_commit=late.commit) == 1
+    assert set(mirror) == {102}
+
+    # A's change is still queued and reaches MySQL on the next pass
+    assert run() == 1
+    assert set(mirror) == {101, 102}
+    assert db.log == []
+
+
+def test_drains_committed_changes(sync):
+    db, mirror, run = sync
+    for row_id in (1, 2, 3):
+        db.write(row_id, (row_id, 1, 1, 1, 1.0, 1.0, datetime(2024, 1, 1))).commit()
+    assert run() == 3
+    assert set(mirror) == {1, 2, 3}
+    assert run() == 0